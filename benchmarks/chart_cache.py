@@ -0,0 +1,49 @@
+"""
+Times the chart pages and their data API cold (figure built), warm (served from the response cache) and
+revalidated (304 from the ETag), with the SQL statements each costs.
+
+Usage:
+    python -m benchmarks.chart_cache
+"""
+import time
+
+from benchmarks.common import make_app, count_queries
+from benchmarks.seed import seed
+
+PAGES = ['/scatter', '/radar', '/api/scatter', '/api/radar']
+
+
+def fetch(client, engine, url, headers=None):
+    """
+    Request a page, returning the response, the seconds taken and the queries run.
+    """
+    with count_queries(engine) as counter:
+        start = time.perf_counter()
+        response = client.get(url, headers=headers or {})
+        elapsed = time.perf_counter() - start
+    return response, elapsed, counter.count
+
+
+def main():
+    from website import db
+
+    app = make_app()
+    with app.app_context():
+        print(f'Seeded {seed()} PlayerStat rows')
+        engine = db.engine
+
+    client = app.test_client()
+    for url in PAGES:
+        cold, cold_time, cold_queries = fetch(client, engine, url)
+        warm, warm_time, warm_queries = fetch(client, engine, url, {'Accept-Encoding': 'gzip, br'})
+        _, revalidate_time, revalidate_queries = fetch(client, engine, url, {'If-None-Match': f'"{cold.get_etag()[0]}"'})
+
+        print(f'{url}')
+        print(f'       cold: {cold_time * 1000:9.1f} ms  {cold_queries:3} queries  {len(cold.data):9} bytes')
+        print(f'       warm: {warm_time * 1000:9.1f} ms  {warm_queries:3} queries  {len(warm.data):9} bytes '
+              f'({warm.headers.get("Content-Encoding", "identity")})')
+        print(f' revalidate: {revalidate_time * 1000:9.1f} ms  {revalidate_queries:3} queries  304')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# Helpers shared by the benchmark scripts
+import os
+import resource
+import tempfile
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+def make_app(db_path=None):
+    """
+    Create the app on its own SQLite file, with background scraping turned off.
+
+    Parameters:
+    - db_path (str): Database file to use, a new temporary file by default.
+
+    Returns:
+    - app (Flask): The Flask application.
+    """
+    from website import create_app
+
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='datascout-bench-'), 'database.db')
+
+    instance = os.path.dirname(os.path.abspath(db_path))
+    return create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.abspath(db_path)}',
+                       'INGEST_ON_STARTUP': 'off',
+                       'MODEL_CACHE_DIR': os.path.join(instance, 'models'),
+                       'PAGE_CACHE_DIR': os.path.join(instance, 'page_cache')})
+
+
+class QueryCounter:
+    """
+    Counts SQL statements run on an engine, and the time spent in them, while active.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.started = {}
+
+    def before(self, conn, cursor, statement, parameters, context, executemany):
+        self.started[id(cursor)] = time.perf_counter()
+
+    def after(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.seconds += time.perf_counter() - self.started.pop(id(cursor), time.perf_counter())
+
+
+@contextmanager
+def count_queries(engine):
+    """
+    Count the SQL statements run on an engine inside a with block.
+
+    Yields:
+    - counter (QueryCounter): Holds count and seconds once the block finishes.
+    """
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter.before)
+    event.listen(engine, 'after_cursor_execute', counter.after)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter.before)
+        event.remove(engine, 'after_cursor_execute', counter.after)
+
+
+def timed(function, repeat=5):
+    """
+    Run a function several times and return its result and the best wall time in seconds.
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def high_water_mark():
+    """
+    Peak resident memory of this process in kB. VmHWM starts afresh in a new process on Linux,
+    whereas ru_maxrss carries over from the parent.
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
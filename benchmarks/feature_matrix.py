@@ -0,0 +1,83 @@
+"""
+Compares building a position's training input the old way, one query per player with columns
+in whatever order rows come back, against slicing the shared stat matrix with build_features.
+
+Usage:
+    python -m benchmarks.feature_matrix [--clubs 20] [--players 30] [--position Centre-Forward]
+"""
+import argparse
+
+from benchmarks.common import make_app, count_queries, timed
+from benchmarks.seed import seed
+
+
+def legacy_features(position):
+    """
+    Training input as calc_stat_importance used to build it.
+    """
+    from sqlalchemy import and_
+
+    from website.models import Player, PlayerStat, Stat
+
+    player_queries = Player.query.filter(and_(Player.position == position,
+                                              Player.id.in_(p_id[0] for p_id in
+                                                            PlayerStat.query.with_entities(
+                                                                PlayerStat.player_id).all()))).all()
+    player_ids = [player.id for player in player_queries]
+
+    stat_ids = [stat.stat_id for stat in PlayerStat.query.filter(PlayerStat.player_id == player_ids[0]).all()]
+    stat_labels = [stat.label for stat in Stat.query.filter(Stat.id.in_(stat_ids)).all()]
+
+    x = []
+    y = []
+    for player_id in player_ids:
+        stats = PlayerStat.query.filter(PlayerStat.player_id == player_id).all()
+        features = [stat.value for stat in stats]
+        x.append(features[:4] + features[5:] if len(features) == 13 else features)
+        y.append(Player.query.get(player_id).market_value)
+
+    return x, y, stat_labels, player_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--leagues', type=int, default=3)
+    parser.add_argument('--clubs', type=int, default=20)
+    parser.add_argument('--players', type=int, default=30)
+    parser.add_argument('--position', default='Centre-Forward')
+    args = parser.parse_args()
+
+    import numpy as np
+
+    from website import db
+    from website.features import build_features
+    from website.matrix import build_matrix, get_matrix
+
+    app = make_app()
+    with app.app_context():
+        print(f"Seeded {seed(args.leagues, args.clubs, args.players)} PlayerStat rows")
+
+        with count_queries(db.engine) as counter:
+            legacy = legacy_features(args.position)
+        _, seconds = timed(lambda: legacy_features(args.position), repeat=3)
+        print(f"before: {counter.count:5d} queries  {seconds * 1000:8.1f} ms  {len(legacy[3])} players")
+
+        with count_queries(db.engine) as counter:
+            matrix = build_matrix()
+        _, seconds = timed(build_matrix, repeat=3)
+        print(f"matrix: {counter.count:5d} queries  {seconds * 1000:8.1f} ms  (once per data version)")
+
+        matrix = get_matrix()
+        min_coverage = app.config['FEATURE_MIN_COVERAGE']
+        with count_queries(db.engine) as counter:
+            features = build_features(matrix, args.position, min_coverage)
+        _, seconds = timed(lambda: build_features(matrix, args.position, min_coverage))
+        print(f" after: {counter.count:5d} queries  {seconds * 1000:8.1f} ms  {len(features[3])} players")
+
+        # With no missing values both should hold the same numbers in the same columns
+        same = legacy[2] == features[2] and np.allclose(np.array(legacy[0], dtype=float), features[0])
+        print(f"columns and values match: {same}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+# Synthetic Transfermarkt and FBref pages, laid out like the real ones where the scrapers read them
+import random
+
+from website.leagues import load_leagues
+
+POSITIONS = ['Goalkeeper', 'Centre-Back', 'Right Winger', 'Centre-Forward', 'Central Midfield']
+
+OUTFIELD_LABELS = ['Non-Penalty Goals', 'npxG: Non-Penalty xG', 'Shots Total', 'Assists', 'xAG: Exp. Assisted Goals',
+                   'npxG + xAG', 'Shot-Creating Actions', 'Passes Attempted', 'Pass Completion %',
+                   'Progressive Passes', 'Progressive Carries', 'Successful Take-Ons', 'Touches (Att Pen)',
+                   'Progressive Passes Rec', 'Tackles', 'Interceptions', 'Blocks', 'Clearances', 'Aerials Won']
+
+GOALKEEPER_LABELS = ['PSxG-GA', 'Goals Against', 'Save Percentage', 'PSxG/SoT', 'Save% (Penalty Kicks)',
+                     'Clean Sheet Percentage', 'Touches', 'Launch %', 'Goal Kicks', 'Avg. Length of Goal Kicks',
+                     'Crosses Stopped %', 'Def. Actions Outside Pen. Area', 'Avg. Distance of Def. Actions']
+
+# Accented first names check both sites' names still match once transliterated
+FIRST_NAMES = ['Player', 'Jörg', 'Martín', 'Søren']
+
+HEADLINE = 'data-header__headline-wrapper data-header__headline-wrapper--oswald'
+
+
+def filler(rnd, tables, rows, columns=25):
+    """
+    Markup the scrapers don't read, standing in for the rest of a real page: navigation,
+    scripts and other stats tables. Real player pages are mostly this.
+    """
+    parts = ['<div class="nav">' + ''.join(f'<a href="/en/x/{n}">Link {n}</a>' for n in range(200)) + '</div>',
+             '<script>var data = ' + repr([rnd.random() for _ in range(500)]) + ';</script>']
+    for table in range(tables):
+        head = ''.join(f'<th data-stat="c{column}">Col {column}</th>' for column in range(columns))
+        body = ''.join('<tr>' + ''.join(f'<td class="right" data-stat="c{column}">{rnd.uniform(0, 99):.1f}</td>'
+                                        for column in range(columns)) + '</tr>' for _ in range(rows))
+        parts.append(f'<div class="table_wrapper"><table id="other_{table}" class="other">'
+                     f'<thead><tr>{head}</tr></thead><tbody>{body}</tbody></table></div>')
+    return ''.join(parts)
+
+
+def build_pages(clubs=4, players=12, filler_tables=0, filler_rows=40, seed_value=1, leagues=None):
+    """
+    Pages of the registry's leagues on both sites, keyed by the URLs the scrapers request.
+
+    Parameters:
+    - clubs (int): Clubs in each league.
+    - players (int): Players in each club.
+    - filler_tables (int): Unread tables added to every club and player page, 0 for small pages
+      and around 12 for pages the size of the real ones.
+    - filler_rows (int): Rows in each filler table.
+    - seed_value (int): Random seed, so pages are repeatable.
+    - leagues (int): Number of leagues from the top of the registry, its enabled leagues by default.
+
+    Returns:
+    dict: URL -> page as UTF-8 bytes.
+    """
+    rnd = random.Random(seed_value)
+    pages = {}
+
+    registry = load_leagues()
+    registry = registry[:leagues] if leagues else [league for league in registry if league['enabled']]
+
+    for league, (tm_url, fbref_url) in enumerate((league['transfermarkt'], league['fbref']) for league in registry):
+        club_names = [f"Club {league}-{club} FC" for club in range(clubs)]
+
+        links = ''.join(f'<tr><td><a href="/c{league}{club}/kader/verein/{league}{club}">{name}</a></td></tr>'
+                        for club, name in enumerate(club_names))
+        pages[tm_url] = (f'<html><body><h1 class="{HEADLINE}">\n League {league} \n</h1>'
+                         f'<a href="/uefa/5jahreswertung/statistik">{league + 1}. 90.0</a>'
+                         f'<span class="data-header__club"><a> Nation {league} </a></span>'
+                         f'<table class="search"><tr><td>a</td></tr></table>'
+                         f'<table class="items">{links}</table></body></html>')
+
+        links = ''.join(f'<tr><td><a href="/en/squads/{league}{club}/Club-Stats">{name}</a></td></tr>'
+                        for club, name in enumerate(club_names))
+        pages[fbref_url] = f'<html><body><table class="stats_table">{links}</table></body></html>'
+
+        for club, club_name in enumerate(club_names):
+            squad_rows = ''
+            stats_rows = ''
+
+            for number in range(players):
+                name = f"{FIRST_NAMES[number % len(FIRST_NAMES)]} {league}-{club}-{number}"
+                slug = f"{league}{club}{number}/{name.replace(' ', '-')}"
+                position = POSITIONS[number % len(POSITIONS)]
+
+                value = rnd.choice([f"€{rnd.uniform(1, 90):.2f}\xa0m", f"€{rnd.randint(100, 900)}k\xa0", "-"])
+                squad_rows += (f'<tr><td class="hauptlink">{name}\n</td>'
+                               f'<td><table class="inline-table"><tr><td>{name}</td></tr>'
+                               f'<tr><td>{position}</td></tr></table></td>'
+                               f'<td class="zentriert">{rnd.randint(18, 36)}</td>'
+                               f'<td class="rechts hauptlink">{value}</td></tr>')
+
+                stats_rows += (f'<tr><th><a href="/en/players/{slug}">{name}</a></th>'
+                               f'<td><a href="/en/players/{slug}/matchlogs/x">Matches</a></td></tr>')
+
+                labels = GOALKEEPER_LABELS if position == 'Goalkeeper' else OUTFIELD_LABELS
+                report = ''.join(f'<tr><th>{label}</th><td class="right">{rnd.uniform(0.1, 9):.2f}'
+                                 f'{"%" if "%" in label else ""}</td></tr>' for label in labels)
+                pages[f"https://fbref.com/en/players/{slug}"] = (
+                    f'<html><body><div id="meta"><h1><span>{name}</span></h1></div>'
+                    f'<table id="scout_summary_x"><tbody>{report}</tbody></table>'
+                    f'{filler(rnd, filler_tables, filler_rows)}</body></html>')
+
+            pages[f"https://transfermarkt.co.uk/c{league}{club}/kader/verein/{league}{club}"] = (
+                f'<html><body><h1 class="{HEADLINE}">\n {club_name} \n</h1>'
+                f'<table class="items">{squad_rows}</table>'
+                f'{filler(rnd, filler_tables // 2, filler_rows)}</body></html>')
+
+            pages[f"https://fbref.com/en/squads/{league}{club}/Club-Stats"] = (
+                f'<html><body><div id="meta"><h1><span>2023-2024 {club_name} Stats</span></h1></div>'
+                f'<table class="stats_table">{stats_rows}</table>'
+                f'{filler(rnd, filler_tables, filler_rows)}</body></html>')
+
+    return {url: page.encode('utf-8') for url, page in pages.items()}
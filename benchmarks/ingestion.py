@@ -0,0 +1,153 @@
+"""
+Runs scrape_data and scrape_stats end to end against a replayed fixture corpus, on a fresh database,
+and reports pages/s, rows/s, SQL statements and peak memory of each scraper.
+
+Pages come from a corpus folder (see benchmarks/replay.py) or are generated in memory for the first
+--leagues leagues of the registry. Rate limits and the page cache are turned off, so the run measures
+fetching, parsing, resolving and writing only, unless --rate gives every host a rate limit.
+
+With --shards N both sites are scraped in one job by N league shard processes, sharing each host's
+rate limit. With --rate, its time can be compared with the least time the busiest host's pages
+need at that rate, which is what sharded ingestion should approach however many leagues there are.
+With --save the results are written as a baseline, and with --compare the run fails (exit code 1)
+when throughput drops or queries grow beyond the tolerance, catching ingestion regressions.
+
+Usage:
+    python -m benchmarks.ingestion [--corpus CORPUS] [--leagues 3] [--clubs 2] [--players 12] [--filler-tables 12]
+                                   [--latency 0] [--rate R] [--parse-workers 1] [--shards 1]
+                                   [--save FILE] [--compare FILE]
+"""
+import argparse
+import json
+import sys
+import time
+from collections import Counter
+
+from benchmarks.common import make_app, count_queries, high_water_mark
+from benchmarks.replay import ReplayAdapter, load_corpus
+from website.crawler import host_name
+from website.leagues import load_leagues
+
+
+def run_source(app, sources):
+    """
+    Run scrapers as a build job and measure it.
+
+    Returns:
+    dict: pages, rows, queries, seconds, pages_per_second, rows_per_second and stages (pipeline metrics).
+    """
+    from website import db
+    from website.jobs import run_scrape
+    from website.pipeline import latest
+
+    with app.app_context():
+        with count_queries(db.engine) as counter:
+            start = time.perf_counter()
+            run_scrape('build', sources=sources)
+            seconds = time.perf_counter() - start
+
+    # Counted by the pipelines, as shards fetch in their own processes
+    pages = latest['fetch']['processed']
+    rows = latest['write']['processed']
+    return {'pages': pages, 'rows': rows, 'queries': counter.count, 'seconds': round(seconds, 3),
+            'pages_per_second': round(pages / seconds, 1), 'rows_per_second': round(rows / seconds, 1),
+            'stages': dict(latest)}
+
+
+def regressions(results, baseline, tolerance):
+    """
+    Differences from a baseline larger than the tolerance, as messages.
+    """
+    messages = []
+    for source, result in results['sources'].items():
+        before = baseline['sources'].get(source)
+        if before is None:
+            continue
+
+        if result['pages'] != before['pages'] or result['rows'] != before['rows']:
+            messages.append(f"{source}: {result['pages']} pages and {result['rows']} rows, "
+                            f"baseline {before['pages']} and {before['rows']}")
+        if result['pages_per_second'] < before['pages_per_second'] * (1 - tolerance):
+            messages.append(f"{source}: {result['pages_per_second']} pages/s, baseline {before['pages_per_second']}")
+        if result['queries'] > before['queries'] * (1 + tolerance):
+            messages.append(f"{source}: {result['queries']} queries, baseline {before['queries']}")
+
+    if results['peak_rss_kb'] > baseline['peak_rss_kb'] * (1 + tolerance):
+        messages.append(f"peak RSS {results['peak_rss_kb']} kB, baseline {baseline['peak_rss_kb']} kB")
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', help='Corpus folder, synthetic pages are generated when missing.')
+    parser.add_argument('--leagues', type=int, help='Leagues from the top of the registry, its enabled ones by default.')
+    parser.add_argument('--clubs', type=int, default=2)
+    parser.add_argument('--players', type=int, default=12)
+    parser.add_argument('--filler-tables', type=int, default=12)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response.')
+    parser.add_argument('--rate', type=float, help='Requests per second allowed for each host, unlimited by default.')
+    parser.add_argument('--crawl-workers', type=int, default=4)
+    parser.add_argument('--parse-workers', type=int, default=1)
+    parser.add_argument('--shards', type=int, default=1, help='League shard processes, 1 runs each site in turn.')
+    parser.add_argument('--save', help='Write the results to this file as a baseline.')
+    parser.add_argument('--compare', help='Baseline file to compare against.')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed change from the baseline.')
+    args = parser.parse_args()
+
+    if args.corpus:
+        pages = load_corpus(args.corpus)
+    else:
+        from benchmarks.fixtures import build_pages
+
+        pages = build_pages(args.clubs, args.players, args.filler_tables, leagues=args.leagues)
+    print(f"{len(pages)} pages, {sum(map(len, pages.values())) / 2 ** 20:.1f} MB")
+
+    # Every host in the corpus is unthrottled, or limited to the same rate
+    hosts = Counter(host_name(url) for url in pages)
+    rates = {host: args.rate or 1e9 for host in hosts}
+
+    adapter = ReplayAdapter(pages, latency=args.latency)
+    app = make_app()
+    app.config.update(CRAWL_ADAPTER=adapter, CRAWL_RATES=rates, CRAWL_WORKERS=args.crawl_workers,
+                      PAGE_CACHE_DIR=None, PARSE_WORKERS=args.parse_workers, SCRAPE_SHARDS=args.shards)
+    if args.leagues:
+        app.config['LEAGUES'] = [league['code'] for league in load_leagues()[:args.leagues]]
+
+    memory_before = high_water_mark()
+    if args.shards > 1:
+        results = {'sources': {'all': run_source(app, ('transfermarkt', 'fbref'))}}
+    else:
+        results = {'sources': {source: run_source(app, (source,)) for source in ('transfermarkt', 'fbref')}}
+    results['peak_rss_kb'] = high_water_mark()
+    results['rss_growth_kb'] = results['peak_rss_kb'] - memory_before
+
+    print()
+    for source, result in results['sources'].items():
+        print(f"{source:>13}: {result['pages']:5} pages {result['pages_per_second']:8.1f}/s  "
+              f"{result['rows']:6} rows {result['rows_per_second']:9.1f}/s  "
+              f"{result['queries']:5} queries  {result['seconds']:6.2f} s")
+    print(f"    peak RSS: {results['peak_rss_kb'] / 1024:.1f} MB (+{results['rss_growth_kb'] / 1024:.1f} MB while scraping)")
+    if args.rate:
+        host, count = hosts.most_common(1)[0]
+        print(f"  rate bound: {host} needs {count / args.rate:.2f} s for its {count} pages at {args.rate:g}/s")
+    if adapter.missing:
+        print(f"     missing: {adapter.missing} requested pages are not in the corpus")
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=1)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+        messages = regressions(results, baseline, args.tolerance)
+        for message in messages:
+            print(f"  regression: {message}")
+        if messages:
+            sys.exit(1)
+        print(f"Within {args.tolerance:.0%} of {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+"""
+Load test of the Flask routes: seeds a synthetic database at any scale, serves the app from several
+worker processes, drives /, /scatter, /radar, their /api data and the player search with concurrent
+clients, and reports p50/p95/p99 latency, throughput and SQL statements per request of each route,
+and memory of each worker.
+
+Requests pick their arguments at random from --variety sets per route (positions, stat pairs and
+player pairs), so a larger variety means fewer response cache hits; --no-cache turns the cache off.
+Models are trained before the clients start so the first radar requests don't train them. The scatter
+summaries aren't precomputed unless --summaries is given, and are then fitted per request.
+
+Usage:
+    python -m benchmarks.load_test [--leagues 20] [--clubs 20] [--players 25] [--stats 150]
+                                   [--db FILE] [--workers 2] [--concurrency 8] [--duration 20]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlencode
+
+import numpy as np
+import requests
+
+from benchmarks.common import make_app, high_water_mark
+
+ROUTES = ['home', 'scatter', 'api_scatter', 'radar', 'api_radar', 'player_search']
+
+
+def instrument(app):
+    """
+    Add the worker's PID and its peak memory to every response, next to the SQL statements the
+    app reports in Server-Timing.
+    """
+    @app.after_request
+    def headers(response):
+        response.headers['X-Worker'] = str(os.getpid())
+        response.headers['X-Worker-Peak'] = str(high_water_mark())
+        return response
+
+
+def statements(response):
+    # Statement count from the app's Server-Timing header, sql;dur=...;desc="N statements"
+    match = re.search(r'desc="(\d+) statements"', response.headers.get('Server-Timing', ''))
+    return int(match.group(1)) if match else 0
+
+
+def serve(db_path, config, ports):
+    # Worker process, serving the app on a free port with a thread per request
+    import logging
+
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    app = make_app(db_path)
+    app.config.update(config)
+    instrument(app)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    ports.put(server.port)
+    server.serve_forever()
+
+
+def prepare(app, args):
+    """
+    Seed the database if it is empty, and train the models and compute the summaries it needs.
+    """
+    from benchmarks.seed import seed
+    from website.importance import models_outdated, train_positions
+    from website.models import Player
+    from website.summaries import compute_summaries, summaries_outdated
+
+    with app.app_context():
+        if Player.query.first() is None:
+            start = time.perf_counter()
+            rows = seed(args.leagues, args.clubs, args.players, args.stats)
+            print(f"Seeded {rows} PlayerStat rows in {time.perf_counter() - start:.1f} s")
+
+        if models_outdated():
+            start = time.perf_counter()
+            train_positions()
+            print(f"Trained models in {time.perf_counter() - start:.1f} s")
+
+        if args.summaries and summaries_outdated():
+            start = time.perf_counter()
+            compute_summaries()
+            print(f"Computed summaries in {time.perf_counter() - start:.1f} s")
+
+
+def targets(app, variety, seed_value=1):
+    """
+    URLs the clients request, variety random argument sets for each route.
+
+    Returns:
+    dict: Route name -> list of URLs.
+    """
+    from website.dimensions import get_dimensions
+    from website.matrix import get_matrix
+
+    rnd = random.Random(seed_value)
+
+    with app.app_context():
+        dimensions = get_dimensions()
+        positions = [position for position in dimensions.positions if position != 'Goalkeeper']
+        stats = {position: dimensions.position_stats(position) for position in positions}
+
+        # Names of each position's players with stats, as the radar page is asked for
+        matrix = get_matrix()
+        names = {position: matrix.names[matrix.position_mask(position)].tolist() for position in positions}
+
+    urls = {'home': ['/']}
+    for route in ROUTES[1:]:
+        urls[route] = []
+        for _ in range(variety):
+            position = rnd.choice(positions)
+            if route == 'player_search':
+                # The first letters of a name, as typed into the radar page
+                name = rnd.choice(names[position])
+                query = [('q', name[:rnd.randint(1, len(name))]), ('position', position)]
+                urls[route].append(f"/api/players/search?{urlencode(query)}")
+                continue
+
+            if 'scatter' in route:
+                x_stat, y_stat = rnd.sample(stats[position], 2)
+                query = [('position', position), ('x_stat', x_stat), ('y_stat', y_stat)]
+            else:
+                player1, player2 = rnd.sample(names[position], 2)
+                query = [('position', position), ('player1', player1), ('player2', player2)]
+                if route == 'api_radar':
+                    query = [('position', position), ('player', player1), ('player', player2)]
+
+            path = '/api/' + route[4:] if route.startswith('api_') else '/' + route
+            urls[route].append(f"{path}?{urlencode(query)}")
+    return urls
+
+
+class Results:
+    """
+    Latencies and SQL counts of every request, by route, and the peak memory reported by each worker.
+    """
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.workers = {}
+        self.lock = threading.Lock()
+
+    def record(self, route, seconds, response):
+        with self.lock:
+            if response is None or response.status_code >= 400:
+                self.errors[route] += 1
+                return
+
+            self.latencies[route].append(seconds)
+            self.queries[route].append(statements(response))
+            worker = response.headers.get('X-Worker')
+            self.workers[worker] = max(self.workers.get(worker, 0), int(response.headers.get('X-Worker-Peak', 0)))
+
+    def summary(self, route, seconds):
+        """
+        Requests, errors, throughput, latency percentiles (ms) and mean SQL statements of a route.
+        """
+        latencies = np.array(self.latencies[route]) * 1000
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (0.0, 0.0, 0.0)
+        return {'requests': len(latencies), 'errors': self.errors[route],
+                'per_second': round(len(latencies) / seconds, 1),
+                'p50_ms': round(float(p50), 1), 'p95_ms': round(float(p95), 1), 'p99_ms': round(float(p99), 1),
+                'queries': round(float(np.mean(self.queries[route])), 1) if self.queries[route] else 0.0}
+
+
+def client(base_urls, urls, deadline, results, seed_value):
+    # One client thread, sending requests one after another until the deadline
+    rnd = random.Random(seed_value)
+    session = requests.Session()
+    routes = list(urls)
+
+    while time.perf_counter() < deadline:
+        route = rnd.choice(routes)
+        url = rnd.choice(base_urls) + rnd.choice(urls[route])
+
+        start = time.perf_counter()
+        try:
+            response = session.get(url, timeout=120)
+        except requests.RequestException:
+            response = None
+        results.record(route, time.perf_counter() - start, response)
+
+
+def run_load(base_urls, urls, concurrency, duration):
+    """
+    Send requests from concurrency client threads for duration seconds.
+
+    Returns:
+    - results (Results): What every request took.
+    - seconds (float): How long the clients ran.
+    """
+    results = Results()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(base_urls, urls, start + duration, results, number))
+               for number in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--leagues', type=int, default=20)
+    parser.add_argument('--clubs', type=int, default=20)
+    parser.add_argument('--players', type=int, default=25, help='Players in each club.')
+    parser.add_argument('--stats', type=int, default=150, help='Outfield stats of each player.')
+    parser.add_argument('--db', help='Database file, kept and reused by later runs. A temporary one by default.')
+    parser.add_argument('--summaries', action='store_true', help='Precompute the scatter summaries.')
+    parser.add_argument('--workers', type=int, default=2, help='Server processes.')
+    parser.add_argument('--concurrency', type=int, default=8, help='Client threads.')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds the clients run for.')
+    parser.add_argument('--warmup', type=float, default=2, help='Seconds of requests not counted.')
+    parser.add_argument('--variety', type=int, default=50, help='Argument sets of each route.')
+    parser.add_argument('--routes', default=','.join(ROUTES))
+    parser.add_argument('--no-cache', action='store_true', help='Turn the response cache off.')
+    parser.add_argument('--save', help='Write the results to this file.')
+    args = parser.parse_args()
+
+    db_path = os.path.abspath(args.db or os.path.join(tempfile.mkdtemp(prefix='datascout-load-'), 'database.db'))
+    app = make_app(db_path)
+    prepare(app, args)
+    urls = {route: route_urls for route, route_urls in targets(app, args.variety).items()
+            if route in args.routes.split(',')}
+
+    # Worker processes start afresh, so each one's memory only covers serving
+    context = multiprocessing.get_context('spawn')
+    ports = context.Queue()
+    config = {'RESPONSE_CACHE_ENTRIES': 0} if args.no_cache else {}
+    workers = [context.Process(target=serve, args=(db_path, config, ports), daemon=True) for _ in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    base_urls = [f"http://127.0.0.1:{ports.get(timeout=120)}" for _ in workers]
+
+    try:
+        if args.warmup:
+            run_load(base_urls, urls, args.concurrency, args.warmup)
+        results, seconds = run_load(base_urls, urls, args.concurrency, args.duration)
+    finally:
+        for worker in workers:
+            worker.terminate()
+
+    report = {'routes': {route: results.summary(route, seconds) for route in urls},
+              'workers_peak_rss_kb': results.workers}
+    every = [latency for route in urls for latency in results.latencies[route]]
+    results.latencies['all'] = every
+    results.queries['all'] = [count for route in urls for count in results.queries[route]]
+    results.errors['all'] = sum(results.errors[route] for route in urls)
+    report['routes']['all'] = results.summary('all', seconds)
+
+    print(f"\n{args.workers} workers, {args.concurrency} clients, {seconds:.1f} s")
+    print(f"{'route':>13} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'SQL/req':>8}")
+    for route, summary in report['routes'].items():
+        print(f"{route:>13} {summary['requests']:9} {summary['errors']:7} {summary['per_second']:8.1f} "
+              f"{summary['p50_ms']:8.1f} {summary['p95_ms']:8.1f} {summary['p99_ms']:8.1f} {summary['queries']:8.1f}")
+    for worker, peak in sorted(results.workers.items()):
+        print(f"  worker {worker}: peak RSS {peak / 1024:.1f} MB")
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(report, file, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Compares the scrapers' old BeautifulSoup extraction against the lxml parsers in website/parsers.py
+on synthetic fixture pages the size of the real ones: CPU time per page, peak memory while parsing
+the largest page of each kind, and whether both extract the same data.
+
+Usage:
+    python -m benchmarks.parse_pages [--clubs 2] [--players 12] [--filler-tables 12] [--sample 10]
+"""
+import argparse
+import multiprocessing
+import re
+import time
+
+from benchmarks.common import high_water_mark
+from benchmarks.fixtures import build_pages
+
+
+def bs4_tm_league(content):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'html.parser', from_encoding='utf-8')
+    club_links = soup.select("table", {"class": "items"})[1].find_all('a')
+    return {
+        'name': soup.find('h1', class_='data-header__headline-wrapper '
+                                       'data-header__headline-wrapper--oswald').get_text().strip(),
+        'coefficient': int(re.match(r'\d+', soup.find('a', href='/uefa/5jahreswertung/statistik').get_text().strip()).group()),
+        'nation': soup.find('span', class_='data-header__club').find('a').get_text().strip(),
+        'club_links': [link.get("href") for link in club_links],
+    }
+
+
+def bs4_tm_club(content):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'html.parser', from_encoding='utf-8')
+    names_html = soup.find_all('td', {"class": 'hauptlink'})
+    age_td = soup.select("td.zentriert")
+    return {
+        'name': soup.find('h1', class_='data-header__headline-wrapper '
+                                       'data-header__headline-wrapper--oswald').get_text().strip(),
+        'names': [n.text.strip() for n in names_html if n.text[-1] == "\n"],
+        'ages': [int(a.text) for a in age_td if a.text != "" and len(a.text) == 2 and "div" not in str(a)],
+        'positions': [p.get_text(strip=True) for p in soup.select("table.inline-table tr:nth-of-type(2)")],
+        'values': [v.text for v in soup.find_all('td', {"class": 'rechts hauptlink'})],
+    }
+
+
+def bs4_fbref_links(content):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'html.parser', from_encoding='utf-8')
+    links = soup.select('table.stats_table')[0].find_all('a')
+    return [(link.get("href"), link.get_text(strip=True)) for link in links]
+
+
+def bs4_fbref_squad(content):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'html.parser', from_encoding='utf-8')
+    span_re = re.compile(r'<span>(.*)</span>')
+    return {
+        'titles': span_re.findall(str(soup.select('#meta')[0].find_all('h1'))),
+        'links': [link.get("href") for link in soup.select('table.stats_table')[0].find_all('a')],
+    }
+
+
+def bs4_fbref_player(content):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'html.parser', from_encoding='utf-8')
+    span_re = re.compile(r'<span>(.*)</span>')
+    table = soup.find('table').find('tbody')
+    tbody = soup.select_one("table[id*=scout_summary]").find('tbody')
+    values = [value.get_text(strip=True) for value in table.find_all('td', class_='right')]
+    return {
+        'names': span_re.findall(str(soup.select('#meta')[0].find_all('h1'))),
+        'labels': [th.text for th in tbody.find_all("th") if len(th.text) > 1],
+        'values': [value for value in values if len(value) > 1],
+    }
+
+
+def page_kinds(pages):
+    """
+    Fixture pages grouped by kind, with the old and new parser of each kind.
+    """
+    from website import parsers
+
+    def urls(test):
+        return [url for url in pages if test(url)]
+
+    return [
+        ('transfermarkt league', urls(lambda url: '/wettbewerb/' in url), bs4_tm_league, parsers.parse_tm_league),
+        ('transfermarkt club', urls(lambda url: '/kader/verein/' in url), bs4_tm_club, parsers.parse_tm_club),
+        ('fbref league', urls(lambda url: '/comps/' in url), bs4_fbref_links, parsers.parse_fbref_links),
+        ('fbref squad', urls(lambda url: '/squads/' in url), bs4_fbref_squad, parsers.parse_fbref_squad),
+        ('fbref player', urls(lambda url: '/players/' in url), bs4_fbref_player, parsers.parse_fbref_player),
+    ]
+
+
+def peak_memory(function, content, queue):
+    # Run in a new process, so the peak only covers this parse and no memory freed earlier is reused
+    import bs4
+    import lxml.etree
+
+    before = high_water_mark()
+    function(content)
+    queue.put(high_water_mark() - before)
+
+
+def measure_memory(function, content):
+    """
+    Growth in peak resident memory (kB) while parsing one page, in a fresh process.
+    """
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=peak_memory, args=(function, content, queue))
+    process.start()
+    growth = queue.get()
+    process.join()
+    return growth
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clubs', type=int, default=2)
+    parser.add_argument('--players', type=int, default=12)
+    parser.add_argument('--filler-tables', type=int, default=12)
+    parser.add_argument('--sample', type=int, default=10, help='Most pages of each kind timed.')
+    args = parser.parse_args()
+
+    pages = build_pages(args.clubs, args.players, args.filler_tables)
+    print(f"{len(pages)} pages, {sum(map(len, pages.values())) / 2 ** 20:.1f} MB")
+
+    for kind, urls, old, new in page_kinds(pages):
+        contents = [pages[url] for url in urls][:args.sample]
+        largest = max(contents, key=len)
+
+        print(f"{kind} ({len(contents)} pages, largest {len(largest) / 1024:.0f} kB)")
+        for name, function in [('bs4', old), ('lxml', new)]:
+            start = time.perf_counter()
+            for content in contents:
+                function(content)
+            seconds = (time.perf_counter() - start) / len(contents)
+
+            print(f"  {name:>5}: {seconds * 1000:8.2f} ms/page  peak +{measure_memory(function, largest) / 1024:6.1f} MB")
+
+        same = all(old(content) == new(content) for content in contents)
+        print(f"  same data: {same}")
+
+
+if __name__ == '__main__':
+    main()
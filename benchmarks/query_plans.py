@@ -0,0 +1,74 @@
+"""
+Checks that the hot queries of the routes and scrapers are answered from indexes, using
+SQLite's EXPLAIN QUERY PLAN. Exits with status 1 if any of them scans a whole table.
+
+Usage:
+    python -m benchmarks.query_plans
+"""
+import re
+import sys
+from datetime import datetime
+
+from sqlalchemy import text
+
+from benchmarks.common import make_app
+from benchmarks.seed import seed
+
+# A plan line reading a whole table rather than searching an index
+full_scan_re = re.compile(r'\bSCAN (\w+)(?! USING (COVERING )?INDEX)')
+
+
+def hot_queries():
+    """
+    The queries whose plans are checked, as (name, query) pairs.
+    """
+    from website import db
+    from website.matrix import changed_rows
+    from website.models import Player, Stat, PlayerStat
+    from website.scatter import scatter_query
+
+    return [
+        ('scatter chart', scatter_query('Centre-Forward', 'npxG: Non-Penalty xG', 'Non-Penalty Goals')),
+        ('matrix refresh', changed_rows(100, datetime(2000, 1, 1), 200)),
+        ('player stat by player and stat', PlayerStat.query.filter_by(player_id=1, stat_id=1)),
+        ('stats of one player', PlayerStat.query.filter_by(player_id=1)),
+        ('one stat across players', db.session.query(PlayerStat.player_id, PlayerStat.value)
+            .filter(PlayerStat.stat_id == 1, PlayerStat.player_id.in_([1, 2, 3]))),
+        ('player by name', Player.query.filter_by(name='Bukayo Saka')),
+        ('player by name and club', Player.query.filter_by(name='Bukayo Saka', club_id=1)),
+        ('players in position', Player.query.filter_by(position='Right Winger')),
+        ('stat by label', Stat.query.filter_by(label='Non-Penalty Goals')),
+    ]
+
+
+def plan(query):
+    """
+    EXPLAIN QUERY PLAN lines for a SQLAlchemy query.
+    """
+    from website import db
+
+    sql = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    return [row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+
+
+def main():
+    app = make_app()
+    failed = 0
+
+    with app.app_context():
+        seed(leagues=2, clubs=5, players=20)
+
+        for name, query in hot_queries():
+            lines = plan(query)
+            scans = [line for line in lines if full_scan_re.search(line)]
+            failed += bool(scans)
+
+            print(f"{'FULL SCAN' if scans else 'ok':>9}  {name}")
+            for line in lines:
+                print(f"{'':11}{line}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Offline fixture corpus of Transfermarkt and FBref pages, and a requests transport adapter replaying it,
+so the scrapers can run end to end without touching either site.
+
+A corpus is a folder holding index.json (URL -> file) and one gzip compressed file per page. It can be
+generated from the synthetic pages in benchmarks/fixtures.py, or recorded from the page cache of a real
+scrape so the benchmark runs on the sites' actual markup.
+
+Usage:
+    python -m benchmarks.replay generate CORPUS [--clubs 4] [--players 12] [--filler-tables 12]
+    python -m benchmarks.replay record CORPUS [--page-cache instance/page_cache]
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+from requests import Request, Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+
+def save_corpus(directory, pages):
+    """
+    Write pages to a corpus folder, replacing any page already stored under the same URL.
+
+    Parameters:
+    - directory (str): Corpus folder, created if missing.
+    - pages (dict): URL -> page as bytes.
+    """
+    os.makedirs(os.path.join(directory, 'pages'), exist_ok=True)
+
+    index_path = os.path.join(directory, 'index.json')
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path) as file:
+            index = json.load(file)
+
+    for url, content in pages.items():
+        name = hashlib.sha256(url.encode('utf-8')).hexdigest()[:32] + '.html.gz'
+        with gzip.open(os.path.join(directory, 'pages', name), 'wb') as file:
+            file.write(content)
+        index[url] = name
+
+    with open(index_path, 'w') as file:
+        json.dump(index, file, indent=1, sort_keys=True)
+
+
+def load_corpus(directory):
+    """
+    Read every page of a corpus folder into memory.
+
+    Returns:
+    dict: URL -> page as bytes.
+    """
+    with open(os.path.join(directory, 'index.json')) as file:
+        index = json.load(file)
+
+    pages = {}
+    for url, name in index.items():
+        with gzip.open(os.path.join(directory, 'pages', name), 'rb') as file:
+            pages[url] = file.read()
+    return pages
+
+
+def read_page_cache(directory):
+    """
+    Every page held in a PageCache folder, as left behind by a real scrape.
+
+    Returns:
+    dict: URL -> page as bytes.
+    """
+    from website.page_cache import PageCache
+
+    cache = PageCache(directory)
+    pages = {}
+    for name in os.listdir(os.path.join(directory, 'urls')):
+        try:
+            with open(os.path.join(directory, 'urls', name)) as file:
+                url = json.load(file)['url']
+        except (OSError, ValueError, KeyError):
+            continue
+
+        entry = cache.lookup(url)
+        if entry is not None:
+            pages[url] = cache.read(entry)
+    return pages
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    requests transport serving pages from memory, answering 404 for anything not recorded.
+    Mounted on the crawler's session through the CRAWL_ADAPTER setting.
+
+    Parameters:
+    - pages (dict): URL -> page as bytes.
+    - latency (float): Seconds each response is delayed, to stand in for the network.
+    """
+
+    def __init__(self, pages, latency=0.0):
+        super().__init__()
+        # Keyed by URLs as requests sends them, with characters such as accents percent-encoded
+        self.pages = {Request('GET', url).prepare().url: content for url, content in pages.items()}
+        self.latency = latency
+
+        self.served = 0
+        self.missing = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        # Spawned shard processes get a copy with their own counters and lock
+        state = dict(self.__dict__)
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if self.latency:
+            time.sleep(self.latency)
+
+        content = self.pages.get(request.url)
+
+        with self.lock:
+            if content is None:
+                self.missing += 1
+            else:
+                self.served += 1
+                self.bytes += len(content)
+
+        response = Response()
+        response.status_code = 404 if content is None else 200
+        response.reason = 'Not Found' if content is None else 'OK'
+        response.headers = CaseInsensitiveDict({'Content-Type': 'text/html; charset=utf-8'})
+        response.raw = io.BytesIO(content or b'')
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.encoding = 'utf-8'
+        return response
+
+    def close(self):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help='Write synthetic fixture pages to a corpus.')
+    generate.add_argument('corpus')
+    generate.add_argument('--clubs', type=int, default=4)
+    generate.add_argument('--players', type=int, default=12)
+    generate.add_argument('--filler-tables', type=int, default=12)
+
+    record = commands.add_parser('record', help='Copy the pages of a real scrape from the page cache.')
+    record.add_argument('corpus')
+    record.add_argument('--page-cache', default=os.path.join('instance', 'page_cache'))
+
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        from benchmarks.fixtures import build_pages
+
+        pages = build_pages(args.clubs, args.players, args.filler_tables)
+    else:
+        pages = read_page_cache(args.page_cache)
+
+    save_corpus(args.corpus, pages)
+    print(f"{len(pages)} pages, {sum(map(len, pages.values())) / 2 ** 20:.1f} MB written to {args.corpus}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Query count and latency of the scatter chart's data path, before and after it became one joined query.
+
+Usage:
+    python -m benchmarks.scatter_queries [--leagues 3] [--clubs 20] [--players 30]
+"""
+import argparse
+
+from sqlalchemy import and_
+
+from benchmarks.common import count_queries, make_app, timed
+from benchmarks.seed import seed
+
+
+def legacy_scatter_data(position, x_stat, y_stat):
+    # The scatter chart's data path before it was rewritten, kept for comparison
+    import pandas as pd
+
+    from website.models import Player, PlayerStat, Stat, Club, League
+
+    x_id = Stat.query.filter(Stat.label == x_stat).first().id
+    y_id = Stat.query.filter(Stat.label == y_stat).first().id
+
+    player_queries = Player.query.filter(and_(Player.position == position,
+                                              Player.id.in_(p_id[0] for p_id in PlayerStat.query.with_entities(
+                                                  PlayerStat.player_id).all()))).all()
+
+    player_ids = [player.id for player in player_queries]
+    player_names = [player.name for player in player_queries]
+    player_ages = [player.age for player in player_queries]
+
+    club_ids = [player.club_id for player in player_queries]
+    club_queries = [Club.query.filter_by(id=club_id).first() for club_id in club_ids]
+
+    league_ids = [club.league_id for club in club_queries]
+    league_names = [League.query.filter_by(id=league_id).first().name for league_id in league_ids]
+
+    x_values = PlayerStat.query.filter(and_(PlayerStat.stat_id == x_id,
+                                            PlayerStat.player_id.in_(player_ids))).order_by(PlayerStat.player_id).all()
+    x_values = [x.value for x in x_values]
+
+    y_values = PlayerStat.query.filter(and_(PlayerStat.stat_id == y_id,
+                                            PlayerStat.player_id.in_(player_ids))).order_by(PlayerStat.player_id).all()
+    y_values = [y.value for y in y_values]
+
+    mk_values = [player.market_value for player in Player.query.filter(
+        Player.id.in_(player_ids)).order_by(Player.id).all()]
+
+    return pd.DataFrame({x_stat: x_values, y_stat: y_values, "Name": player_names, 'Age': player_ages,
+                         'Value': mk_values, 'League': league_names})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--leagues', type=int, default=3)
+    parser.add_argument('--clubs', type=int, default=20)
+    parser.add_argument('--players', type=int, default=30)
+    parser.add_argument('--position', default='Centre-Forward')
+    parser.add_argument('--x-stat', default='npxG: Non-Penalty xG')
+    parser.add_argument('--y-stat', default='Non-Penalty Goals')
+    args = parser.parse_args()
+
+    from website import db
+    from website.scatter import scatter_data
+
+    app = make_app()
+    with app.app_context():
+        rows = seed(args.leagues, args.clubs, args.players)
+        print(f"Seeded {rows} PlayerStat rows")
+
+        for name, function in [('before', legacy_scatter_data), ('after', scatter_data)]:
+            with count_queries(db.engine) as counter:
+                df = function(args.position, args.x_stat, args.y_stat)
+            _, seconds = timed(lambda: function(args.position, args.x_stat, args.y_stat))
+            db.session.remove()
+
+            print(f"{name:>6}: {counter.count:5d} queries  {seconds * 1000:8.1f} ms  {len(df['Name'])} players")
+
+
+if __name__ == '__main__':
+    main()
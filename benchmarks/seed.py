@@ -0,0 +1,71 @@
+# Synthetic database for benchmarks, shaped like the scraped data but at any scale
+import random
+
+OUTFIELD_STATS = ['Non-Penalty Goals', 'npxG: Non-Penalty xG', 'Shots Total', 'Assists',
+                  'xAG: Exp. Assisted Goals', 'npxG + xAG', 'Shot-Creating Actions', 'Passes Attempted',
+                  'Pass Completion %', 'Progressive Passes', 'Progressive Carries', 'Successful Take-Ons',
+                  'Touches (Att Pen)', 'Progressive Passes Rec', 'Tackles', 'Interceptions', 'Blocks',
+                  'Clearances', 'Aerials Won']
+
+GOALKEEPER_STATS = ['PSxG-GA', 'Goals Against', 'Save Percentage', 'PSxG/SoT', 'Save% (Penalty Kicks)',
+                    'Clean Sheet Percentage', 'Touches', 'Launch %', 'Goal Kicks', 'Avg. Length of Goal Kicks',
+                    'Crosses Stopped %', 'Def. Actions Outside Pen. Area', 'Avg. Distance of Def. Actions']
+
+POSITIONS = ['Goalkeeper', 'Centre-Back', 'Left-Back', 'Right-Back', 'Defensive Midfield', 'Central Midfield',
+             'Attacking Midfield', 'Left Winger', 'Right Winger', 'Centre-Forward', 'Second Striker']
+
+# Names the routes use as defaults, so they render against synthetic data
+DEFAULT_PLAYERS = {'Right Winger': ['Bukayo Saka', 'Phil Foden']}
+
+
+def seed(leagues=3, clubs=20, players=30, stats=None, seed_value=42):
+    """
+    Fill the database of the current app context with random leagues, clubs, players and stats.
+
+    Parameters:
+    - leagues (int): Number of leagues.
+    - clubs (int): Clubs in each league.
+    - players (int): Players in each club.
+    - stats (int): Outfield stats per player, the real 19 by default. Extra stats get
+      generated labels, which allows testing at larger widths.
+    - seed_value (int): Random seed, so runs are repeatable.
+
+    Returns:
+    - rows (int): Number of PlayerStat rows written.
+    """
+    from website.ingest import BulkWriter
+    from website.models import League, Club, Player, Stat, PlayerStat
+
+    rnd = random.Random(seed_value)
+    writer = BulkWriter(batch_size=20000)
+
+    outfield = OUTFIELD_STATS + [f'Stat {number}' for number in range(len(OUTFIELD_STATS), stats or 0)]
+    outfield_ids = [writer.insert_one(Stat, label=label) for label in outfield]
+    goalkeeper_ids = [writer.insert_one(Stat, label=label) for label in GOALKEEPER_STATS]
+
+    # Named players handed out to the first clubs
+    named = [(position, name) for position, names in DEFAULT_PLAYERS.items() for name in names]
+
+    player_id = 0
+    for league in range(leagues):
+        league_id = writer.insert_one(League, name=f'League {league}', coefficient=league + 1,
+                                      nation=f'Nation {league}')
+
+        for club in range(clubs):
+            club_id = writer.insert_one(Club, name=f'Club {league}-{club}', league_id=league_id)
+
+            for number in range(players):
+                player_id += 1
+                position = POSITIONS[number % len(POSITIONS)]
+                name = f'Player {player_id}'
+                if named and named[0][0] == position:
+                    name = named.pop(0)[1]
+
+                writer.add(Player, id=player_id, name=name, age=rnd.randint(17, 37), position=position,
+                           market_value=round(rnd.uniform(0, 120), 1), club_id=club_id)
+
+                for stat_id in goalkeeper_ids if position == 'Goalkeeper' else outfield_ids:
+                    writer.add(PlayerStat, player_id=player_id, stat_id=stat_id, value=round(rnd.uniform(0, 10), 2))
+
+    writer.flush()
+    return writer.written
@@ -1,7 +1,8 @@
 from website import create_app
 
-# Creation of Flask app / SQLite database
-app = create_app()
+# Creation of Flask app / SQLite database, except when worker processes import this module again
+if __name__ != '__mp_main__':
+    app = create_app()
 
 if __name__ == '__main__':
     # Run Flask application
@@ -0,0 +1,29 @@
+# Typeahead lookups of the name index
+from website.name_index import NameIndex
+
+NAMES = ['Bukayo Saka', 'Kai Havertz', 'Bruno Fernandes', 'Bernardo Silva', 'Mohamed Salah', 'Sandro Tonali']
+
+
+def build_index():
+    index = NameIndex()
+    for key, name in enumerate(NAMES):
+        index.add(key, name)
+    return index
+
+
+def test_complete_one_letter():
+    # Names starting with the letter, then names with a word starting with it, shortest first
+    index = build_index()
+    assert [NAMES[key] for key in index.complete('s')] == ['Sandro Tonali', 'Bukayo Saka', 'Mohamed Salah',
+                                                          'Bernardo Silva']
+
+
+def test_complete_two_letters():
+    # Names without a word starting with the query are never returned
+    index = build_index()
+    assert [NAMES[key] for key in index.complete('sa')] == ['Sandro Tonali', 'Bukayo Saka', 'Mohamed Salah']
+
+
+def test_complete_keys():
+    index = build_index()
+    assert [NAMES[key] for key in index.complete('sa', keys={1, 4})] == ['Mohamed Salah']
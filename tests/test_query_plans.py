@@ -0,0 +1,40 @@
+# Hot queries are answered from their indexes, read from SQLite's EXPLAIN QUERY PLAN
+import pytest
+
+from benchmarks.common import make_app
+from benchmarks.query_plans import full_scan_re, hot_queries, plan
+from benchmarks.seed import seed
+
+# Index each query has to search, by the query's name in hot_queries
+EXPECTED_INDEXES = {
+    'scatter chart': ['ix_stat_label', 'ix_player_position', 'ix_player_stat_player_id_stat_id'],
+    'matrix refresh': ['ix_scrape_checkpoint_kind_scraped_at', 'ix_player_stat_player_id_stat_id'],
+    'player stat by player and stat': ['ix_player_stat_player_id_stat_id'],
+    'stats of one player': ['ix_player_stat_player_id_stat_id'],
+    'one stat across players': ['ix_player_stat_stat_id_player_id_value'],
+    'player by name': ['ix_player_name_club_id'],
+    'player by name and club': ['ix_player_name_club_id'],
+    'players in position': ['ix_player_position'],
+    'stat by label': ['ix_stat_label'],
+}
+
+
+@pytest.fixture(scope='module')
+def plans(tmp_path_factory):
+    # A small seeded database, so the planner has the tables and statistics it would in use
+    app = make_app(str(tmp_path_factory.mktemp('query-plans') / 'database.db'))
+    with app.app_context():
+        seed(leagues=2, clubs=5, players=20)
+        yield {name: plan(query) for name, query in hot_queries()}
+
+
+def test_every_query_checked(plans):
+    assert sorted(plans) == sorted(EXPECTED_INDEXES)
+
+
+@pytest.mark.parametrize('name', sorted(EXPECTED_INDEXES))
+def test_query_uses_indexes(plans, name):
+    lines = plans[name]
+    assert not [line for line in lines if full_scan_re.search(line)], lines
+    for index in EXPECTED_INDEXES[name]:
+        assert any(f'INDEX {index} ' in line for line in lines), lines
@@ -1,16 +1,51 @@
+import sqlite3
+
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from os import path
+from os import environ, path
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
 # Initiation of SQLAlchemy as db
 db = SQLAlchemy()
 DB_NAME = "database.db"
 
+# Settings applied to every SQLite connection
+# WAL lets pages be read while ingestion writes, NORMAL sync is safe with WAL and avoids an fsync per commit
+# busy_timeout comes first, so switching to WAL waits for other processes opening the database too
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -32000,
+    'temp_store': 'MEMORY',
+    'mmap_size': 268435456,
+}
+
 
-def create_app():
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Apply SQLITE_PRAGMAS to each new SQLite connection.
+    """
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+
+def create_app(config=None):
     """
     Create and configure the Flask app.
 
+    Startup only creates missing tables. Scraping runs in a background thread after the
+    first request (DATASCOUT_INGEST=background, the default) or separately through
+    `flask scrape` (DATASCOUT_INGEST=off, for servers running several workers).
+
+    Args:
+        config (dict): Optional settings overriding the defaults, such as another database.
+
     Returns:
         The Flask app.
     """
@@ -20,39 +55,131 @@ def create_app():
     app = Flask(__name__)
     app.config['SECRET_KEY'] = '3723523585828935985'
     app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_NAME}'
+
+    # Scraping settings, pages downloading at once and requests per second per host
+    app.config['CRAWL_WORKERS'] = 4
+    app.config['CRAWL_RATES'] = {}
+
+    # Transport adapter the crawler uses instead of HTTP, such as a replay of recorded pages, None for the network
+    app.config['CRAWL_ADAPTER'] = None
+
+    # Downloaded pages are kept on disk for a week and reused by later builds
+    app.config['PAGE_CACHE_DIR'] = path.join(app.instance_path, 'page_cache')
+    app.config['PAGE_CACHE_TTL'] = 7 * 24 * 60 * 60
+    app.config['PAGE_CACHE_OFFLINE'] = False
+
+    # Processes parsing downloaded pages, None for one per core, and pages fetched ahead of the scrapers
+    app.config['PARSE_WORKERS'] = None
+    app.config['PIPELINE_MAX_PENDING'] = 16
+
+    # League registry file, and the competition codes scraped, None for every league the registry enables
+    app.config['LEAGUES_FILE'] = path.join(path.dirname(__file__), 'leagues.json')
+    app.config['LEAGUES'] = None
+
+    # Processes scraping leagues at once, sharing each host's rate limit, None for one per league, 1 for no shards
+    app.config['SCRAPE_SHARDS'] = None
+
+    # Rows buffered before the scrapers write them to the database
+    app.config['INGEST_BATCH_SIZE'] = 1000
+
+    # Fitted models are saved here so retraining can warm start, set to None to always train from scratch
+    app.config['MODEL_CACHE_DIR'] = path.join(app.instance_path, 'models')
+
+    # Processes training position models at once, None for one per core
+    app.config['TRAIN_WORKERS'] = None
+
+    # Share of a position's players who need a stat for it to be a feature, gaps are filled with the median
+    app.config['FEATURE_MIN_COVERAGE'] = 0.9
+
+    # Rendered chart pages kept in memory per arguments and data version, 0 entries turns it off
+    app.config['RESPONSE_CACHE_ENTRIES'] = 256
+    app.config['RESPONSE_CACHE_SIZE'] = 64 * 1024 * 1024
+
+    # Seconds browsers and reverse proxies may reuse /api responses before revalidating them
+    app.config['API_MAX_AGE'] = 60
+
+    # Folder requests with ?profile=1 save a cProfile dump to, None turns profiling off
+    app.config['PROFILE_DIR'] = None
+
+    # How an incomplete database gets built, background or off
+    app.config['INGEST_ON_STARTUP'] = environ.get('DATASCOUT_INGEST', 'background')
+
+    if config:
+        app.config.update(config)
+
     db.init_app(app)
 
-    # Import blueprints of HTML pages
+    # Request, SQL and template timings, read at /metrics
+    from .metrics import init_app
+    init_app(app)
+
+    # Import blueprints of HTML pages and chart data
+    from .api import api
     from .home import home
     from .radar import radar
     from .scatter import scatter
+    from .status import status
 
     # Register blueprints in Flask app
     app.register_blueprint(home, url_prefix='/')
     app.register_blueprint(radar, url_prefix='/')
     app.register_blueprint(scatter, url_prefix='/')
+    app.register_blueprint(status, url_prefix='/')
+    app.register_blueprint(api, url_prefix='/')
+
+    # Register CLI commands
+    from .commands import scrape_command, train_command
+    app.cli.add_command(scrape_command)
+    app.cli.add_command(train_command)
 
     create_database(app)
 
+    if app.config['INGEST_ON_STARTUP'] == 'background':
+        from .worker import start_on_first_request
+        start_on_first_request(app)
+
     return app
 
 
 def create_database(app):
     """
-    Create the database if it doesn't exist and populate it with initial data.
+    Create any missing tables and upgrade the schema of older databases. Data stored before
+    scrape jobs were tracked is recorded as complete, everything else is left to the ingestion worker.
+
+    It all runs in one write transaction, taken before anything is read, so processes starting at
+    the same time, such as several web workers, set the database up one after another, and each
+    finds what the one before it did.
 
     Args:
         app (Flask): The Flask application.
     """
-    from .transfermarkt import scrape_data
-    from .fbref import scrape_stats
-
-    with app.app_context():
-        # If database doesn't exist
-        if not path.exists('instance/' + DB_NAME):
-            print('Database needs to be built')
-            # Create database schema
-            db.create_all()
-            scrape_data()
-            scrape_stats()
-        print('Database Online')
+    from sqlalchemy.exc import OperationalError
+
+    from .jobs import record_existing_data
+    from .migrations import migrate
+
+    with app.app_context(), db.engine.connect() as connection:
+        # The transaction is begun and ended here rather than by SQLAlchemy, which begins lazily
+        connection = connection.execution_options(isolation_level='AUTOCOMMIT')
+
+        # Wait for another process setting the database up, however long its migrations take
+        while True:
+            try:
+                connection.exec_driver_sql('BEGIN IMMEDIATE')
+                break
+            except OperationalError as error:
+                if 'locked' not in str(error):
+                    raise
+
+        try:
+            db.metadata.create_all(connection)
+            migrate(connection)
+            recorded = record_existing_data(connection)
+        except BaseException:
+            connection.exec_driver_sql('ROLLBACK')
+            raise
+        connection.exec_driver_sql('COMMIT')
+
+    if recorded:
+        print('Existing data recorded as complete')
+    print('Database Online')
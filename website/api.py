@@ -0,0 +1,163 @@
+from flask import Blueprint, current_app, jsonify, request
+
+from .caching import cached_page
+from .radar import radar_args
+from .scatter import scatter_args
+
+# Register Flask blueprint for the chart data the pages draw in the browser
+api = Blueprint('api', __name__)
+
+
+def similar_args():
+    """
+    The similar players query arguments with defaults applied, as (player, position, k, weighted).
+    """
+    return (request.args.get('player', 'Bukayo Saka'),
+            request.args.get('position') or None,
+            max(1, min(request.args.get('k', 10, type=int), 50)),
+            request.args.get('weighted', '1') != '0')
+
+
+def finite(values):
+    """
+    Floats ready for JSON, with NaN (no value) sent as null.
+    """
+    return [None if value is None or value != value else value for value in values]
+
+
+# Scatter chart data route
+@api.route('/api/scatter')
+@cached_page(scatter_args, public=True)
+def scatter_api():
+    """
+
+    This function returns the points of the scatter chart as columns, one list per field, along
+    with the least squares trendline of y on x and the histogram of x. Both are read from the
+    summaries computed after ingestion. Query arguments are the same as /scatter.
+
+    Returns:
+    JSON: position, x_stat, y_stat, the columns x, y, name, age, value and league, trendline
+    (x and y of both ends, slope, intercept and r_squared, or null with fewer than two players)
+    and histogram (start, size and counts of equal width bins).
+    """
+    from .scatter import scatter_data
+    from .summaries import scatter_summary
+
+    position, x_stat, y_stat = scatter_args()
+    data = scatter_data(position, x_stat, y_stat)
+    summary = scatter_summary(position, x_stat, y_stat, data[x_stat], data[y_stat])
+
+    trendline = None
+    if summary['slope'] is not None:
+        ends = [summary['x_min'], summary['x_max']]
+        trendline = {'x': ends, 'y': [summary['slope'] * x + summary['intercept'] for x in ends],
+                     'slope': summary['slope'], 'intercept': summary['intercept'],
+                     'r_squared': summary['r_squared']}
+
+    return jsonify({
+        'position': position,
+        'x_stat': x_stat,
+        'y_stat': y_stat,
+        'x': finite(data[x_stat]),
+        'y': finite(data[y_stat]),
+        'name': data['Name'],
+        'age': data['Age'],
+        'value': data['Value'],
+        'league': data['League'],
+        'trendline': trendline,
+        'histogram': {'start': summary['bin_start'], 'size': summary['bin_size'], 'counts': summary['bin_counts']},
+    })
+
+
+# Radar chart data route
+@api.route('/api/radar')
+@cached_page(radar_args, public=True)
+def radar_api():
+    """
+
+    This function returns the values drawn on the radar chart: the most important stats for the
+    position and each player's values scaled by the position's maximum. Query arguments are the
+    same as /radar.
+
+    Returns:
+    JSON: position, stats (labels of the top stats) and players (name -> scaled values, in the
+    order the players were asked for, leaving out names that weren't found), with status 404 and
+    no stats when no player with stats has the position.
+    """
+    from .dimensions import get_dimensions
+    from .importance import calc_stat_importance
+    from .radar import radar_values
+
+    position, player1, player2, players = radar_args()
+    if position not in get_dimensions().positions:
+        return jsonify({'position': position, 'stats': [], 'players': []}), 404
+
+    feature_importances, player_ids, player_names = calc_stat_importance(position)
+    top_stats, scaled_values = radar_values(players, feature_importances, position)
+
+    return jsonify({
+        'position': position,
+        'stats': top_stats,
+        'players': [{'name': name, 'values': finite(values)} for name, values in scaled_values.items()],
+    })
+
+
+# Player name typeahead route
+@api.route('/api/players/search')
+def player_search_api():
+    """
+
+    This function returns the players whose names best match a partly typed name, for the radar
+    page to load names as they are typed instead of listing every player. Names starting with the
+    query come first, then names with words starting with the query's words, then similar names.
+
+    Query arguments: q (the name typed so far), position and club (optional filters, club matches
+    any club whose name contains it) and limit (matches returned, 10 by default and at most 50).
+
+    Returns:
+    JSON: query and players (name, position and club of each match, best first).
+    """
+    from .player_search import get_player_search
+
+    query = request.args.get('q', '')
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+
+    players = get_player_search().search(query, position=request.args.get('position'),
+                                         club=request.args.get('club'), limit=limit)
+
+    # Not kept in the response cache, typed queries would push the charts out
+    response = jsonify({'query': query, 'players': players})
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['API_MAX_AGE']
+    return response
+
+
+# Similar players route
+@api.route('/api/players/similar')
+@cached_page(similar_args, public=True)
+def similar_players_api():
+    """
+
+    This function returns the players whose stats are closest to a given player's, within the
+    player's position. Stats are standardized over the position and, unless weighted=0, weighted
+    by their importance for the position's market values.
+
+    Query arguments: player, position (the player's own by default), k (players returned, 10 by
+    default and at most 50) and weighted (1 or 0).
+
+    Returns:
+    JSON: player, position, weighted, stats (labels compared) and players (name, age, value and
+    distance of each, closest first), with status 404 when the player isn't found in the position.
+    """
+    from .similarity import similar_players
+
+    player, position, k, weighted = similar_args()
+    similar, position, stat_labels = similar_players(player, position, k, weighted)
+
+    return jsonify({
+        'player': player,
+        'position': position,
+        'weighted': weighted,
+        'stats': stat_labels,
+        'players': similar or [],
+    }), 200 if similar is not None else 404
@@ -0,0 +1,208 @@
+# Small in-memory caches shared by the analytics routes
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Thread-safe least recently used cache.
+
+    Entries are evicted oldest-use first once there are more than max_entries of them,
+    or once the sizes of the stored values add up to more than max_size.
+
+    Parameters:
+    - max_entries (int): Most entries kept.
+    - max_size (int): Optional limit on the total size of the values.
+    - sizeof (function): Size of a value, used with max_size. Defaults to len.
+    """
+
+    def __init__(self, max_entries=128, max_size=None, sizeof=len):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.sizeof = sizeof
+
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Return the value stored under key, marking it as recently used.
+        """
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return default
+
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        """
+        Store a value, evicting the least recently used entries if the cache is full.
+        """
+        size = self.sizeof(value) if self.max_size is not None else 0
+
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.sizes.pop(key)
+                del self.entries[key]
+
+            self.entries[key] = value
+            self.sizes[key] = size
+            self.size += size
+
+            while len(self.entries) > self.max_entries or \
+                    (self.max_size is not None and self.size > self.max_size and len(self.entries) > 1):
+                old_key, _ = self.entries.popitem(last=False)
+                self.size -= self.sizes.pop(old_key)
+
+    def clear(self):
+        """
+        Remove every entry.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.sizes.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+
+class CachedPage:
+    """
+    A rendered page kept by cached_page, with its ETag and precompressed bodies.
+
+    Attributes:
+    - bodies (dict): Content encoding ('identity', 'gzip' or 'br') -> bytes to send.
+    - etag (str): Hash of the uncompressed body, the ETag of the identity body.
+    - mimetype (str): Mimetype of the response.
+    - size (int): Total bytes held, used to bound the cache.
+    """
+
+    def __init__(self, body, mimetype, min_compress_size=1024):
+        import gzip
+        import hashlib
+
+        self.bodies = {'identity': body}
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.mimetype = mimetype
+
+        # Compressed once here rather than on every response
+        if len(body) >= min_compress_size:
+            self.bodies['gzip'] = gzip.compress(body, compresslevel=6)
+
+            # Brotli is optional, used when the package is installed
+            try:
+                import brotli
+            except ImportError:
+                pass
+            else:
+                self.bodies['br'] = brotli.compress(body, quality=5)
+
+        self.size = sum(len(encoded) for encoded in self.bodies.values())
+
+    def etag_for(self, encoding):
+        """
+        ETag of one encoding's body. Each encoding has its own, as the bodies differ byte for byte.
+        """
+        return self.etag if encoding == 'identity' else f'{self.etag}-{encoding}'
+
+    def encoding_for(self, accept_encodings):
+        """
+        Smallest stored encoding the client accepts.
+        """
+        encodings = [encoding for encoding in ('br', 'gzip') if encoding in self.bodies and accept_encodings[encoding]]
+        return min(encodings, key=lambda encoding: len(self.bodies[encoding]), default='identity')
+
+
+def response_cache():
+    """
+    The app's cache of rendered pages, created on first use from RESPONSE_CACHE_ENTRIES
+    and RESPONSE_CACHE_SIZE (bytes).
+    """
+    from flask import current_app
+
+    cache = current_app.extensions.get('response_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault('response_cache', LRUCache(
+            max_entries=current_app.config['RESPONSE_CACHE_ENTRIES'],
+            max_size=current_app.config['RESPONSE_CACHE_SIZE'],
+            sizeof=lambda page: page.size))
+    return cache
+
+
+def cached_page(key_function, public=False):
+    """
+    Decorator caching a view's rendered response per normalized query arguments and data version,
+    so repeated views are served from memory. Responses carry an ETag, matching If-None-Match
+    requests get a 304, and bodies are sent gzip or brotli compressed when the client accepts it.
+
+    Parameters:
+    - key_function (function): Called inside the request, returns the view's arguments
+      with defaults applied, as a hashable value.
+    - public (bool): Let browsers and reverse proxies reuse the response for API_MAX_AGE
+      seconds before revalidating, rather than revalidating every time.
+
+    Returns:
+    function: The decorator.
+    """
+    from functools import wraps
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import current_app, g, make_response, request
+
+            from .versioning import data_version
+
+            if not current_app.config['RESPONSE_CACHE_ENTRIES']:
+                return view(*args, **kwargs)
+
+            cache = response_cache()
+            key = (request.endpoint, key_function(), data_version())
+
+            page = cache.get(key)
+            if page is None:
+                # Set by the view if it used models older than the data
+                g.pop('stale_models', None)
+                response = make_response(view(*args, **kwargs))
+
+                # Only successful pages are kept, errors and pages built from models older than the data
+                # are rendered again next time
+                if response.status_code != 200 or response.direct_passthrough or g.get('stale_models'):
+                    return response
+
+                page = CachedPage(response.get_data(), response.mimetype)
+                cache.put(key, page)
+
+            # Any encoding's ETag revalidates the page, its content is the same
+            encoding = page.encoding_for(request.accept_encodings)
+            if any(request.if_none_match.contains(page.etag_for(stored)) for stored in page.bodies):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.response_class(page.bodies[encoding], mimetype=page.mimetype)
+                if encoding != 'identity':
+                    response.headers['Content-Encoding'] = encoding
+
+            response.set_etag(page.etag_for(encoding))
+            response.vary.add('Accept-Encoding')
+            if public:
+                response.cache_control.public = True
+                response.cache_control.max_age = current_app.config['API_MAX_AGE']
+            else:
+                # Browsers revalidate every time, so new data shows once ingestion bumps the version
+                response.cache_control.no_cache = True
+            return response
+
+        return wrapper
+
+    return decorator
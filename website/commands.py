@@ -0,0 +1,63 @@
+# Flask CLI commands for managing the data
+import click
+from flask.cli import with_appcontext
+
+from . import db
+
+
+@click.command('scrape')
+@click.option('--resume', is_flag=True, help='Skip every page already stored, continuing an interrupted build.')
+@click.option('--refresh-older-than', 'max_age', metavar='AGE',
+              help='Only scrape pages stored longer ago than AGE, such as 7d, 12h or 30m.')
+@click.option('--source', type=click.Choice(['all', 'transfermarkt', 'fbref']), default='all',
+              help='Which site to scrape.')
+@click.option('--league', 'leagues', multiple=True, metavar='CODE',
+              help='Competition code of a league to scrape, such as GB1, every enabled league by default.')
+@with_appcontext
+def scrape_command(resume, max_age, source, leagues):
+    """
+    Scrape Transfermarkt and FBref into the database.
+
+    With no options every page is scraped again and stored rows are updated.
+    Scatter chart trendlines and histograms, and the models of every position, are computed again afterwards.
+    """
+    from flask import current_app
+
+    from .jobs import parse_age, run_scrape
+    from .leagues import selected_leagues
+    from .importance import train_positions
+    from .summaries import compute_summaries
+
+    if resume and max_age:
+        raise click.UsageError('--resume and --refresh-older-than cannot be used together')
+
+    try:
+        max_age = parse_age(max_age) if max_age else None
+    except ValueError as error:
+        raise click.BadParameter(str(error), param_hint='--refresh-older-than')
+
+    try:
+        selected_leagues(current_app.config, leagues)
+    except ValueError as error:
+        raise click.BadParameter(str(error), param_hint='--league')
+
+    db.create_all()
+
+    mode = 'resume' if resume else 'refresh' if max_age else 'build'
+    sources = ('transfermarkt', 'fbref') if source == 'all' else (source,)
+    run_scrape(mode, max_age, sources, leagues)
+    compute_summaries()
+    train_positions()
+
+
+@click.command('train')
+@click.option('--position', 'positions', multiple=True, help='Position to train, every position by default.')
+@click.option('--full', is_flag=True, help='Train new models rather than extending saved ones.')
+@with_appcontext
+def train_command(positions, full):
+    """
+    Train the market value model of each position and store its feature importances.
+    """
+    from .importance import train_positions
+
+    train_positions(list(positions) or None, warm_start=not full)
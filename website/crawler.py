@@ -0,0 +1,270 @@
+# Rate-limited concurrent page fetching shared by the scrapers
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Cover headers used to appear as browser
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                  'Chrome/47.0.2526.106 Safari/537.36',
+    'Connection': 'keep-alive'}
+
+# Requests per second allowed for each host, anything not listed uses DEFAULT_RATE
+# FBref blocks IPs that go above roughly 15 requests a minute
+HOST_RATES = {'fbref.com': 0.25}
+DEFAULT_RATE = 2.0
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket used to keep requests to one host under its allowed rate.
+
+    Parameters:
+    - rate (float): Tokens added per second.
+    - capacity (int): Maximum number of tokens that can be saved up for a burst.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a token is available and take it.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                # Refill based on time passed since last update
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                # Time until the next whole token
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class SharedBucket:
+    """
+    Token bucket shared by several processes, so scrapers running in parallel processes still
+    keep to one budget for a host between them. The tokens and last refill time live in shared
+    memory, and the monotonic clock is the same in every process on the machine.
+
+    It has to reach the other processes when they are started, such as through a process pool's
+    initializer, rather than being sent with each task.
+
+    Parameters:
+    - rate (float): Tokens added per second.
+    - capacity (int): Maximum number of tokens that can be saved up for a burst.
+    - context: multiprocessing context the processes are started with, the default one if None.
+    """
+
+    def __init__(self, rate, capacity=1, context=None):
+        self.rate = rate
+        self.capacity = capacity
+        # tokens, updated
+        self.state = (context or multiprocessing).Array('d', [capacity, time.monotonic()])
+
+    def acquire(self):
+        """
+        Block until a token is available and take it.
+        """
+        while True:
+            with self.state.get_lock():
+                now = time.monotonic()
+                tokens = min(self.capacity, self.state[0] + (now - self.state[1]) * self.rate)
+                self.state[1] = now
+
+                if tokens >= 1:
+                    self.state[0] = tokens - 1
+                    return
+
+                self.state[0] = tokens
+                wait = (1 - tokens) / self.rate
+
+            time.sleep(wait)
+
+
+def host_name(url):
+    """
+    Host of a URL without www., the key of its rate limit.
+    """
+    host = urlparse(url).netloc
+    return host[4:] if host.startswith('www.') else host
+
+
+def shared_buckets(hosts, rates=None, context=None):
+    """
+    A SharedBucket for each host, at the rate the host allows.
+
+    Parameters:
+    - hosts (list): Hosts, without www.
+    - rates (dict): Requests per second for each host, overriding HOST_RATES.
+    - context: multiprocessing context the processes sharing the buckets are started with.
+
+    Returns:
+    - buckets (dict): Host -> SharedBucket.
+    """
+    rates = dict(HOST_RATES, **(rates or {}))
+    return {host: SharedBucket(rates.get(host, DEFAULT_RATE), context=context) for host in hosts}
+
+
+class Crawler:
+    """
+    Fetches pages over a shared keep-alive session using a bounded pool of worker threads.
+    Every request waits on the token bucket of its host, so the pool never goes above the
+    rate a host allows while parsing and database writes carry on in the calling thread.
+
+    Parameters:
+    - max_workers (int): Number of pages that can be downloading at the same time.
+    - rates (dict): Requests per second for each host, overriding HOST_RATES.
+    - timeout (int): Seconds before a request is abandoned.
+    - cache (PageCache): Optional on-disk cache checked before going to the network.
+    - adapter (BaseAdapter): Transport used instead of HTTP, such as a replay of recorded pages.
+    - buckets (dict): Host -> token bucket to use instead of the crawler's own, such as
+      SharedBuckets spreading a host's rate over several processes.
+    """
+
+    def __init__(self, max_workers=4, rates=None, timeout=30, cache=None, adapter=None, buckets=None):
+        self.rates = dict(HOST_RATES, **(rates or {}))
+        self.timeout = timeout
+        self.cache = cache
+
+        # One session so TCP/TLS connections are reused between pages
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        if adapter is None:
+            adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=2)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.buckets = dict(buckets or {})
+        self.buckets_lock = threading.Lock()
+
+    def bucket(self, url):
+        """
+        Return the token bucket for the host of a URL, creating it on first use.
+        """
+        host = host_name(url)
+
+        with self.buckets_lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.rates.get(host, DEFAULT_RATE))
+            return self.buckets[host]
+
+    def get(self, url):
+        """
+        Fetch a single page. A fresh copy in the cache is returned straight away, a stale one is
+        revalidated with a conditional GET, and only a changed or missing page is downloaded.
+        Network requests wait for the host's rate limit first.
+
+        Parameters:
+        - url (str): Page to download.
+
+        Returns:
+        - content (bytes): Body of the response.
+        """
+        entry = self.cache.lookup(url) if self.cache else None
+        headers = {}
+
+        if entry:
+            if self.cache.offline or self.cache.is_fresh(entry):
+                return self.cache.read(entry)
+            headers = self.cache.conditional_headers(entry)
+
+        elif self.cache and self.cache.offline:
+            raise requests.RequestException(f"{url} is not in the page cache")
+
+        self.bucket(url).acquire()
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+
+        # Page hasn't changed since it was cached
+        if entry and response.status_code == 304:
+            self.cache.touch(entry)
+            return self.cache.read(entry)
+
+        response.raise_for_status()
+
+        if self.cache:
+            self.cache.store(url, response.content, response.headers)
+
+        return response.content
+
+    def submit(self, url):
+        """
+        Start fetching a page in the background.
+
+        Returns:
+        - future (Future): Resolves to the page body.
+        """
+        return self.executor.submit(self.get, url)
+
+    def map(self, urls):
+        """
+        Queue every URL for fetching at once and yield each page in the original order
+        as soon as it is ready. Pages later in the list keep downloading while the caller
+        works on earlier ones.
+
+        Parameters:
+        - urls (list): Pages to download.
+
+        Yields:
+        - (url, content): The URL and its body, or None as content if the request failed.
+        """
+        futures = [(url, self.submit(url)) for url in urls]
+
+        for url, future in futures:
+            try:
+                yield url, future.result()
+            except requests.RequestException as error:
+                print(f"Failed to fetch {url}: {error}")
+                yield url, None
+
+    def close(self):
+        """
+        Stop the worker threads and close the session.
+        """
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+    @classmethod
+    def from_config(cls, config, buckets=None):
+        """
+        Build a crawler from the Flask app config, with the page cache kept in the instance folder.
+
+        Parameters:
+        - config (Config): The Flask app's config.
+        - buckets (dict): Host -> token bucket shared with other crawlers.
+
+        Returns:
+        - crawler (Crawler): The configured crawler.
+        """
+        from .page_cache import PageCache
+
+        cache = None
+        if config.get('PAGE_CACHE_DIR'):
+            cache = PageCache(config['PAGE_CACHE_DIR'], ttl=config.get('PAGE_CACHE_TTL'),
+                              offline=config.get('PAGE_CACHE_OFFLINE', False))
+
+        return cls(max_workers=config.get('CRAWL_WORKERS', 4), rates=config.get('CRAWL_RATES'), cache=cache,
+                   adapter=config.get('CRAWL_ADAPTER'), buckets=buckets)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
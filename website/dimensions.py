@@ -0,0 +1,77 @@
+# Positions and stat sets the pages offer, worked out once per data version
+import threading
+
+import numpy as np
+
+from .matrix import get_matrix
+
+GOALKEEPER = 'Goalkeeper'
+
+
+class Dimensions:
+    """
+    What the chart dropdowns list, derived from the stat matrix rather than queried per request.
+    Stat sets come from which stats each position's players actually have, so goalkeeper and
+    outfield stats are told apart by the data instead of by their place in the Stat table.
+
+    Attributes:
+    - positions (list): Positions of players with stats, in the order players were stored.
+    - stats (dict): Position -> labels of the stats its players have, in Stat table order.
+    - outfield_stats (list): Labels of the stats any outfield player has.
+    - goalkeeper_stats (list): Labels of the stats any goalkeeper has.
+    - version (int): Data version the dimensions were worked out from.
+
+    Parameters:
+    - matrix (StatMatrix): The stat matrix of the current data version.
+    """
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self.version = matrix.version
+
+        # Which players have a value for each stat
+        has_value = ~np.isnan(matrix.values)
+        has_stats = matrix.has_stats()
+        labels = np.array(matrix.stat_labels, dtype=object)
+
+        self.positions = list(dict.fromkeys(position for position in matrix.positions[has_stats].tolist() if position))
+
+        self.stats = {}
+        for position in self.positions:
+            rows = matrix.position_mask(position)
+            self.stats[position] = labels[has_value[rows].any(axis=0)].tolist()
+
+        outfield = has_stats & (matrix.positions != GOALKEEPER)
+        self.outfield_stats = labels[has_value[outfield].any(axis=0)].tolist()
+        self.goalkeeper_stats = labels[has_value[has_stats & ~outfield].any(axis=0)].tolist()
+
+    def position_stats(self, position):
+        """
+        Labels of the stats a position's players have, the outfield stats for an unknown position.
+        """
+        if position in self.stats:
+            return self.stats[position]
+        return self.goalkeeper_stats if position == GOALKEEPER else self.outfield_stats
+
+
+# Dimensions shared by every request in this process
+current = {'dimensions': None}
+lock = threading.Lock()
+
+
+def get_dimensions():
+    """
+    The dimensions of the current data version, worked out again only when the stat matrix changes.
+
+    Returns:
+    - dimensions (Dimensions): The up to date dimensions.
+    """
+    matrix = get_matrix()
+    dimensions = current['dimensions']
+    if dimensions is not None and dimensions.matrix is matrix:
+        return dimensions
+
+    with lock:
+        if current['dimensions'] is None or current['dimensions'].matrix is not matrix:
+            current['dimensions'] = Dimensions(matrix)
+        return current['dimensions']
@@ -1,190 +1,226 @@
 # FBref data collection
+import re
 
-def scrape_stats():
+from unidecode import unidecode
+
+# Club name in the header of a squad page
+TITLE_PATTERN = re.compile(r'\d{4}-\d{4}\s(.+?)\sStats')
+
+
+def squads(links, club_aliases):
     """
-    This function collects statistical data for football clubs and players from FBref.com,
-    from leagues such as the Premier League, Serie A, and La Liga. It iterates
-    through each league, retrieves club information, and then extracts player data for each club.
-    The collected data includes player statistics such as goals, assists, passes, etc.
+    Squad pages linked from a parsed league page, with club names written the way Transfermarkt
+    writes them where they are known to differ.
 
     Parameters:
-    None
+    - links (list): (href, text) of the league page's links.
+    - club_aliases (dict): FBref club name -> Transfermarkt club name, from the league registry.
 
     Returns:
-    None
+    - squads (list): (URL, club name) of each squad page.
+    """
+    # Collected club name from link's HREF
+    initial_club_names = [text.replace('Utd', 'United') for href, text in links if '/squads' in href]
 
+    # Convert some club names which are not similar to existing in database
+    club_names = [club_aliases.get(club_name, club_name) for club_name in initial_club_names]
 
-    """
-    import requests
-    from bs4 import BeautifulSoup
-    import re
+    # Obtain HREF from each link
+    links = [href for href, text in links if '/squads/' in href]
 
-    import time
+    # Generate full URLs with prefix
+    return [(f"https://fbref.com{link}", club) for link, club in zip(links, club_names)]
 
-    from fuzzywuzzy import fuzz
-    from sqlalchemy import and_
-    from unidecode import unidecode
-
-    from . import db
 
-    # Prevent IP from being blocked
-    DELAY = 4
+def match_club(club_id, club, page):
+    """
+    Match a squad page's club to a Transfermarkt club, by its linked name or else the name in
+    the page's header.
 
-    from .models import Club, Player, Stat, PlayerStat
-
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) '
-                      'Chrome/47.0.2526.106 Safari/537.36',
-        'Connection': 'keep-alive'}
+    Parameters:
+    - club_id (function): Looks up a club name, returning None when nothing matches, such as Resolver.club_id.
+    - club (str): Club name the league page linked the squad with.
+    - page (dict): The parsed squad page.
 
-    urls = ["https://fbref.com/en/comps/9/stats/Premier-League-Stats",
-            "https://fbref.com/en/comps/11/Serie-A-Stats",
-            "https://fbref.com/en/comps/12/La-Liga-Stats"
-            ]
+    Returns:
+    - club_id: What club_id returned, or None if the club isn't in the Transfermarkt data.
+    """
+    # Match club name between TransferMarkt and FBref
+    matched = club_id(club)
+
+    if matched is None:
+        print(club)
+        [club_title] = page['titles']
 
-    # Convert instances of club name that are very different from existing in database
-    club_name_conversion_dict = {"Rennes": "Stade Rennais FC", "Internazionale": "Inter Milan",
-                                 "Nott'ham Forest": "Nottingham Forest", "Wolves": "Wolverhampton Wanderers",
-                                 "Athletic Club": "Athletic Bilbao"}
+        # Text taken from header using {pattern} regular expression
+        matched = club_id(TITLE_PATTERN.search(club_title).group(1))
 
-    # Iterate over each league
-    for url in urls:
+    return matched
 
-        # Pause used to prevent over requesting
-        time.sleep(DELAY)
-        page_tree = requests.get(url, headers=headers)
-        soup = BeautifulSoup(page_tree.content, 'html.parser', from_encoding='utf-8')
 
-        # Club urls collection
-        teams_table = soup.select('table.stats_table')[0]
-        links = teams_table.find_all('a')
+def player_links(page):
+    """
+    URLs of the player pages linked from a parsed squad page.
+    """
+    # Player url collection
+    links = [link for link in page['links'] if '/players/' in link]
+    links = [link for link in links if '/matchlogs/' not in link]
+
+    return [f"https://fbref.com{link}" for link in links]
 
-        # Collected club name from link's HREF
-        initial_club_names = [link.get_text(strip=True).replace('Utd', 'United') for link in links if
-                              '/squads' in link.get("href")]
 
-        # Convert some club names which are not similar to existing in database
-        club_names = []
-        for club_name in initial_club_names:
-            if club_name in club_name_conversion_dict.keys():
-                club_names.append(club_name_conversion_dict[club_name])
-            else:
-                club_names.append(club_name)
+def store_player(resolver, writer, page, club_id):
+    """
+    Buffer the stats of a parsed player page, if the player is in the club's Transfermarkt squad.
 
-        # Obtain HREF from each link
-        links = [link.get("href") for link in links if '/squads/' in link.get("href")]
+    Parameters:
+    - resolver (Resolver): Stored players, stats and player stats.
+    - writer (BulkWriter): Buffers the stats.
+    - page (dict): The parsed player page, only the headline and the scouting report are read.
+    - club_id (int): ID of the player's club.
 
-        # Generate full URLs with prefix
-        team_urls = [f"https://fbref.com{link}" for link in links]
+    Returns:
+    - player_id (int): ID of the player, or None if they weren't matched.
+    """
+    # Player attributes
+    # Name
+    [name] = [unidecode(name) for name in page['names']]
 
-        # Iterate over each club
-        for team_url, club in zip(team_urls, club_names):
-            time.sleep(DELAY)
-            page_tree = requests.get(team_url, headers=headers)
-            soup = BeautifulSoup(page_tree.content, 'html.parser', from_encoding='utf-8')
+    # Aims to match names and merge
+    player_id = resolver.player_id(name, club_id)
+    if player_id is None:
+        return None
 
-            # Try except block to match club name between TransferMarkt and FBref
-            try:
-                # Club name is a substring of record in Club
-                club_id = Club.query.filter(Club.name.like(f"%{club}%")).first().id
+    # Scrape stat labels and values from each player page
+    for label, value in zip(page['labels'], page['values']):
 
-            except AttributeError:
-                print(club)
-                span_re = re.compile('<span>(.*)<\/span>')
+        # Takes id from Stat table based on label, adding the stat if it doesn't exist
+        stat_id = resolver.stat_id(writer, label)
 
-                [club_title] = span_re.findall(str(soup.select('#meta')[0].find_all('h1')))
-                pattern = re.compile(r'\d{4}-\d{4}\s(.+?)\sStats')
+        # Value conversion from percentage
+        value = float(value.rstrip('%'))
 
-                # Text taken from header using {pattern} regular expression
-                club_name = pattern.search(club_title).group(1)
-                try:
-                    club_id = Club.query.filter(Club.name.like(f'%{club_name}%')).first().id
+        # Buffer row in PlayerStat table, updating the value rather than duplicating it
+        resolver.store_player_stat(writer, player_id, stat_id, value)
 
-                except AttributeError:
-                    clubs = Club.query.all()
-                    for db_club in clubs:
+    return player_id
 
-                        # Match based on similar strings
-                        if fuzz.ratio(club_name, db_club.name) >= 90:
-                            club_id = Club.query.filter(Club.name == db_club.name).first().id
 
-            # Player url collection
-            teams_table = soup.select('table.stats_table')[0]
-            links = teams_table.find_all('a')
-            links = [link.get("href") for link in links if '/players/' in link.get("href")]
-            links = [link for link in links if '/matchlogs/' not in link]
+def scrape_stats(checkpoints, leagues=None):
+    """
+    This function collects statistical data for football clubs and players from FBref.com,
+    for the leagues in the league registry, such as the Premier League, Serie A, and La Liga. It iterates
+    through each league, retrieves club information, and then extracts player data for each club.
+    The collected data includes player statistics such as goals, assists, passes, etc.
+    Pages with a fresh checkpoint are skipped, and stats already stored are updated. A club or
+    league is only checkpointed once every page under it was fetched, so resuming retries the
+    requests that failed. Pages fetched but of no use, such as a player without stats or a club
+    that isn't in the TransferMarkt data, are checkpointed as well, so they aren't fetched again.
 
-            player_urls = [f"https://fbref.com{link}" for link in links]
+    Parameters:
+    - checkpoints (Checkpoints): Pages already stored by this or earlier scrape jobs.
+    - leagues (list): Leagues from the registry, those selected in the config by default.
 
-            # Iterate over each player
-            for player_url in player_urls:
-                time.sleep(DELAY)
-                page_tree = requests.get(player_url, headers=headers)
-                soup = BeautifulSoup(page_tree.content, 'html.parser', from_encoding='utf-8')
-
-                # Player attributes
-                # Name
-                name = unidecode(str(soup.select('#meta')[0].find_all('h1')))
-
-                span_re = re.compile('<span>(.*)<\/span>')
-                [name] = span_re.findall(name)
-
-                # Aims to match names and merge
-                try:
-                    player_id = Player.query.filter(and_(Player.name == name), Player.club_id == club_id).first().id
-
-                except AttributeError:
-                    continue
+    Returns:
+    None
 
-                try:
-                    table = soup.find('table').find('tbody')
 
-                except ValueError:
-                    continue
+    """
+    import time
 
-                except AttributeError:
+    from flask import current_app
+
+    from .ingest import BulkWriter
+    from .leagues import selected_leagues
+    from .parsers import parse_fbref_links, parse_fbref_player, parse_fbref_squad
+    from .pipeline import Pipeline
+    from .resolver import Resolver
+
+    # Pages are fetched in the background at the rate FBref allows, to prevent IP from being blocked,
+    # and parsed in worker processes
+    pipeline = Pipeline.from_config(current_app.config, 'fbref')
+
+    # Stats are written in batches, one transaction per club page
+    writer = BulkWriter(batch_size=current_app.config.get('INGEST_BATCH_SIZE', 1000))
+    pipeline.watch(writer)
+
+    # Players, clubs, stats and stored player stats loaded once, so matching doesn't query per row
+    resolver = Resolver()
+
+    # Leagues FBref covers, with the club names each needs converted
+    if leagues is None:
+        leagues = selected_leagues(current_app.config)
+    aliases = {league['fbref']: league['club_aliases'] for league in leagues if league['fbref']}
+
+    try:
+        # Iterate over each league
+        for url, links in pipeline.map([url for url in aliases if not checkpoints.is_done(url)], parse_fbref_links):
+            if links is None:
+                # Fetched but unreadable, it is checkpointed so it isn't fetched again
+                if url not in pipeline.failed:
+                    checkpoints.mark(writer, 'league', url)
+                    writer.flush()
+                continue
+
+            start = time.perf_counter()
+
+            # Squad pages with converted club names, leaving out clubs already stored
+            teams = [(team_url, club) for team_url, club in squads(links, aliases[url])
+                     if not checkpoints.is_done(team_url)]
+            team_urls = [team_url for team_url, _ in teams]
+            club_names = [club for _, club in teams]
+            pipeline.resolved(time.perf_counter() - start)
+
+            # Iterate over each club, later club pages keep downloading while earlier ones are processed
+            league_complete = True
+            for (team_url, page), club in zip(pipeline.map(team_urls, parse_fbref_squad), club_names):
+                # The league is left unmarked so resuming fetches the squad again
+                if team_url in pipeline.failed:
+                    league_complete = False
                     continue
 
-                # Scrape stat labels from each player page
-                labels_table = soup.select_one("table[id*=scout_summary]")
-                if labels_table:
-                    tbody = labels_table.find('tbody')
-                    th_tags = tbody.find_all("th")
-                    labels_html = [th.text for th in th_tags if len(th.text) > 1]
+                start = time.perf_counter()
+                club_id = match_club(resolver.club_id, club, page) if page is not None else None
 
-                    # Scrape values from each player page
-                    values_html = table.find_all('td', class_='right')
-                    values = [value.get_text(strip=True) for value in values_html
-                              if len(value.get_text(strip=True)) > 1]
-
-                    for label, value in zip(labels_html, values):
+                # Squad page didn't parse or the club isn't in the TransferMarkt data, which
+                # fetching it again won't change, so it is checkpointed with nothing stored
+                if club_id is None:
+                    checkpoints.mark(writer, 'club', team_url)
+                    writer.flush()
+                    pipeline.resolved(time.perf_counter() - start)
+                    continue
 
-                        labels = db.session.query(Stat.label).all()
+                player_urls = [player_url for player_url in player_links(page) if not checkpoints.is_done(player_url)]
+                pipeline.resolved(time.perf_counter() - start)
 
-                        # Remove strange tuple structure from db query in labels
-                        # Removes empty values
-                        labels = [label[0] for label in labels if len(label[0]) > 1]
+                # Iterate over each player
+                complete = True
+                for player_url, page in pipeline.map(player_urls, parse_fbref_player):
+                    # The club is left unmarked so resuming fetches the player again
+                    if player_url in pipeline.failed:
+                        complete = False
+                        continue
 
-                        # Check stat doesn't exist already in Stat table
-                        if label not in labels:
-                            stat = Stat(label=label)
+                    start = time.perf_counter()
+                    player_id = store_player(resolver, writer, page, club_id) if page is not None else None
 
-                            # Commit to DB
-                            db.session.merge(stat)
-                            db.session.commit()
+                    # Player's page is stored along with the club's batch, a page without stats or a
+                    # player who isn't in the club's TransferMarkt squad is checkpointed with no ID
+                    checkpoints.mark(writer, 'player', player_url, player_id)
+                    pipeline.resolved(time.perf_counter() - start)
 
-                        # Takes id from Stat table based on label
-                        stat_id = Stat.query.filter(Stat.label == label).first().id
+                # Write every stat from the club's players in one transaction
+                if complete:
+                    checkpoints.mark(writer, 'club', team_url, club_id)
+                league_complete = league_complete and complete
+                writer.flush()
 
-                        # Value conversion from percentage
-                        value = float(value.rstrip('%'))
+            if league_complete:
+                checkpoints.mark(writer, 'league', url)
+            writer.flush()
 
-                        # Avoid making duplicates
-                        if not PlayerStat.query.filter(and_(PlayerStat.player_id == player_id,
-                                                            PlayerStat.stat_id == stat_id)).first():
-                            # Create instance in PlayerStat table
-                            player_stat = PlayerStat(player_id=player_id, stat_id=stat_id, value=value)
+    finally:
+        pipeline.close()
 
-                            # Commit player_stat
-                            db.session.merge(player_stat)
-                            db.session.commit()
+    pipeline.report()
+    print("FBref data taken")
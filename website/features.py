@@ -0,0 +1,82 @@
+# Training input for the market value models, sliced from the stat matrix
+import hashlib
+
+import numpy as np
+
+
+def covered_stats(values, min_coverage):
+    """
+    The stats enough players have, with the gaps filled by each stat's median.
+
+    Parameters:
+    - values (ndarray): Rows of the stat matrix, NaN where a player has no value.
+    - min_coverage (float): Share of rows (0 to 1) needing a value for a stat to be kept.
+
+    Returns:
+    - x (ndarray): Values of the kept stats, a copy without gaps.
+    - columns (ndarray): Matrix column of each stat kept, in stat ID order.
+    """
+    coverage = (~np.isnan(values)).mean(axis=0) if len(values) else np.zeros(values.shape[1])
+    columns = np.flatnonzero((coverage >= min_coverage) & (coverage > 0))
+
+    x = values[:, columns]
+    missing = np.isnan(x)
+    if missing.any():
+        x[missing] = np.nanmedian(x, axis=0)[np.nonzero(missing)[1]]
+
+    return x, columns
+
+
+def build_features(matrix, position, min_coverage):
+    """
+    Features and target for a position's market value model.
+
+    Columns come from the matrix, which is aligned by stat ID, so column i of x is always the stat
+    stat_labels[i], whatever order rows were stored in. Missing values are handled explicitly:
+    - players with no known market value are left out, rather than treated as worth 0
+    - stats fewer than min_coverage of the position's players have are left out
+    - the remaining gaps are filled with the stat's median in the position
+
+    Parameters:
+    - matrix (StatMatrix): The stat matrix.
+    - position (str): Position of the players.
+    - min_coverage (float): Share of players (0 to 1) needing a value for a stat to be kept,
+      the FEATURE_MIN_COVERAGE config.
+
+    Returns:
+    - x (ndarray): Stat values, one row per player and one column per stat.
+    - y (ndarray): Market values.
+    - stat_labels (list): Label of each column of x.
+    - player_ids (list): Player ID of each row.
+    """
+    # Players in the position with stats and a known market value
+    rows = np.flatnonzero(matrix.position_mask(position) & ~np.isnan(matrix.market_values))
+    x, columns = covered_stats(matrix.values[rows], min_coverage)
+
+    stat_labels = [matrix.stat_labels[column] for column in columns]
+    return x, matrix.market_values[rows], stat_labels, matrix.player_ids[rows].tolist()
+
+
+def raw_digest(matrix, player_ids, stat_labels):
+    """
+    Hash of players' stored stat values and market values, used to tell whether their data changed.
+
+    Values are hashed before gaps are filled: the medians filling them depend on every player in the
+    position, so adding players would otherwise change the hash of players whose data didn't change.
+
+    Parameters:
+    - matrix (StatMatrix): The stat matrix.
+    - player_ids (list): Players to hash, in order.
+    - stat_labels (list): Stats kept as features, in order.
+
+    Returns:
+    str: The hash, or None if a player or stat is no longer in the matrix.
+    """
+    rows = [matrix.player_index.get(player_id) for player_id in player_ids]
+    columns = [matrix.label_index.get(label) for label in stat_labels]
+    if None in rows or None in columns:
+        return None
+
+    values = matrix.values[np.ix_(rows, columns)]
+    return hashlib.sha1(values.tobytes() + matrix.market_values[rows].tobytes()
+                        + '\n'.join(stat_labels).encode('utf-8')).hexdigest()
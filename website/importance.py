@@ -1,16 +1,39 @@
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
-from sqlalchemy import and_
+import json
+import os
+import pickle
+import re
+import time
+from datetime import datetime
 
-from website.models import Player, PlayerStat, Stat
+from flask import current_app
+
+from website import db
+from website.caching import LRUCache
+from website.metrics import metrics
+from website.models import PositionModel
+from website.versioning import data_version
+
+# Importances already calculated, keyed by (position, data version)
+importance_cache = LRUCache(max_entries=32)
+
+# Trees in a new forest, trees added by a warm start, and the most a forest grows to
+# before it is trained again from scratch
+N_ESTIMATORS = 100
+WARM_START_TREES = 25
+MAX_ESTIMATORS = 200
 
 
 def calc_stat_importance(selected_position):
     """
 
-    This function calculates the importance of various statistics in predicting player market value
-    using a RandomForestRegressor model. It retrieves player data and their corresponding statistics
-    from the database, trains the model, and determines the feature importances.
+    This function returns the importance of each statistic in predicting player market value for
+    a position. Importances are trained for every position by the ingestion worker and read from
+    PositionModel. While the data is newer than a position's model, such as during a scrape, the
+    latest stored importances are served and g.stale_models is set, so pages built from them aren't
+    cached; with no stored model the position has no importances until the worker trains one, unless
+    background ingestion is off, then it is trained on demand. Up to date results are cached in memory
+    per (position, data version). A position no player with stats has, such as a typo in a query
+    argument, returns no importances and no players, without training or storing a model.
 
     Parameters:
     - selected_position (str): The selected player position for which the importance of
@@ -23,54 +46,256 @@ def calc_stat_importance(selected_position):
     - player_names (list): A list of player names corresponding to the player IDs.
 
     """
+    from flask import g
+
+    from website.dimensions import get_dimensions
+
+    # Only positions in the stat matrix are trained, any string could come from a request
+    if selected_position not in get_dimensions().positions:
+        return {}, [], []
+
+    key = (selected_position, data_version())
+
+    result = importance_cache.get(key)
+    if result is None:
+        feature_importances, version = stored_importances(selected_position)
+
+        if version is None and current_app.config['INGEST_ON_STARTUP'] != 'background':
+            # Nothing trains the model in the background, so it is trained now
+            feature_importances = train_positions([selected_position])[selected_position]
+            version = key[1]
+
+        result = (feature_importances or {}, *position_players(selected_position))
+        if version != key[1]:
+            # Served until the worker trains a model on the current data, never cached
+            g.stale_models = True
+            return result
+
+        importance_cache.put(key, result)
+
+    return result
+
+
+def stored_importances(position):
+    """
+    Importances stored for a position by its latest model and the data version it was trained on,
+    or (None, None) if it has no model.
+    """
+    stored = db.session.query(PositionModel.importances, PositionModel.version).filter_by(position=position).first()
+    return (None, None) if stored is None else (json.loads(stored.importances), stored.version)
+
+
+def position_players(position):
+    """
+    IDs and names of the players in a position who have stats.
+    """
+    from website.matrix import get_matrix
+
+    matrix = get_matrix()
+    rows = matrix.position_mask(position)
+    return matrix.player_ids[rows].tolist(), matrix.names[rows].tolist()
+
+
+def models_outdated():
+    """
+    Whether any position's model was trained on older data, or none are stored.
+    """
+    from sqlalchemy import func
+
+    version = db.session.query(func.min(PositionModel.version)).scalar()
+    return version is None or version != data_version()
+
+
+def model_path(position):
+    """
+    File a position's fitted model is saved to for warm starts, or None if saving to disk is turned off.
+    """
+    directory = current_app.config.get('MODEL_CACHE_DIR')
+    if not directory:
+        return None
+
+    slug = re.sub(r'[^a-z0-9]+', '-', position.lower()).strip('-')
+    return os.path.join(directory, f'model-{slug}.pkl')
+
+
+def load_model(position):
+    """
+    The model saved for a position by the last training, or None if there isn't one.
+    """
+    file_path = model_path(position)
+    if file_path is None or not os.path.exists(file_path):
+        return None
+
+    try:
+        with open(file_path, 'rb') as file:
+            return pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+
+
+def save_model(position, saved):
+    """
+    Save a position's fitted model, replacing the previous one.
+    """
+    file_path = model_path(position)
+    if file_path is None:
+        return
 
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path + '.tmp', 'wb') as file:
+        pickle.dump(saved, file)
+    os.replace(file_path + '.tmp', file_path)
 
 
+def can_warm_start(previous, player_ids):
+    """
+    Whether a saved model, whose players' data is unchanged, can be extended with more trees instead
+    of training a new one: players were only added and the forest has room for more trees.
+    """
+    if previous is None or previous['regressor'].n_estimators + WARM_START_TREES > MAX_ESTIMATORS:
+        return False
 
-    # All player queries who have
-    # - correct position
-    # - Have stats in PlayerStat
+    index = set(player_ids)
+    return len(previous['player_ids']) < len(player_ids) and all(player_id in index for player_id in previous['player_ids'])
 
-    player_queries = Player.query.filter(and_(Player.position == selected_position,
-                                              Player.id.in_(p_id[0] for p_id in
-                                                            PlayerStat.query.with_entities(
-                                                                PlayerStat.player_id).all()))).all()
 
-    player_ids = [player.id for player in player_queries]
+def fit_position(position, x, y, stat_labels, player_ids, digest, previous=None, n_jobs=-1):
+    """
 
-    player_names = [player.name for player in player_queries]
+    This function fits the RandomForestRegressor of one position and determines the feature
+    importances. It only uses its arguments, so it can run in a worker process.
 
-    # Determine all relevant stats for position and puts in list
-    stat_ids = [stat.stat_id for stat in PlayerStat.query.filter(PlayerStat.player_id == player_ids[0]).all()]
+    When the position's data is unchanged since the previous model, that model is reused. When only
+    new players were added, trees fitted on the new data are added to it (warm start) rather than
+    training every tree again. Scores of a warm started model include trees that may have seen
+    today's test players.
 
-    stat_labels = [stat.label for stat in Stat.query.filter(Stat.id.in_(stat_ids)).all()]
+    Parameters:
+    - position (str): The position being trained.
+    - x, y, stat_labels, player_ids: Training data, as returned by build_features.
+    - digest (str): Hash of the players' unfilled data, as returned by raw_digest.
+    - previous (dict): The position's last saved model if its players' data and stats are unchanged,
+      or None to train from scratch.
+    - n_jobs (int): Cores used to fit the trees, -1 for all.
 
-    # Prepare data for model training
-    x = []  # Features
-    y = []  # Target variable (e.g., market_value)
+    Returns:
+    dict: position, regressor, stat_labels, player_ids, digest, importances, train_score,
+    test_score, seconds and warm_started.
+    """
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.model_selection import train_test_split
 
-    for player_id in player_ids:
-        # Extract features (stat values) for each player
-        stats = PlayerStat.query.filter(PlayerStat.player_id == player_id).all()
-        features = [stat.value for stat in stats]
-        # Accounting for GK stats
-        x.append(features[:4] + features[5:] if len(features) == 13 else features)
+    start = time.perf_counter()
+    result = {'position': position, 'regressor': None, 'stat_labels': stat_labels, 'player_ids': player_ids,
+              'digest': digest, 'importances': {}, 'train_score': None, 'test_score': None,
+              'warm_started': False}
 
-        # Extract target variable
-        target_variable = Player.query.get(player_id).market_value
-        y.append(target_variable)
+    # Too few players or stats to split and fit
+    if len(x) < 2 or not stat_labels:
+        result['seconds'] = time.perf_counter() - start
+        return result
 
     # Split features and target variables into train and test sets.
     x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.2, random_state=42)
 
-    # Create the random forest based on given parameters.
-    regressor = RandomForestRegressor(n_estimators=100, random_state=42)
+    if previous is not None and previous['player_ids'] == player_ids:
+        # Nothing changed for this position, the saved model still fits
+        regressor = previous['regressor']
+    else:
+        if can_warm_start(previous, player_ids):
+            # Add trees fitted on the new data to the previous forest
+            regressor = previous['regressor']
+            regressor.set_params(warm_start=True, n_estimators=regressor.n_estimators + WARM_START_TREES,
+                                 n_jobs=n_jobs)
+            result['warm_started'] = True
+        else:
+            # Create the random forest based on given parameters.
+            regressor = RandomForestRegressor(n_estimators=N_ESTIMATORS, random_state=42, n_jobs=n_jobs)
 
-    # Create the model and train on input data.
-    regressor.fit(x_train, y_train)
+        # Create the model and train on input data.
+        regressor.fit(x_train, y_train)
 
     # Feature importance
-    feature_importances = dict(zip(stat_labels, regressor.feature_importances_))
-    print(feature_importances)
+    result['regressor'] = regressor
+    result['importances'] = {label: float(value) for label, value in zip(stat_labels, regressor.feature_importances_)}
+    result['train_score'] = float(regressor.score(x_train, y_train))
+    result['test_score'] = float(regressor.score(x_test, y_test)) if len(x_test) > 1 else None
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def train_positions(positions=None, warm_start=True):
+    """
+
+    This function trains the models of several positions, by default every position with players
+    who have stats, and stores their importances, scores and training times in PositionModel.
+    Positions are fitted in parallel in a process pool of TRAIN_WORKERS processes (all cores by
+    default), or one after another using every core per forest when there is one worker or position.
+
+    Parameters:
+    - positions (list): Positions to train, all by default.
+    - warm_start (bool): Extend saved models when only players were added, rather than always
+      training from scratch.
+
+    Returns:
+    - feature_importances (dict): Position -> its feature importances.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    from website.features import build_features, raw_digest
+    from website.matrix import get_matrix
+    from website.processes import process_context
+
+    version = data_version()
+    matrix = get_matrix()
+    min_coverage = current_app.config['FEATURE_MIN_COVERAGE']
+
+    if positions is None:
+        positions = sorted({position for position in matrix.positions[matrix.has_stats()].tolist() if position})
+
+    jobs = []
+    for position in positions:
+        x, y, stat_labels, player_ids = build_features(matrix, position, min_coverage)
+        digest = raw_digest(matrix, player_ids, stat_labels)
+
+        # A saved model is only reused or extended when its players' stored data and the stats are unchanged,
+        # the filled gaps can differ as they depend on the players added
+        previous = load_model(position) if warm_start else None
+        if previous is not None and (previous['stat_labels'] != stat_labels or previous.get('digest') is None
+                                     or raw_digest(matrix, previous['player_ids'], stat_labels) != previous['digest']):
+            previous = None
+        jobs.append((position, x, y, stat_labels, player_ids, digest, previous))
+
+    workers = min(current_app.config.get('TRAIN_WORKERS') or os.cpu_count() or 1, len(jobs))
+    if workers > 1:
+        # One core per forest, the pool spreads positions over the cores, its processes aren't
+        # forked from this one as training can run from the ingestion thread
+        with ProcessPoolExecutor(max_workers=workers, mp_context=process_context()) as pool:
+            futures = [pool.submit(fit_position, *job, n_jobs=1) for job in jobs]
+            results = [future.result() for future in futures]
+    else:
+        results = [fit_position(*job, n_jobs=-1) for job in jobs]
+
+    trained_at = datetime.utcnow()
+    for result in results:
+        position = result['position']
+        if result['regressor'] is not None:
+            save_model(position, {key: result[key] for key in ('regressor', 'stat_labels', 'player_ids', 'digest')})
+
+        PositionModel.query.filter_by(position=position).delete()
+        db.session.add(PositionModel(
+            position=position, version=version, importances=json.dumps(result['importances']),
+            players=len(result['player_ids']), train_score=result['train_score'], test_score=result['test_score'],
+            train_seconds=result['seconds'], warm_started=result['warm_started'], trained_at=trained_at,
+            n_estimators=result['regressor'].n_estimators if result['regressor'] is not None else 0))
+
+        # Fit time and test score of each position, read at /metrics
+        metrics.observe('model_fit_seconds', result['seconds'], position=position)
+        if result['test_score'] is not None:
+            metrics.set('model_test_score', result['test_score'], position=position)
+
+        print(f"{position}: {len(result['player_ids'])} players, test R² {result['test_score']}, "
+              f"{result['seconds']:.1f} s{' (warm start)' if result['warm_started'] else ''}")
 
-    return feature_importances, player_ids, player_names
\ No newline at end of file
+    db.session.commit()
+    return {result['position']: result['importances'] for result in results}
@@ -0,0 +1,109 @@
+# Batched database writes used by the scrapers
+import time
+
+from sqlalchemy import insert, update
+
+from . import db
+from .models import ScrapeJob, ScrapeCheckpoint
+from .versioning import bump_version
+
+# Tables that record scraping progress rather than data
+PROGRESS_TABLES = (ScrapeJob, ScrapeCheckpoint)
+
+
+class BulkWriter:
+    """
+    Buffers rows for each table and writes them with one executemany insert (and one
+    executemany update by primary key) per table, committing them together in a single transaction.
+
+    Rows are flushed when the caller finishes a unit of work (such as a club page) or when
+    the number of buffered rows reaches batch_size, whichever comes first. Every flush that
+    changes data also bumps the data version, so cached results built from it are dropped.
+
+    Parameters:
+    - batch_size (int): Number of buffered rows that triggers an automatic flush.
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.buffers = {}
+        self.updates = {}
+        self.pending = 0
+        self.written = 0
+        self.changed = False
+        # Time spent writing, for the scrape pipeline's metrics
+        self.seconds = 0.0
+
+    def add(self, model, **values):
+        """
+        Buffer a row to be inserted on the next flush.
+
+        Parameters:
+        - model (db.Model): Table the row belongs to.
+        - values: Column values of the row.
+        """
+        self.buffers.setdefault(model, []).append(values)
+        self.pending += 1
+
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def update(self, model, id, **values):
+        """
+        Buffer new values for an existing row, applied on the next flush.
+
+        Parameters:
+        - model (db.Model): Table the row belongs to.
+        - id (int): Primary key of the row.
+        - values: Column values to change.
+        """
+        self.updates.setdefault(model, []).append(dict(values, id=id))
+        self.pending += 1
+
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def insert_one(self, model, **values):
+        """
+        Insert a single row straight away, inside the current transaction, for rows whose
+        ID is needed before the rest of the batch can be built (a league before its clubs).
+
+        Parameters:
+        - model (db.Model): Table the row belongs to.
+        - values: Column values of the row.
+
+        Returns:
+        - id (int): Primary key of the new row.
+        """
+        result = db.session.execute(insert(model).values(**values))
+        self.changed = self.changed or model not in PROGRESS_TABLES
+        return result.inserted_primary_key[0]
+
+    def flush(self):
+        """
+        Insert every buffered row, apply buffered updates and commit them as one transaction.
+        Tables are written in the order they were first added to, so parents go before children.
+        """
+        start = time.perf_counter()
+
+        for model, rows in self.buffers.items():
+            if rows:
+                db.session.execute(insert(model), rows)
+                self.written += len(rows)
+                self.changed = self.changed or model not in PROGRESS_TABLES
+
+        for model, rows in self.updates.items():
+            if rows:
+                db.session.execute(update(model), rows)
+                self.written += len(rows)
+                self.changed = self.changed or model not in PROGRESS_TABLES
+
+        if self.changed:
+            bump_version()
+
+        db.session.commit()
+        self.buffers = {}
+        self.updates = {}
+        self.pending = 0
+        self.changed = False
+        self.seconds += time.perf_counter() - start
@@ -0,0 +1,219 @@
+# Scrape jobs and per-page checkpoints, so builds can resume and refreshes skip fresh data
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from . import db
+from .models import Player, ScrapeJob, ScrapeCheckpoint
+
+# A running job that hasn't stored a page for this long is assumed to have died
+HEARTBEAT_TIMEOUT = timedelta(minutes=15)
+
+
+class Checkpoints:
+    """
+    Tracks which league, club and player pages have been fully stored, and when.
+
+    A page is skipped when its checkpoint is newer than `since`. Resuming uses the earliest
+    possible time so anything already stored is skipped, a refresh uses now minus the allowed
+    age, and a full build uses the job's start so nothing is skipped.
+
+    Parameters:
+    - job (ScrapeJob): The job checkpoints are recorded against.
+    - since (datetime): Pages stored after this time are skipped.
+    """
+
+    def __init__(self, job, since):
+        self.job = job
+        self.since = since
+
+        # url -> (checkpoint id, entity id, scraped at), loaded once
+        self.pages = {url: (checkpoint_id, entity_id, scraped_at) for checkpoint_id, url, entity_id, scraped_at in
+                      db.session.query(ScrapeCheckpoint.id, ScrapeCheckpoint.url,
+                                       ScrapeCheckpoint.entity_id, ScrapeCheckpoint.scraped_at)}
+
+    def is_done(self, url):
+        """
+        Whether a page was stored recently enough to be skipped.
+        """
+        return url in self.pages and self.pages[url][2] >= self.since
+
+    def fresh(self):
+        """
+        URLs of every page stored recently enough to be skipped, for scrapers in other processes.
+        """
+        return {url for url in self.pages if self.is_done(url)}
+
+    def mark(self, writer, kind, url, entity_id=None):
+        """
+        Buffer a checkpoint for a page, committed with the page's own rows on the next flush.
+
+        Parameters:
+        - writer (BulkWriter): The writer holding the page's rows.
+        - kind (str): league, club or player.
+        - url (str): URL of the page.
+        - entity_id (int): ID of what the page was stored as, if known.
+        """
+        now = datetime.utcnow()
+        values = dict(kind=kind, entity_id=entity_id, scraped_at=now, job_id=self.job.id)
+
+        if url in self.pages and self.pages[url][0] is not None:
+            writer.update(ScrapeCheckpoint, self.pages[url][0], **values)
+        else:
+            writer.add(ScrapeCheckpoint, url=url, **values)
+        self.pages[url] = (self.pages[url][0] if url in self.pages else None, entity_id, now)
+
+        # Show the job is still alive
+        if kind != 'player':
+            writer.update(ScrapeJob, self.job.id, heartbeat_at=now)
+
+
+def parse_age(text):
+    """
+    Convert a duration such as "7d", "12h" or "30m" into a timedelta.
+    """
+    units = {'d': 'days', 'h': 'hours', 'm': 'minutes'}
+
+    if len(text) < 2 or text[-1] not in units or not text[:-1].isdigit():
+        raise ValueError(f"Expected a duration like 7d, 12h or 30m, got {text!r}")
+
+    return timedelta(**{units[text[-1]]: int(text[:-1])})
+
+
+def last_job():
+    """
+    The most recently started scrape job, or None if nothing was ever scraped.
+    """
+    return ScrapeJob.query.order_by(ScrapeJob.id.desc()).first()
+
+
+def is_running():
+    """
+    Whether a scrape job, in this or another process, has stored a page recently.
+    """
+    job = last_job()
+    if job is None or job.status != 'running':
+        return False
+
+    heartbeat = job.heartbeat_at or job.started_at
+    return datetime.utcnow() - heartbeat < HEARTBEAT_TIMEOUT
+
+
+def freshness():
+    """
+    Summary of how complete and up to date the stored data is.
+
+    Returns:
+    - freshness (dict): ready (bool), scraping (bool), last_complete, oldest_page and newest_page
+      (ISO timestamps or None) and pages (int).
+    """
+    complete = ScrapeJob.query.filter_by(status='complete').order_by(ScrapeJob.finished_at.desc()).first()
+    oldest, newest, pages = db.session.query(func.min(ScrapeCheckpoint.scraped_at),
+                                             func.max(ScrapeCheckpoint.scraped_at),
+                                             func.count(ScrapeCheckpoint.id)).one()
+
+    return {'ready': complete is not None,
+            'scraping': is_running(),
+            'last_complete': complete.finished_at.isoformat() if complete else None,
+            'oldest_page': oldest.isoformat() if oldest else None,
+            'newest_page': newest.isoformat() if newest else None,
+            'pages': pages}
+
+
+def is_complete():
+    """
+    Whether any scrape job has ever finished, meaning the database holds a full data set.
+    """
+    return ScrapeJob.query.filter_by(status='complete').first() is not None
+
+
+def record_existing_data(connection):
+    """
+    Record data stored before scrape jobs were tracked as a complete job, so it isn't rebuilt.
+    Nothing is recorded once any job is.
+
+    Parameters:
+    - connection (Connection): Connection in the transaction setting the database up.
+
+    Returns:
+    - recorded (bool): Whether existing data was recorded.
+    """
+    from sqlalchemy import insert, select
+
+    if connection.execute(select(ScrapeJob.id).limit(1)).first() is not None:
+        return False
+    if connection.execute(select(Player.id).limit(1)).first() is None:
+        return False
+
+    now = datetime.utcnow()
+    connection.execute(insert(ScrapeJob).values(mode='build', status='complete', started_at=now, finished_at=now))
+    return True
+
+
+def run_scrape(mode='build', max_age=None, sources=('transfermarkt', 'fbref'), leagues=None):
+    """
+    Run the scrapers as a tracked job. With more than one league and SCRAPE_SHARDS not 1, the
+    leagues are scraped in parallel shard processes, otherwise each site's scraper runs in turn.
+    Once the job completes, pages older than PAGE_CACHE_TTL are evicted from the page cache.
+
+    Parameters:
+    - mode (str): build scrapes every page, resume skips every page already stored,
+      refresh skips pages stored more recently than max_age.
+    - max_age (timedelta): Age after which a stored page is scraped again, for refresh.
+    - sources (tuple): Which scrapers to run, transfermarkt and/or fbref.
+    - leagues (list): Competition codes of the leagues to scrape, those selected in the config by default.
+
+    Returns:
+    - job (ScrapeJob): The finished job.
+    """
+    from flask import current_app
+
+    from .fbref import scrape_stats
+    from .leagues import selected_leagues
+    from .page_cache import PageCache
+    from .shards import scrape_leagues
+    from .transfermarkt import scrape_data
+
+    leagues = selected_leagues(current_app.config, leagues)
+    workers = current_app.config.get('SCRAPE_SHARDS')
+
+    now = datetime.utcnow()
+    job = ScrapeJob(mode=mode, status='running', started_at=now, heartbeat_at=now)
+    db.session.add(job)
+    db.session.commit()
+
+    if mode == 'resume':
+        since = datetime.min
+    elif mode == 'refresh':
+        since = job.started_at - max_age
+    else:
+        since = job.started_at
+
+    checkpoints = Checkpoints(job, since)
+
+    try:
+        if len(leagues) > 1 and workers != 1:
+            scrape_leagues(checkpoints, leagues, sources, workers)
+        else:
+            if 'transfermarkt' in sources:
+                scrape_data(checkpoints, leagues)
+            if 'fbref' in sources:
+                scrape_stats(checkpoints, leagues)
+        job.status = 'complete'
+
+        # Pages past the cache TTL are fetched again next time, so their files are removed
+        removed = PageCache.evict_expired(current_app.config)
+        if removed:
+            print(f"{removed} expired pages removed from the page cache")
+
+    except BaseException:
+        db.session.rollback()
+        job.status = 'failed'
+        raise
+
+    finally:
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        print(f"Scrape job {job.id} ({mode}) {job.status}")
+
+    return job
@@ -0,0 +1,80 @@
+# Registry of the leagues scraped, mapping each Transfermarkt competition to its FBref page
+import json
+from os import path
+
+from .crawler import host_name
+
+# Registry shipped with the app, LEAGUES_FILE points somewhere else to scrape other leagues
+DEFAULT_LEAGUES_FILE = path.join(path.dirname(__file__), 'leagues.json')
+
+
+def load_leagues(filename=DEFAULT_LEAGUES_FILE):
+    """
+    Read the league registry, a JSON list with one object per league:
+
+    - code (str): Transfermarkt competition code, such as GB1, used to pick leagues.
+    - name (str): Name of the league, for messages.
+    - transfermarkt (str): URL of the competition's Transfermarkt page.
+    - fbref (str): URL of the competition's FBref page, or null when FBref doesn't cover it.
+    - club_aliases (dict): FBref club name -> Transfermarkt club name, for clubs whose names
+      are too different to be matched.
+    - enabled (bool): Whether the league is scraped when no leagues are picked, true by default.
+
+    Parameters:
+    - filename (str): Path of the registry.
+
+    Returns:
+    - leagues (list): The leagues as dicts, in the file's order.
+    """
+    with open(filename, encoding='utf-8') as file:
+        leagues = json.load(file)
+
+    codes = set()
+    for league in leagues:
+        if not league.get('code') or not league.get('transfermarkt'):
+            raise ValueError(f"League {league!r} in {filename} needs a code and a transfermarkt URL")
+        if league['code'] in codes:
+            raise ValueError(f"League {league['code']} is in {filename} more than once")
+        codes.add(league['code'])
+
+        league.setdefault('name', league['code'])
+        league.setdefault('fbref', None)
+        league.setdefault('club_aliases', {})
+        league.setdefault('enabled', True)
+
+    return leagues
+
+
+def selected_leagues(config, codes=None):
+    """
+    The leagues to scrape: the ones asked for by code, else the LEAGUES config, else every
+    league enabled in the registry.
+
+    Parameters:
+    - config (Config): The Flask app's config.
+    - codes (list): Competition codes of the leagues wanted.
+
+    Returns:
+    - leagues (list): The leagues, in registry order.
+    """
+    leagues = load_leagues(config.get('LEAGUES_FILE') or DEFAULT_LEAGUES_FILE)
+    codes = codes or config.get('LEAGUES')
+    if not codes:
+        return [league for league in leagues if league['enabled']]
+
+    unknown = set(codes) - {league['code'] for league in leagues}
+    if unknown:
+        raise ValueError(f"Unknown league codes: {', '.join(sorted(unknown))}")
+    return [league for league in leagues if league['code'] in codes]
+
+
+def league_hosts(leagues):
+    """
+    Hosts the leagues' pages are fetched from, without www.
+    """
+    hosts = set()
+    for league in leagues:
+        for url in (league['transfermarkt'], league['fbref']):
+            if url:
+                hosts.add(host_name(url))
+    return sorted(hosts)
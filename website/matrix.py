@@ -0,0 +1,209 @@
+# Player x stat matrix built from PlayerStat, shared by the analytics routes
+import threading
+
+import numpy as np
+from sqlalchemy import func, or_
+
+from . import db
+from .models import Player, Stat, PlayerStat, ScrapeCheckpoint
+from .versioning import data_version
+
+
+class StatMatrix:
+    """
+    Dense copy of the PlayerStat table with one row per player and one column per stat,
+    alongside per-player vectors, so analytics can slice arrays instead of querying.
+
+    Attributes:
+    - values (ndarray): Stat values, shape (players, stats), NaN where a player has no value.
+    - player_ids, stat_ids (ndarray): Database IDs for each row and column.
+    - player_index, stat_index (dict): Database ID -> row or column number.
+    - stat_labels (list): Label of each column.
+    - names, positions (ndarray): Name and position of each player.
+    - market_values, ages (ndarray): Market value and age of each player, NaN if unknown.
+    - club_ids (ndarray): Club ID of each player.
+    - version (int): Data version the matrix was built from.
+    """
+
+    def __init__(self, players, stats, rows, version, max_row_id, checked_at):
+        # Players
+        self.player_ids = np.array([player[0] for player in players], dtype=np.int64)
+        self.names = np.array([player[1] for player in players], dtype=object)
+        self.positions = np.array([player[2] for player in players], dtype=object)
+        self.ages = np.array([player[3] for player in players], dtype=float)
+        self.market_values = np.array([player[4] for player in players], dtype=float)
+        self.club_ids = np.array([player[5] for player in players], dtype=object)
+        self.player_index = {player_id: row for row, player_id in enumerate(self.player_ids.tolist())}
+
+        # Stats
+        self.stat_ids = np.array([stat[0] for stat in stats], dtype=np.int64)
+        self.stat_labels = [stat[1] for stat in stats]
+        self.stat_index = {stat_id: column for column, stat_id in enumerate(self.stat_ids.tolist())}
+
+        self.values = np.full((len(self.player_ids), len(self.stat_ids)), np.nan)
+        self.fill(rows)
+
+        self.version = version
+        # Highest PlayerStat ID and newest player checkpoint seen, where a refresh carries on from
+        self.max_row_id = max_row_id
+        self.checked_at = checked_at
+
+        self.label_index = {label: column for column, label in enumerate(self.stat_labels)}
+        self.position_masks = {}
+        self.stats_mask = None
+        self.name_rows = None
+
+    def fill(self, rows):
+        """
+        Write (player_id, stat_id, value) rows into the matrix in one vectorised assignment.
+        Rows for players or stats the matrix doesn't know are ignored.
+        """
+        rows = [(self.player_index[player_id], self.stat_index[stat_id], value)
+                for player_id, stat_id, value in rows
+                if player_id in self.player_index and stat_id in self.stat_index]
+        if rows:
+            row_numbers, columns, values = zip(*rows)
+            self.values[list(row_numbers), list(columns)] = np.array(values, dtype=float)
+
+    def has_stats(self):
+        """
+        Boolean mask of players with at least one stat value.
+        """
+        if self.stats_mask is None:
+            self.stats_mask = ~np.isnan(self.values).all(axis=1)
+        return self.stats_mask
+
+    def position_mask(self, position):
+        """
+        Boolean mask of players in a position who have at least one stat value.
+        """
+        if position not in self.position_masks:
+            self.position_masks[position] = (self.positions == position) & self.has_stats()
+        return self.position_masks[position]
+
+    def row(self, name):
+        """
+        Row of the first player with a name, as a name lookup would return, or None if no player has it.
+        """
+        if self.name_rows is None:
+            name_rows = {}
+            for row, player_name in enumerate(self.names.tolist()):
+                name_rows.setdefault(player_name, row)
+            self.name_rows = name_rows
+        return self.name_rows.get(name)
+
+    def column(self, label):
+        """
+        Column number of a stat label, or None if no stat has that label.
+        """
+        return self.label_index.get(label)
+
+
+def query_players():
+    return db.session.query(Player.id, Player.name, Player.position, Player.age,
+                            Player.market_value, Player.club_id).order_by(Player.id).all()
+
+
+def query_stats():
+    return db.session.query(Stat.id, Stat.label).order_by(Stat.id).all()
+
+
+def query_markers():
+    # Where the next incremental refresh should start from
+    max_row_id = db.session.query(func.max(PlayerStat.id)).scalar() or 0
+    checked_at = db.session.query(func.max(ScrapeCheckpoint.scraped_at)).filter(
+        ScrapeCheckpoint.kind == 'player').scalar()
+    return max_row_id, checked_at
+
+
+def build_matrix():
+    """
+    Build the matrix from scratch, reading every PlayerStat row in one query.
+
+    Returns:
+    - matrix (StatMatrix): The new matrix.
+    """
+    version = data_version()
+    max_row_id, checked_at = query_markers()
+    rows = db.session.query(PlayerStat.player_id, PlayerStat.stat_id, PlayerStat.value).filter(
+        PlayerStat.id <= max_row_id)
+
+    return StatMatrix(query_players(), query_stats(), rows, version, max_row_id, checked_at)
+
+
+def changed_rows(since_row_id, since_time, max_row_id):
+    """
+    PlayerStat rows added after since_row_id, or belonging to players whose pages were
+    scraped after since_time, up to max_row_id.
+
+    Returns:
+    Query: Rows of (player_id, stat_id, value).
+    """
+    # Players stored again since the last build, their values may have been updated in place
+    changed = db.session.query(ScrapeCheckpoint.entity_id).filter(ScrapeCheckpoint.kind == 'player')
+    if since_time is not None:
+        changed = changed.filter(ScrapeCheckpoint.scraped_at > since_time)
+
+    return db.session.query(PlayerStat.player_id, PlayerStat.stat_id, PlayerStat.value).filter(
+        PlayerStat.id <= max_row_id,
+        or_(PlayerStat.id > since_row_id, PlayerStat.player_id.in_(changed.scalar_subquery())))
+
+
+def refresh_matrix(matrix):
+    """
+    Bring a matrix up to date after ingestion by only reading PlayerStat rows that are new,
+    or belong to players whose pages were scraped since the matrix was built.
+
+    Parameters:
+    - matrix (StatMatrix): The out of date matrix.
+
+    Returns:
+    - matrix (StatMatrix): A new, up to date matrix.
+    """
+    version = data_version()
+    max_row_id, checked_at = query_markers()
+
+    rows = changed_rows(matrix.max_row_id, matrix.checked_at, max_row_id)
+
+    # Players and stats are re-read as ages and market values may have changed
+    new = StatMatrix(query_players(), query_stats(), [], version, max_row_id, checked_at)
+
+    # Copy across values of players and stats both matrices know
+    players = [player_id for player_id in new.player_ids.tolist() if player_id in matrix.player_index]
+    stats = [stat_id for stat_id in new.stat_ids.tolist() if stat_id in matrix.stat_index]
+
+    new.values[np.ix_([new.player_index[player_id] for player_id in players],
+                      [new.stat_index[stat_id] for stat_id in stats])] = \
+        matrix.values[np.ix_([matrix.player_index[player_id] for player_id in players],
+                             [matrix.stat_index[stat_id] for stat_id in stats])]
+
+    new.fill(rows)
+    return new
+
+
+# Matrix shared by every request in this process
+current = {'matrix': None}
+lock = threading.Lock()
+
+
+def get_matrix():
+    """
+    The matrix for the current data version, built on first use and refreshed
+    incrementally whenever ingestion has changed the data.
+
+    Returns:
+    - matrix (StatMatrix): The up to date matrix.
+    """
+    version = data_version()
+    matrix = current['matrix']
+    if matrix is not None and matrix.version == version:
+        return matrix
+
+    with lock:
+        matrix = current['matrix']
+        if matrix is None:
+            current['matrix'] = build_matrix()
+        elif matrix.version != version:
+            current['matrix'] = refresh_matrix(matrix)
+
+        return current['matrix']
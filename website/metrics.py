@@ -0,0 +1,212 @@
+# Request, SQL, training and scraping metrics of this process, exposed in Prometheus text format
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds (seconds) of the duration histogram buckets
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Name -> (type, help) of every metric, names are prefixed with datascout_ when exported
+DESCRIPTIONS = {
+    'requests_total': ('counter', 'Requests served, by endpoint and status.'),
+    'request_seconds': ('histogram', 'Time to serve a request, by endpoint.'),
+    'sql_statements_total': ('counter', 'SQL statements run, by endpoint, or background outside requests.'),
+    'sql_seconds_total': ('counter', 'Time spent running SQL statements, by endpoint.'),
+    'template_render_seconds': ('histogram', 'Time to render a page template, by template.'),
+    'model_fit_seconds': ('histogram', 'Time to fit a position\'s market value model, by position.'),
+    'model_test_score': ('gauge', 'R squared of the latest model of each position on its test players.'),
+    'scrape_stage_items_total': ('counter', 'Pages (rows for write) finished by each scraper stage.'),
+    'scrape_stage_seconds_total': ('counter', 'Time spent working in each scraper stage.'),
+    'scrape_stage_backlog': ('gauge', 'Items waiting for or in each stage of a running scraper.'),
+    'scrape_league_failures_total': ('counter', 'Leagues whose shard failed, left to the next scrape, by league.'),
+}
+
+
+class Metrics:
+    """
+    Thread-safe counters, gauges and histograms, each series keyed by its name and labels.
+    Collectors add series worked out when the metrics are read, such as a running scraper's backlog.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.histograms = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        """
+        Add to a counter.
+        """
+        key = self.key(name, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """
+        Set a gauge.
+        """
+        with self.lock:
+            self.values[self.key(name, labels)] = value
+
+    def observe(self, name, seconds, **labels):
+        """
+        Record a duration in a histogram.
+        """
+        key = self.key(name, labels)
+        with self.lock:
+            histogram = self.histograms.setdefault(key, {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0})
+            for number, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][number] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+
+    def reset(self):
+        with self.lock:
+            self.values.clear()
+            self.histograms.clear()
+
+    def render(self):
+        """
+        Every series in Prometheus text exposition format.
+        """
+        with self.lock:
+            values = dict(self.values)
+            histograms = {key: dict(histogram, buckets=list(histogram['buckets']))
+                          for key, histogram in self.histograms.items()}
+
+        for collector in list(self.collectors):
+            for name, value, labels in collector():
+                values[self.key(name, labels)] = value
+
+        lines = []
+        for name, (kind, description) in DESCRIPTIONS.items():
+            series = sorted((labels, value) for (key, labels), value in values.items() if key == name)
+            hists = sorted((labels, histogram) for (key, labels), histogram in histograms.items() if key == name)
+            if not series and not hists:
+                continue
+
+            lines.append(f'# HELP datascout_{name} {description}')
+            lines.append(f'# TYPE datascout_{name} {kind}')
+            for labels, value in series:
+                lines.append(f'datascout_{name}{format_labels(labels)} {value}')
+            for labels, histogram in hists:
+                for bound, count in zip(BUCKETS, histogram['buckets']):
+                    lines.append(f'datascout_{name}_bucket{format_labels(labels + (("le", str(bound)),))} {count}')
+                lines.append(f'datascout_{name}_bucket{format_labels(labels + (("le", "+Inf"),))} {histogram["count"]}')
+                lines.append(f'datascout_{name}_sum{format_labels(labels)} {histogram["sum"]}')
+                lines.append(f'datascout_{name}_count{format_labels(labels)} {histogram["count"]}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    # {name="value",...} with quotes, backslashes and line breaks escaped
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+# Metrics of this process
+metrics = Metrics()
+
+
+def current_endpoint():
+    """
+    Endpoint of the request being served, none for unmatched URLs, or background outside requests.
+    """
+    from flask import has_request_context, request
+
+    if not has_request_context():
+        return 'background'
+    return request.endpoint or 'none'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('statement_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def finish_statement(conn, cursor, statement, parameters, context, executemany):
+    """
+    Count a finished SQL statement and its time against the endpoint that ran it.
+    """
+    from flask import g, has_request_context
+
+    started = conn.info.get('statement_started')
+    seconds = time.perf_counter() - started.pop() if started else 0.0
+    endpoint = current_endpoint()
+    metrics.inc('sql_statements_total', endpoint=endpoint)
+    metrics.inc('sql_seconds_total', seconds, endpoint=endpoint)
+
+    if has_request_context():
+        g.sql_statements = g.get('sql_statements', 0) + 1
+        g.sql_seconds = g.get('sql_seconds', 0.0) + seconds
+
+
+def init_app(app):
+    """
+    Record requests and template renders of an app through Flask's signals, and profile requests
+    asking for it (?profile=1) when PROFILE_DIR is set.
+
+    Parameters:
+    - app (Flask): The Flask application.
+    """
+    from flask import before_render_template, g, request, request_finished, request_started, template_rendered
+
+    def started(sender, **extra):
+        g.request_started = time.perf_counter()
+
+        if sender.config.get('PROFILE_DIR') and request.args.get('profile') == '1':
+            import cProfile
+
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    def finished(sender, response, **extra):
+        endpoint = current_endpoint()
+        metrics.inc('requests_total', endpoint=endpoint, status=response.status_code)
+        if 'request_started' in g:
+            metrics.observe('request_seconds', time.perf_counter() - g.request_started, endpoint=endpoint)
+
+        if 'profiler' in g:
+            g.profiler.disable()
+            dump_profile(sender.config['PROFILE_DIR'], endpoint, g.profiler)
+
+        # Statements and their time for this request, shown by browser developer tools
+        response.headers['Server-Timing'] = (f'sql;dur={g.get("sql_seconds", 0.0) * 1000:.1f};'
+                                             f'desc="{g.get("sql_statements", 0)} statements"')
+
+    def rendering(sender, template, context, **extra):
+        g.render_started = time.perf_counter()
+
+    def rendered(sender, template, context, **extra):
+        if 'render_started' in g:
+            metrics.observe('template_render_seconds', time.perf_counter() - g.pop('render_started'),
+                            template=template.name)
+
+    # Signals only hold weak references, so the handlers are kept with the app
+    app.extensions['metrics'] = (started, finished, rendering, rendered)
+    request_started.connect(started, app)
+    request_finished.connect(finished, app)
+    before_render_template.connect(rendering, app)
+    template_rendered.connect(rendered, app)
+
+
+def dump_profile(directory, endpoint, profiler):
+    """
+    Save a request's profile for pstats or snakeviz, named by time and endpoint.
+    """
+    os.makedirs(directory, exist_ok=True)
+    profiler.dump_stats(os.path.join(directory, f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-'
+                                                f'{threading.get_ident()}-{endpoint}.prof'))
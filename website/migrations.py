@@ -0,0 +1,100 @@
+# Schema upgrades for databases created by earlier versions, tracked with SQLite's user_version
+from sqlalchemy import inspect, text
+
+from . import db
+
+
+def add_scrape_job_heartbeat(connection):
+    """
+    Add ScrapeJob.heartbeat_at to databases made before it existed.
+    """
+    columns = [column['name'] for column in inspect(connection).get_columns('scrape_job')]
+    if 'heartbeat_at' not in columns:
+        connection.execute(text('ALTER TABLE scrape_job ADD COLUMN heartbeat_at DATETIME'))
+
+
+def remove_duplicates(connection):
+    """
+    Merge duplicate stat labels and duplicate player stat values, so unique indexes can be added.
+    The oldest row of each duplicate set is kept, as the scrapers always read the first match.
+    """
+    # Point player stats at the oldest stat with the same label, then remove the other stats
+    connection.execute(text('''
+        UPDATE player_stat SET stat_id = (
+            SELECT MIN(keep.id) FROM stat AS keep
+            WHERE keep.label = (SELECT label FROM stat WHERE stat.id = player_stat.stat_id))
+        WHERE stat_id NOT IN (SELECT MIN(id) FROM stat GROUP BY label)
+    '''))
+    connection.execute(text('DELETE FROM stat WHERE id NOT IN (SELECT MIN(id) FROM stat GROUP BY label)'))
+
+    # Keep the oldest value for each player and stat
+    connection.execute(text('''
+        DELETE FROM player_stat WHERE id NOT IN (
+            SELECT MIN(id) FROM player_stat GROUP BY player_id, stat_id)
+    '''))
+
+
+def create_indexes(connection):
+    """
+    Create every index declared on the models that doesn't exist yet.
+    """
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def drop_league_coefficient_unique(connection):
+    """
+    Rebuild the league table without its unique coefficient, as a nation's second tier has the
+    same UEFA ranking as its top flight. SQLite can't drop a column's constraint in place.
+    """
+    connection.execute(text('CREATE TABLE league_new (id INTEGER NOT NULL, name VARCHAR(128), '
+                            'coefficient INTEGER, nation VARCHAR(32), PRIMARY KEY (id))'))
+    connection.execute(text('INSERT INTO league_new (id, name, coefficient, nation) '
+                            'SELECT id, name, coefficient, nation FROM league'))
+    connection.execute(text('DROP TABLE league'))
+    connection.execute(text('ALTER TABLE league_new RENAME TO league'))
+
+
+def drop_scatter_summary(connection):
+    """
+    Drop the per pair scatter summaries, replaced by StatHistogram and StatMoments.
+    """
+    connection.execute(text('DROP TABLE IF EXISTS scatter_summary'))
+
+
+# Applied in order, a database's user_version is the number it has had applied
+MIGRATIONS = [
+    add_scrape_job_heartbeat,
+    remove_duplicates,
+    create_indexes,
+    drop_league_coefficient_unique,
+    drop_scatter_summary,
+]
+
+
+def migrate(connection=None):
+    """
+    Apply any migrations the database hasn't had yet, inside one transaction.
+    Must be called in an app context, after db.create_all().
+
+    Parameters:
+    - connection (Connection): Connection whose transaction the migrations join, a new
+      transaction is used by default.
+
+    Returns:
+    - applied (int): Number of migrations applied.
+    """
+    if connection is None:
+        with db.engine.begin() as connection:
+            return migrate(connection)
+
+    version = connection.execute(text('PRAGMA user_version')).scalar()
+
+    for migration in MIGRATIONS[version:]:
+        migration(connection)
+
+    if version < len(MIGRATIONS):
+        connection.execute(text(f'PRAGMA user_version = {len(MIGRATIONS)}'))
+
+    return max(len(MIGRATIONS) - version, 0)
@@ -6,7 +6,8 @@ class League(db.Model):
     # Primary key
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128))
-    coefficient = db.Column(db.Integer, unique=True)
+    # UEFA ranking of the league's nation, second tiers share it with their top flight
+    coefficient = db.Column(db.Integer)
     nation = db.Column(db.String(32))
 
 
@@ -17,6 +18,10 @@ class Club(db.Model):
     # Foreign key
     league_id = db.Column(db.Integer, db.ForeignKey('league.id'))
 
+    __table_args__ = (
+        db.Index('ix_club_league_id', 'league_id'),
+    )
+
 
 class Player(db.Model):
     # Primary key
@@ -28,12 +33,24 @@ class Player(db.Model):
     # Foreign key
     club_id = db.Column(db.Integer, db.ForeignKey('club.id'))
 
+    __table_args__ = (
+        # Name lookups, alone or within a club
+        db.Index('ix_player_name_club_id', 'name', 'club_id'),
+        db.Index('ix_player_position', 'position'),
+        db.Index('ix_player_club_id', 'club_id'),
+    )
+
 
 class Stat(db.Model):
     # Primary key
     id = db.Column(db.Integer, primary_key=True)
     label = db.Column(db.String(64))
 
+    __table_args__ = (
+        # Each label is stored once
+        db.Index('ix_stat_label', 'label', unique=True),
+    )
+
 
 class PlayerStat(db.Model):
     # Primary key
@@ -43,3 +60,108 @@ class PlayerStat(db.Model):
     # Foreign key
     stat_id = db.Column(db.Integer, db.ForeignKey('stat.id'))
     value = db.Column(db.Integer)
+
+    __table_args__ = (
+        # One value per player and stat, also serves lookups by player
+        db.Index('ix_player_stat_player_id_stat_id', 'player_id', 'stat_id', unique=True),
+        # Covers reading one stat across many players without touching the table
+        db.Index('ix_player_stat_stat_id_player_id_value', 'stat_id', 'player_id', 'value'),
+    )
+
+
+class ScrapeJob(db.Model):
+    # Primary key
+    id = db.Column(db.Integer, primary_key=True)
+    # build, resume or refresh
+    mode = db.Column(db.String(16))
+    # running, complete or failed
+    status = db.Column(db.String(16))
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    # Last time the job stored a page, used to tell a live job from a dead one
+    heartbeat_at = db.Column(db.DateTime)
+
+
+class ScrapeCheckpoint(db.Model):
+    # Primary key
+    id = db.Column(db.Integer, primary_key=True)
+    # league, club or player
+    kind = db.Column(db.String(16))
+    url = db.Column(db.String(256), unique=True)
+    # ID of the League, Club or Player the page was stored as
+    entity_id = db.Column(db.Integer)
+    scraped_at = db.Column(db.DateTime)
+    # Foreign key
+    job_id = db.Column(db.Integer, db.ForeignKey('scrape_job.id'))
+
+    __table_args__ = (
+        # Pages of one kind stored since a given time
+        db.Index('ix_scrape_checkpoint_kind_scraped_at', 'kind', 'scraped_at'),
+    )
+
+
+class DataVersion(db.Model):
+    # Single row, id 1
+    id = db.Column(db.Integer, primary_key=True)
+    # Increased every time ingestion changes stored data
+    version = db.Column(db.Integer)
+
+
+class StatHistogram(db.Model):
+    # Primary key
+    id = db.Column(db.Integer, primary_key=True)
+    position = db.Column(db.String(32))
+    stat = db.Column(db.String(64))
+    # Data version the histogram was computed from
+    version = db.Column(db.Integer)
+    # Players in the position with the stat, and the range of their values
+    count = db.Column(db.Integer)
+    x_min = db.Column(db.Float)
+    x_max = db.Column(db.Float)
+    # Equal width bins from bin_start, counts as a JSON list
+    bin_start = db.Column(db.Float)
+    bin_size = db.Column(db.Float)
+    bin_counts = db.Column(db.Text)
+
+    __table_args__ = (
+        db.Index('ix_stat_histogram_position_stat', 'position', 'stat', unique=True),
+    )
+
+
+class StatMoments(db.Model):
+    # Primary key
+    id = db.Column(db.Integer, primary_key=True)
+    position = db.Column(db.String(32))
+    # Data version the moments were computed from
+    version = db.Column(db.Integer)
+    # Label of each row and column of the matrices, as JSON
+    stat_labels = db.Column(db.Text)
+    # Per pair of stats, sums over the players with both, saved with numpy.savez
+    moments = db.Column(db.LargeBinary)
+
+    __table_args__ = (
+        db.Index('ix_stat_moments_position', 'position', unique=True),
+    )
+
+
+class PositionModel(db.Model):
+    # Primary key
+    id = db.Column(db.Integer, primary_key=True)
+    position = db.Column(db.String(32))
+    # Data version the model was trained on
+    version = db.Column(db.Integer)
+    # Stat label -> importance in predicting market value, as JSON
+    importances = db.Column(db.Text)
+    players = db.Column(db.Integer)
+    # R² on the training and held out test players
+    train_score = db.Column(db.Float)
+    test_score = db.Column(db.Float)
+    train_seconds = db.Column(db.Float)
+    n_estimators = db.Column(db.Integer)
+    # Whether trees were added to the previous model rather than training a new one
+    warm_started = db.Column(db.Boolean)
+    trained_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_position_model_position', 'position', unique=True),
+    )
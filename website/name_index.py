@@ -0,0 +1,215 @@
+# Trigram index for fast fuzzy lookups of club and player names
+import heapq
+import re
+from bisect import bisect_left
+from itertools import islice
+
+from unidecode import unidecode
+
+non_alnum_re = re.compile(r'[^a-z0-9 ]+')
+space_re = re.compile(r'\s+')
+
+# Least trigram similarity of a typeahead match for a query no name starts like
+MIN_SIMILARITY = 0.25
+
+
+def normalize(name):
+    """
+    Reduce a name to lowercase ASCII letters, digits and single spaces,
+    so "Atlético Madrid" and "Atletico  Madrid" compare equal.
+    """
+    name = non_alnum_re.sub(' ', unidecode(name).lower())
+    return space_re.sub(' ', name).strip()
+
+
+def trigrams(text):
+    """
+    Set of three character slices of a normalized name, padded so the start
+    and end of each word count as well.
+    """
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """
+    Inverted index from trigrams to the keys whose names contain them.
+
+    Lookups only score names sharing at least one trigram with the query,
+    instead of comparing against every name in the table. Prefix lookups use
+    sorted lists of every word and every name, built on first use after names
+    are added, so the keys matching a prefix are one slice of a list.
+    """
+
+    def __init__(self):
+        self.names = {}
+        self.grams = {}
+        self.postings = {}
+        self.sorted = None
+
+    def add(self, key, name):
+        """
+        Index a name under a key, such as a club or player ID.
+        """
+        text = normalize(name)
+        grams = trigrams(text)
+
+        self.names[key] = text
+        self.grams[key] = grams
+        self.sorted = None
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(key)
+
+    def __len__(self):
+        return len(self.names)
+
+    def containing(self, name):
+        """
+        Keys whose normalized name contains the normalized query, in key order.
+        Only names holding every trigram of the query are checked.
+        """
+        text = normalize(name)
+        # Drop the padded word edges, a substring doesn't have to start a word
+        grams = {gram for gram in trigrams(text) if ' ' not in gram}
+        if not grams:
+            return sorted(key for key, indexed in self.names.items() if text in indexed)
+
+        candidates = set.intersection(*(self.postings.get(gram, set()) for gram in grams))
+        return sorted(key for key in candidates if text in self.names[key])
+
+    def search(self, name, limit=5, keys=None):
+        """
+        Rank indexed names by trigram similarity to a query.
+
+        Parameters:
+        - name (str): The name to look up.
+        - limit (int): Number of matches returned.
+        - keys (set): Optionally only consider these keys.
+
+        Returns:
+        - matches (list): (key, score) pairs, best first, score between 0 and 1.
+        """
+        grams = trigrams(normalize(name))
+
+        # Count shared trigrams for every name that has at least one
+        shared = {}
+        for gram in grams:
+            for key in self.postings.get(gram, ()):
+                if keys is None or key in keys:
+                    shared[key] = shared.get(key, 0) + 1
+
+        # Jaccard similarity of the trigram sets
+        scores = [(key, count / (len(grams) + len(self.grams[key]) - count)) for key, count in shared.items()]
+        scores.sort(key=lambda item: (-item[1], item[0]))
+
+        return scores[:limit]
+
+    def sort(self):
+        """
+        Sorted words and names with their keys, and every key ranked shortest name first.
+        """
+        if self.sorted is None:
+            words = sorted((word, key) for key, text in self.names.items() for word in set(text.split()))
+            texts = sorted((text, key) for key, text in self.names.items())
+            order = sorted(self.names, key=lambda key: (len(self.names[key]), self.names[key]))
+
+            self.sorted = {'words': [word for word, _ in words], 'word_keys': [key for _, key in words],
+                           'texts': [text for text, _ in texts], 'text_keys': [key for _, key in texts],
+                           'order': order, 'rank': {key: rank for rank, key in enumerate(order)}}
+        return self.sorted
+
+    def prefixed(self, prefix, whole=False):
+        """
+        Keys with a word of their name starting with a normalized prefix, or with whole, keys
+        whose whole name starts with it, as a slice of the sorted keys.
+        """
+        index = self.sort()
+        values, keys = (index['texts'], index['text_keys']) if whole else (index['words'], index['word_keys'])
+
+        # Normalized names only hold characters below DEL, so this bounds every string with the prefix
+        return keys[bisect_left(values, prefix):bisect_left(values, prefix + '\x7f')]
+
+    def best(self, candidates, matches, limit):
+        """
+        Up to limit keys for which matches(key) is true, shortest names first.
+
+        When the candidates are most keys, the overall order is walked, skipping keys that aren't
+        candidates, and stops once enough are found, otherwise only the candidates are checked.
+        """
+        index = self.sort()
+        candidates = set(candidates)
+
+        if len(candidates) * 8 > len(index['order']):
+            return list(islice((key for key in index['order'] if key in candidates and matches(key)), limit))
+        return heapq.nsmallest(limit, [key for key in candidates if matches(key)], key=index['rank'].__getitem__)
+
+    def complete(self, name, limit=10, keys=None):
+        """
+        Rank names for a partly typed query, as a typeahead would: names starting with the query
+        first, then names with a word starting with each word of the query, each group shortest
+        first. When there are no such names, names similar to the query are returned instead,
+        so typos still match.
+
+        Parameters:
+        - name (str): The query typed so far.
+        - limit (int): Number of matches returned.
+        - keys (set): Optionally only consider these keys.
+
+        Returns:
+        - matches (list): Keys of the best matches, best first.
+        """
+        text = normalize(name)
+        if not text:
+            return []
+
+        words = text.split()
+        names = self.names
+
+        def allowed(key):
+            return keys is None or key in keys
+
+        def word_match(key):
+            # Every word of the query starts a word of the name
+            name_words = names[key].split()
+            return all(any(name_word.startswith(word) for name_word in name_words) for word in words)
+
+        ranked = self.best(self.prefixed(text, whole=True), lambda key: allowed(key), limit)
+
+        if len(ranked) < limit:
+            # Candidates have every query word, looked up from the word fewest names have
+            ranges = sorted((self.prefixed(word) for word in words), key=len)
+            candidates = ranges[0]
+            if len(ranges) > 1 and len(candidates) * 8 <= len(names):
+                candidates = set(candidates).intersection(*ranges[1:])
+            ranked += self.best(candidates, lambda key: allowed(key) and not names[key].startswith(text)
+                                and word_match(key), limit - len(ranked))
+
+        # Typos, from the names sharing most trigrams with the query
+        if not ranked and len(text) >= 3:
+            ranked = [key for key, score in self.similar(text, limit, keys) if score >= MIN_SIMILARITY]
+
+        return ranked
+
+    def similar(self, text, limit, keys=None):
+        """
+        Names sharing the most trigrams with a normalized query, as search does, but only finding
+        candidates through the query's less common trigrams, so a typo is still quick to look up
+        in a large index where a few trigrams are in most names.
+
+        Returns:
+        - matches (list): (key, score) pairs, best first, score between 0 and 1.
+        """
+        grams = trigrams(text)
+        common = 64 + len(self.names) // 100
+
+        candidates = set()
+        for gram in grams:
+            postings = self.postings.get(gram, set())
+            if len(postings) <= common:
+                candidates |= postings
+        if keys is not None:
+            candidates &= keys
+
+        scores = [(key, len(grams & self.grams[key]) / len(grams | self.grams[key])) for key in candidates]
+        scores.sort(key=lambda item: (-item[1], item[0]))
+        return scores[:limit]
@@ -0,0 +1,173 @@
+# On-disk cache of downloaded pages so rebuilds don't start from scratch
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+
+
+class PageCache:
+    """
+    Stores downloaded pages on disk, keyed by URL.
+
+    Each URL has a small JSON entry holding the ETag, Last-Modified header and time it was
+    fetched. Bodies are zlib compressed and stored under the hash of their content, so the same
+    page reached through different URLs is only saved once.
+
+    Parameters:
+    - directory (str): Folder the cache is kept in.
+    - ttl (int): Seconds a page is used without asking the server again. None never expires.
+    - offline (bool): Only serve from disk and never touch the network.
+    """
+
+    def __init__(self, directory, ttl=None, offline=False):
+        self.directory = directory
+        self.ttl = ttl
+        self.offline = offline
+
+        os.makedirs(os.path.join(directory, 'urls'), exist_ok=True)
+        os.makedirs(os.path.join(directory, 'bodies'), exist_ok=True)
+
+    @staticmethod
+    def _hash(data):
+        return hashlib.sha256(data).hexdigest()
+
+    def _entry_path(self, url):
+        return os.path.join(self.directory, 'urls', self._hash(url.encode('utf-8')) + '.json')
+
+    def _body_path(self, digest):
+        return os.path.join(self.directory, 'bodies', digest + '.z')
+
+    def lookup(self, url):
+        """
+        Return the cached entry for a URL, or None if it was never stored or its body is missing.
+
+        Returns:
+        - entry (dict): url, etag, last_modified, fetched_at and body (hash of the content).
+        """
+        try:
+            with open(self._entry_path(url)) as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        if not os.path.exists(self._body_path(entry['body'])):
+            return None
+
+        return entry
+
+    def is_fresh(self, entry):
+        """
+        Whether an entry is young enough to be used without revalidating.
+        """
+        return self.ttl is None or time.time() - entry['fetched_at'] < self.ttl
+
+    def read(self, entry):
+        """
+        Return the decompressed body of an entry.
+        """
+        with open(self._body_path(entry['body']), 'rb') as file:
+            return zlib.decompress(file.read())
+
+    def conditional_headers(self, entry):
+        """
+        Headers that let the server answer 304 Not Modified instead of resending the page.
+        """
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, url, content, headers):
+        """
+        Save a page body and its validators.
+
+        Parameters:
+        - url (str): URL the page was fetched from.
+        - content (bytes): Body of the response.
+        - headers (dict): Response headers, ETag and Last-Modified are kept.
+        """
+        digest = self._hash(content)
+        body_path = self._body_path(digest)
+
+        if not os.path.exists(body_path):
+            self._write(body_path, zlib.compress(content))
+
+        entry = {'url': url, 'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified'),
+                 'fetched_at': time.time(), 'body': digest}
+        self._write(self._entry_path(url), json.dumps(entry).encode('utf-8'))
+
+    def touch(self, entry):
+        """
+        Mark an entry as fetched now, after the server confirmed it hasn't changed.
+        """
+        entry['fetched_at'] = time.time()
+        self._write(self._entry_path(entry['url']), json.dumps(entry).encode('utf-8'))
+
+    def evict(self, max_age=None):
+        """
+        Delete entries older than max_age seconds (the cache TTL by default) and any bodies
+        no longer referenced by an entry.
+
+        Returns:
+        - removed (int): Number of URL entries deleted.
+        """
+        max_age = self.ttl if max_age is None else max_age
+        urls_dir = os.path.join(self.directory, 'urls')
+        now = time.time()
+
+        removed = 0
+        referenced = set()
+        for name in os.listdir(urls_dir):
+            # Temporary files are pages other threads or processes are still writing
+            if not name.endswith('.json'):
+                continue
+
+            path = os.path.join(urls_dir, name)
+            try:
+                with open(path) as file:
+                    entry = json.load(file)
+            except (OSError, ValueError):
+                os.remove(path)
+                continue
+
+            if max_age is not None and now - entry['fetched_at'] >= max_age:
+                os.remove(path)
+                removed += 1
+            else:
+                referenced.add(entry['body'])
+
+        # Remove bodies that no entry points at anymore
+        bodies_dir = os.path.join(self.directory, 'bodies')
+        for name in os.listdir(bodies_dir):
+            if name.endswith('.z') and name[:-2] not in referenced:
+                os.remove(os.path.join(bodies_dir, name))
+
+        return removed
+
+    @classmethod
+    def evict_expired(cls, config):
+        """
+        Evict the app's page cache after a scrape, so pages past PAGE_CACHE_TTL don't pile up on
+        disk. Offline caches are left alone, as they're the only copy of the pages.
+
+        Parameters:
+        - config (Config): The Flask app's config.
+
+        Returns:
+        - removed (int): Number of URL entries deleted.
+        """
+        if not config.get('PAGE_CACHE_DIR') or config.get('PAGE_CACHE_OFFLINE', False):
+            return 0
+        return cls(config['PAGE_CACHE_DIR'], ttl=config.get('PAGE_CACHE_TTL')).evict()
+
+    @staticmethod
+    def _write(path, data):
+        # Write to a temporary file first so a crash never leaves half a page behind
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(data)
+        os.replace(temp_path, path)
@@ -0,0 +1,199 @@
+# Targeted extraction from Transfermarkt and FBref pages, using lxml and precompiled XPath
+import re
+from io import BytesIO
+
+from lxml import etree
+
+
+def has_class(name):
+    # XPath test for one class among several, as CSS .name matches
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# Transfermarkt
+headline_xpath = etree.XPath("//h1[@class='data-header__headline-wrapper data-header__headline-wrapper--oswald']")
+coefficient_xpath = etree.XPath("//a[@href='/uefa/5jahreswertung/statistik']")
+nation_xpath = etree.XPath(f"//span[{has_class('data-header__club')}]//a")
+second_table_links_xpath = etree.XPath("(//table)[2]//a/@href")
+hauptlink_xpath = etree.XPath(f"//td[{has_class('hauptlink')}]")
+zentriert_xpath = etree.XPath(f"//td[{has_class('zentriert')}]")
+position_rows_xpath = etree.XPath(f"//table[{has_class('inline-table')}]//tr[count(preceding-sibling::tr) = 1]")
+market_value_xpath = etree.XPath("//td[@class='rechts hauptlink']")
+
+# FBref
+stats_table_links_xpath = etree.XPath(f"(//table[{has_class('stats_table')}])[1]//a")
+meta_spans_xpath = etree.XPath("(//*[@id='meta'])[1]//h1//span[not(@*)]")
+first_table_values_xpath = etree.XPath(f"((//table)[1]//tbody)[1]//td[{has_class('right')}]")
+first_table_body_xpath = etree.XPath("((//table)[1]//tbody)[1]")
+scout_labels_xpath = etree.XPath("((//table[contains(@id, 'scout_summary')])[1]//tbody)[1]//th")
+
+
+def parse(content, keep_table=None):
+    """
+    Parse a page into an lxml tree, reading bytes as UTF-8 as the sites serve them.
+
+    With keep_table, the page is parsed as a stream and the rows of every table it rejects are
+    emptied as soon as they are read, so the tree never holds the many tables a page has that
+    the scrapers don't use. The tables themselves stay, so counting tables still works.
+
+    Parameters:
+    - content (bytes): The page.
+    - keep_table (function): Called with each table element, its attributes read, and its number
+      in document order. Returns whether to keep the table's rows. Tables inside a kept table are kept.
+
+    Returns:
+    Element: Root of the tree.
+    """
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+
+    if keep_table is None:
+        return etree.fromstring(content, etree.HTMLParser(encoding='utf-8'))
+
+    events = etree.iterparse(BytesIO(content), events=('start', 'end'), tag=('table', 'tr'),
+                             html=True, encoding='utf-8')
+
+    # Whether each open table's rows are kept, innermost last
+    kept = []
+    number = 0
+    for event, element in events:
+        if element.tag == 'table':
+            if event == 'start':
+                kept.append((kept and kept[-1]) or keep_table(element, number))
+                number += 1
+            else:
+                kept.pop()
+
+        elif event == 'end' and kept and not kept[-1]:
+            element.clear()
+
+    return events.root
+
+
+def first_with_class(name):
+    """
+    keep_table function keeping only the first table with a class.
+    """
+    found = []
+
+    def keep_table(table, number):
+        if not found and name in (table.get('class') or '').split():
+            found.append(number)
+            return True
+        return False
+
+    return keep_table
+
+
+def text(element):
+    """
+    All text inside an element, as BeautifulSoup's get_text() returns it.
+    """
+    return ''.join(element.itertext())
+
+
+def stripped_text(element):
+    """
+    Text inside an element with each piece stripped, as BeautifulSoup's get_text(strip=True) returns it.
+    """
+    return ''.join(piece.strip() for piece in element.itertext())
+
+
+def parse_tm_league(content):
+    """
+    League attributes and club links from a Transfermarkt league page.
+
+    Returns:
+    dict: name, coefficient, nation and club_links (hrefs of every link in the clubs table).
+    """
+    # The clubs are in the second table
+    tree = parse(content, lambda table, number: number < 2)
+
+    return {
+        'name': text(headline_xpath(tree)[0]).strip(),
+        'coefficient': int(re.match(r'\d+', text(coefficient_xpath(tree)[0]).strip()).group()),
+        'nation': text(nation_xpath(tree)[0]).strip(),
+        'club_links': second_table_links_xpath(tree),
+    }
+
+
+def parse_tm_club(content):
+    """
+    Club name and player columns from a Transfermarkt squad page.
+
+    Returns:
+    dict: name, and lists names, ages, positions and values (market value text) in table order.
+    The lists are zipped by the caller, as the page holds them in separate cells.
+    """
+    # Players are in the squad table, with their positions in tables nested in it
+    tree = parse(content, lambda table, number: 'items' in (table.get('class') or '').split())
+
+    # Player name cells end in a line break, unlike other hauptlink cells
+    names = [text(cell) for cell in hauptlink_xpath(tree)]
+    names = [name.strip() for name in names if name.endswith('\n')]
+
+    # Age cells hold two digits and no markup
+    ages = []
+    for cell in zentriert_xpath(tree):
+        age = text(cell)
+        if len(age) == 2 and b'div' not in etree.tostring(cell):
+            ages.append(int(age))
+
+    return {
+        'name': text(headline_xpath(tree)[0]).strip(),
+        'names': names,
+        'ages': ages,
+        'positions': [stripped_text(row) for row in position_rows_xpath(tree)],
+        'values': [text(cell) for cell in market_value_xpath(tree)],
+    }
+
+
+def parse_fbref_links(content):
+    """
+    Links of the first stats table on an FBref league page.
+
+    Returns:
+    list: (href, link text stripped) of every link in the table.
+    """
+    tree = parse(content, first_with_class('stats_table'))
+    return [(link.get('href') or '', stripped_text(link)) for link in stats_table_links_xpath(tree)]
+
+
+def parse_fbref_squad(content):
+    """
+    Title and player links from an FBref squad page.
+
+    Returns:
+    dict: titles (headline span texts) and links (hrefs of every link in the first stats table).
+    """
+    tree = parse(content, first_with_class('stats_table'))
+
+    return {
+        'titles': [text(span) for span in meta_spans_xpath(tree)],
+        'links': [link.get('href') or '' for link in stats_table_links_xpath(tree)],
+    }
+
+
+def parse_fbref_player(content):
+    """
+    Name and scouting report from an FBref player page.
+
+    Returns:
+    dict: names (headline span texts), labels (scouting report rows) and values (value cells
+    of the first table, stripped), or None when the page has no table to read values from.
+    Labels and values are zipped by the caller.
+    """
+    # Values are read from the first table, labels from the scouting report
+    tree = parse(content, lambda table, number: number == 0 or 'scout_summary' in (table.get('id') or ''))
+
+    if not first_table_body_xpath(tree):
+        return None
+
+    labels = [text(cell) for cell in scout_labels_xpath(tree)]
+    values = [stripped_text(cell) for cell in first_table_values_xpath(tree)]
+
+    return {
+        'names': [text(span) for span in meta_spans_xpath(tree)],
+        'labels': [label for label in labels if len(label) > 1],
+        'values': [value for value in values if len(value) > 1],
+    }
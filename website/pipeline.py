@@ -0,0 +1,318 @@
+# Staged scraping: pages are fetched by the crawler's threads, parsed in worker processes,
+# then resolved to database IDs and written by the scraper's own thread, the only one writing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import requests
+
+from .metrics import metrics
+from .processes import process_context
+
+# Metrics of the last pipeline to finish, stage name -> metrics
+latest = {}
+
+
+class ParseError(Exception):
+    """
+    Raised when a parser fails on a page, such as one with an unexpected layout.
+    """
+
+
+def parse_timed(parser, content):
+    """
+    Run a parser and time it, in a worker process.
+    """
+    start = time.perf_counter()
+    try:
+        result = parser(content)
+    except Exception as error:
+        # Told apart from the pool itself failing, and sent back with the error's text
+        raise ParseError(f"{type(error).__name__}: {error}") from error
+    return result, time.perf_counter() - start
+
+
+def finished(name, stages):
+    """
+    Keep the metrics of a finished scrape in latest and add them to the process's counters.
+
+    Parameters:
+    - name (str): Scraper the metrics are labelled with.
+    - stages (dict): Stage name -> metrics, as from Pipeline.metrics.
+    """
+    latest.clear()
+    latest.update(stages)
+
+    for stage, values in stages.items():
+        metrics.inc('scrape_stage_items_total', values['processed'], scraper=name, stage=stage)
+        metrics.inc('scrape_stage_seconds_total', values['seconds'], scraper=name, stage=stage)
+
+
+def report(stages):
+    """
+    Print one line per stage.
+    """
+    for name, stage in stages.items():
+        print(f"{name:>8}: {stage['processed']:7d} done  {stage['per_second']:8.2f}/s  "
+              f"busy {stage['seconds']:8.2f} s  backlog {stage['backlog']} (max {stage['max_backlog']})")
+
+
+class StageMetrics:
+    """
+    Counts of one pipeline stage, safe to update from several threads.
+
+    Attributes:
+    - processed (int): Items the stage finished.
+    - seconds (float): Time spent working on them.
+    - backlog (int): Items waiting for or in the stage now.
+    - max_backlog (int): Largest backlog seen.
+    """
+
+    def __init__(self):
+        self.processed = 0
+        self.seconds = 0.0
+        self.backlog = 0
+        self.max_backlog = 0
+        self.lock = threading.Lock()
+
+    def queued(self, count=1):
+        with self.lock:
+            self.backlog += count
+            self.max_backlog = max(self.max_backlog, self.backlog)
+
+    def done(self, seconds, count=1, queued=True):
+        with self.lock:
+            self.processed += count
+            self.seconds += seconds
+            if queued:
+                self.backlog -= count
+
+    def snapshot(self, elapsed):
+        """
+        The metrics as a dict, with throughput over the pipeline's elapsed time.
+        """
+        with self.lock:
+            return {'processed': self.processed, 'seconds': round(self.seconds, 3),
+                    'per_second': round(self.processed / elapsed, 2) if elapsed else 0.0,
+                    'backlog': self.backlog, 'max_backlog': self.max_backlog}
+
+
+class Pipeline:
+    """
+    Fetch -> parse -> resolve -> write stages for a scraper.
+
+    Fetching uses the crawler's thread pool and per-host rate limits. Each fetched page is handed
+    to a process pool to be parsed, so parsing doesn't hold the GIL the fetch threads and the
+    scraper need. Parsed pages come back to the scraper's thread in order, where they are resolved
+    to database IDs and buffered by a BulkWriter, which keeps SQLite down to a single writer.
+    Resolving stays in that thread as new leagues and clubs need IDs from the writer.
+
+    At most max_pending pages of each map are fetched or parsed ahead of the scraper, so the
+    queues between stages stay bounded however far the scraper falls behind.
+
+    While running, each stage's backlog is read at /metrics, and each stage's items and time are
+    added to the process's counters once the pipeline closes.
+
+    URLs whose request failed are kept in failed, telling a page worth fetching again apart from
+    one that was fetched but parsed to nothing, as map yields None for both.
+
+    Parameters:
+    - crawler (Crawler): Fetches pages.
+    - parse_workers (int): Parser processes, 1 to parse in the fetch threads instead.
+    - max_pending (int): Pages of a map in flight ahead of the scraper.
+    - name (str): Scraper the pipeline runs for, labelling its metrics.
+    """
+
+    def __init__(self, crawler, parse_workers=1, max_pending=16, name='scrape'):
+        self.crawler = crawler
+        self.name = name
+        self.max_pending = max_pending
+        # Parser processes start on the first page, from a crawler thread, so they aren't forked from this process
+        self.parse_pool = ProcessPoolExecutor(max_workers=parse_workers, mp_context=process_context()) \
+            if parse_workers > 1 else None
+
+        self.started = time.perf_counter()
+        self.stages = {name: StageMetrics() for name in ('fetch', 'parse', 'resolve', 'write')}
+        self.writers = []
+        self.failed = set()
+        metrics.collectors.append(self.backlog)
+
+    def backlog(self):
+        # Series of the running pipeline, for /metrics
+        for stage, values in self.metrics().items():
+            yield 'scrape_stage_backlog', values['backlog'], {'scraper': self.name, 'stage': stage}
+
+    def fetch(self, url):
+        # Runs in a crawler thread
+        start = time.perf_counter()
+        try:
+            return self.crawler.get(url)
+        finally:
+            self.stages['fetch'].done(time.perf_counter() - start)
+
+    def submit(self, url, parser):
+        """
+        Start fetching and parsing a page in the background.
+
+        Returns:
+        - future (Future): Resolves to the parsed page.
+        """
+        result = Future()
+        self.stages['fetch'].queued()
+
+        def parsed(future):
+            # Parse stage finished, the page now waits for the scraper to resolve it
+            try:
+                page, seconds = future.result()
+            except BaseException as error:
+                self.stages['parse'].done(0)
+                result.set_exception(error)
+                return
+
+            self.stages['parse'].done(seconds)
+            self.stages['resolve'].queued()
+            result.set_result(page)
+
+        def fetched(future):
+            # Fetch stage finished, hand the page to the parsers
+            try:
+                content = future.result()
+            except BaseException as error:
+                result.set_exception(error)
+                return
+
+            self.stages['parse'].queued()
+            if self.parse_pool is None:
+                parse = Future()
+                try:
+                    parse.set_result(parse_timed(parser, content))
+                except Exception as error:
+                    parse.set_exception(error)
+                parsed(parse)
+            else:
+                self.parse_pool.submit(parse_timed, parser, content).add_done_callback(parsed)
+
+        self.crawler.executor.submit(self.fetch, url).add_done_callback(fetched)
+        return result
+
+    def get(self, url, parser):
+        """
+        Fetch and parse a single page, waiting for it.
+
+        Returns:
+        - page: What the parser returned.
+        """
+        return self.submit(url, parser).result()
+
+    def map(self, urls, parser):
+        """
+        Fetch and parse pages, yielding each in the original order once it is ready,
+        with at most max_pending pages in flight ahead of the caller.
+
+        Parameters:
+        - urls (list): Pages to download.
+        - parser (function): Parses one page's content, must be picklable (defined at module level).
+
+        Yields:
+        - (url, page): The URL and its parsed page, or None as page if the request or the parser failed.
+        """
+        urls = list(urls)
+        futures = []
+        submitted = 0
+
+        for number, url in enumerate(urls):
+            # Top up the window of pages in flight
+            while submitted < len(urls) and submitted < number + self.max_pending:
+                futures.append(self.submit(urls[submitted], parser))
+                submitted += 1
+
+            try:
+                page = futures[number].result()
+            except requests.RequestException as error:
+                print(f"Failed to fetch {url}: {error}")
+                self.failed.add(url)
+                yield url, None
+                continue
+            except ParseError as error:
+                print(f"Failed to parse {url}: {error}")
+                yield url, None
+                continue
+            finally:
+                futures[number] = None
+
+            yield url, page
+
+    def resolved(self, seconds, queued=True):
+        """
+        Record a page resolved by the scraper.
+        """
+        self.stages['resolve'].done(seconds, queued=queued)
+
+    def watch(self, writer):
+        """
+        Include a BulkWriter's flushes in the write stage's metrics.
+        """
+        self.writers.append(writer)
+
+    def metrics(self):
+        """
+        Throughput and backlog of each stage.
+
+        Returns:
+        dict: Stage name -> processed, seconds, per_second, backlog and max_backlog.
+        The write stage counts rows, with backlog being the rows buffered and not yet written.
+        """
+        elapsed = time.perf_counter() - self.started
+        metrics = {name: stage.snapshot(elapsed) for name, stage in self.stages.items()}
+
+        written = sum(writer.written for writer in self.writers)
+        seconds = sum(writer.seconds for writer in self.writers)
+        metrics['write'].update(processed=written, seconds=round(seconds, 3),
+                                per_second=round(written / elapsed, 2) if elapsed else 0.0,
+                                backlog=sum(writer.pending for writer in self.writers))
+        return metrics
+
+    def close(self):
+        """
+        Stop the parser processes and the crawler, keep the final metrics in latest and add them
+        to the process's counters.
+        """
+        if self.backlog in metrics.collectors:
+            metrics.collectors.remove(self.backlog)
+            finished(self.name, self.metrics())
+
+        if self.parse_pool is not None:
+            self.parse_pool.shutdown(wait=False, cancel_futures=True)
+        self.crawler.close()
+
+    def report(self):
+        """
+        Print one line per stage.
+        """
+        report(self.metrics())
+
+    @classmethod
+    def from_config(cls, config, name='scrape', buckets=None):
+        """
+        Build a pipeline and its crawler from the Flask app config.
+
+        Parameters:
+        - config (Config): The Flask app's config.
+        - name (str): Scraper the pipeline runs for.
+        - buckets (dict): Host -> token bucket shared with other crawlers.
+
+        Returns:
+        - pipeline (Pipeline): The configured pipeline.
+        """
+        from .crawler import Crawler
+
+        return cls(Crawler.from_config(config, buckets),
+                   parse_workers=config.get('PARSE_WORKERS') or os.cpu_count() or 1,
+                   max_pending=config.get('PIPELINE_MAX_PENDING', 16), name=name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
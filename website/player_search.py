@@ -0,0 +1,86 @@
+# Typeahead search over the names of players with stats, indexed once per data version
+import threading
+
+import numpy as np
+
+from . import db
+from .matrix import get_matrix
+from .models import Club
+from .name_index import NameIndex
+
+
+class PlayerSearch:
+    """
+    Name index over every player with stats, keyed by their stat matrix row, along with the rows
+    of each position and club so filters narrow the candidates before anything is ranked.
+
+    Parameters:
+    - matrix (StatMatrix): The stat matrix of the current data version.
+    - clubs (dict): Club ID -> club name.
+    """
+
+    def __init__(self, matrix, clubs):
+        self.matrix = matrix
+        self.clubs = clubs
+
+        self.players = NameIndex()
+        self.position_rows = {}
+        self.club_rows = {}
+        for row in np.flatnonzero(matrix.has_stats()).tolist():
+            self.players.add(row, matrix.names[row])
+            self.position_rows.setdefault(matrix.positions[row], set()).add(row)
+            self.club_rows.setdefault(matrix.club_ids[row], set()).add(row)
+
+        self.club_names = NameIndex()
+        for club_id, name in clubs.items():
+            self.club_names.add(club_id, name)
+
+    def search(self, query, position=None, club=None, limit=10):
+        """
+        Players whose names best match a partly typed query.
+
+        Parameters:
+        - query (str): The name typed so far, accents and case are ignored.
+        - position (str): Only players in this position.
+        - club (str): Only players of clubs whose name contains this.
+        - limit (int): Number of matches returned.
+
+        Returns:
+        - players (list): name, position and club of each match, best first.
+        """
+        rows = None
+        if position:
+            rows = self.position_rows.get(position, set())
+        if club:
+            club_rows = set()
+            for club_id in self.club_names.containing(club):
+                club_rows |= self.club_rows.get(club_id, set())
+            rows = club_rows if rows is None else rows & club_rows
+
+        return [{'name': self.matrix.names[row], 'position': self.matrix.positions[row],
+                 'club': self.clubs.get(self.matrix.club_ids[row])}
+                for row in self.players.complete(query, limit=limit, keys=rows)]
+
+
+# Index shared by every request in this process
+current = {'search': None}
+lock = threading.Lock()
+
+
+def get_player_search():
+    """
+    The player search index of the current data version, rebuilt only when the stat matrix changes.
+
+    Returns:
+    - search (PlayerSearch): The up to date index.
+    """
+    matrix = get_matrix()
+    search = current['search']
+    if search is not None and search.matrix is matrix:
+        return search
+
+    with lock:
+        if current['search'] is None or current['search'].matrix is not matrix:
+            clubs = dict(db.session.query(Club.id, Club.name).all())
+            current['search'] = PlayerSearch(matrix, clubs)
+        return current['search']
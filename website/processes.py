@@ -0,0 +1,23 @@
+# Process pools started from a threaded process, such as the web server running ingestion
+import multiprocessing
+
+# Modules the shard, parser and training processes run, imported once by the forkserver rather
+# than by every process
+PRELOAD = ['website.shards', 'website.parsers', 'website.pipeline', 'website.importance']
+
+
+def process_context():
+    """
+    The multiprocessing context the app's process pools are started with. A fork copies the
+    locks other threads of this process hold, such as the web server's, so processes are forked
+    from a clean forkserver process where the platform has one, and spawned elsewhere, such as
+    on Windows.
+
+    Returns:
+    - context: The forkserver context with PRELOAD set, or the spawn context.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(PRELOAD)
+        return context
+    return multiprocessing.get_context('spawn')
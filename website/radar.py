@@ -1,133 +1,90 @@
 from flask import Blueprint, render_template, request
-import plotly.graph_objects as go
 
-from sqlalchemy import and_
-
-from .importance import calc_stat_importance
-from .models import Player, PlayerStat, Stat
+from .caching import cached_page
 
 # Create Flask blueprint for radar page
 radar = Blueprint('radar', __name__)
 
 
+def radar_args():
+    """
+    The radar chart's query arguments with defaults applied, as (position, player1, player2, players).
+    """
+    player1 = request.args.get('player1', 'Bukayo Saka')
+    player2 = request.args.get('player2', 'Phil Foden')
+
+    # Any number of players can be compared with ?player=...&player=...
+    players = tuple(request.args.getlist('player')) or (player1, player2)
+
+    return request.args.get('position', 'Right Winger'), player1, player2, players
+
+
 @radar.route('/radar')
+@cached_page(radar_args)
 def radar_chart():
     """
 
-    This function renders the radar chart page using the 'radar.html' template. It retrieves data
-    on player stats from the database and calls a function that calculates features importance for the
-    selected position. This data is passed into a function that creates the radar chart.
+    This function renders the radar chart page using the 'radar.html' template, with the position
+    and player name inputs. The chart itself is drawn in the browser with plotly.js from /api/radar,
+    which calculates feature importance for the selected position.
 
     Returns:
-    HTML: Rendered HTML template for the radar chart page.
+    HTML: Rendered HTML template for the radar chart page, cached per arguments and data version.
     """
+    from .dimensions import get_dimensions
 
-
-    # All positions
-    positions = list(dict.fromkeys([player.position for player in Player.query.distinct(Player.position)]))
+    # Positions, worked out once per data version
+    dimensions = get_dimensions()
 
     # Aspirational objective
-    positions.remove("Goalkeeper")
-
-    # Get selected names from the query parameters
-    selected_position = request.args.get('position', 'Right Winger')
-
-    # Importance of each feature and the names found with stats in the given position
-    feature_importances, player_ids, player_names = calc_stat_importance(selected_position)
-    player1 = request.args.get('player1', 'Bukayo Saka')
-    player2 = request.args.get('player2', 'Phil Foden')
+    positions = [position for position in dimensions.positions if position != "Goalkeeper"]
 
-    # Function to generate the radar chart given names
-    radar_chart1 = generate_radar_chart(player1, player2, feature_importances, player_ids)
+    # Get selected position and names from the query parameters
+    selected_position, player1, player2, _ = radar_args()
 
-    return render_template('radar.html', radar_chart=radar_chart1,
-                           positions=positions, selected_position=selected_position, names=player_names,
+    # Player names are loaded as they are typed, from /api/players/search
+    return render_template('radar.html', positions=positions, selected_position=selected_position,
                            player1=player1, player2=player2)
 
 
-def generate_radar_chart(player1, player2, feature_importance_dict, player_ids):
+def radar_values(player_names, feature_importance_dict, selected_position, top=5):
     """
 
-    This function generates a radar chart comparing two players based on the top 5 feature importance
-    scores calculated from the RandomForestRegressor model. It uses Plotly graph objects to create
-    the radar chart.
+    This function works out the values drawn on the radar chart for any number of players, by
+    slicing the shared stat matrix rather than querying per stat and player. Each value is scaled
+    by the highest value of that stat among players in the selected position.
 
     Parameters:
-    - player1 (str): The name of the first player.
-    - player2 (str): The name of the second player.
+    - player_names (list): Names of the players to compare.
     - feature_importance_dict (dict): A dictionary containing the importance scores of each stat
       for predicting player market value.
-    - player_ids (list): A list of player IDs used in the analysis.
+    - selected_position (str): Position whose players set the maximum of each stat.
+    - top (int): Number of most important stats shown.
 
     Returns:
-    HTML: Rendered HTML for the radar chart.
+    - top_stats (list): Labels of the most important stats.
+    - scaled_values (dict): Player name -> list of their scaled values, for players that were found.
     """
+    import numpy as np
+
+    from .matrix import get_matrix
+
+    matrix = get_matrix()
 
     # The top 5 most important stats based on calculated feature importance
-    top_stats = sorted(feature_importance_dict, key=lambda k: feature_importance_dict[k], reverse=True)[:5]
-
-    # IDs of these stats
-    top_stat_ids = [Stat.query.filter_by(label=stat_label).first().id for stat_label in top_stats]
-
-    # IDs of both the selected players
-    player_1_id = Player.query.filter_by(name=player1).first().id
-    player_2_id = Player.query.filter_by(name=player2).first().id
-
-    max_values = {}
-    for stat_id in top_stat_ids:
-        # Loop to find the max value of each stat in the selected position, used as the outer bound on the radar chart
-        max_value = PlayerStat.query.filter(and_(PlayerStat.player_id.in_(player_ids),
-                                                 PlayerStat.stat_id == stat_id)).order_by(
-            PlayerStat.value.desc()).first().value
-        max_values[stat_id] = max_value if isinstance(max_value, str) else max_value
-
-    # List of each players' stat values
-    player_1_values = [
-        PlayerStat.query.filter(and_(PlayerStat.player_id == player_1_id, PlayerStat.stat_id == stat_id)).first().value
-        if isinstance(PlayerStat.query.filter(and_(PlayerStat.player_id == player_1_id, PlayerStat.stat_id == stat_id)).first().value, str) else
-        PlayerStat.query.filter(and_(PlayerStat.player_id == player_1_id, PlayerStat.stat_id == stat_id)).first().value
-        for stat_id in top_stat_ids
-    ]
-
-    player_2_values = [
-        PlayerStat.query.filter(and_(PlayerStat.player_id == player_2_id, PlayerStat.stat_id == stat_id)).first().value
-        if isinstance(PlayerStat.query.filter(and_(PlayerStat.player_id == player_2_id, PlayerStat.stat_id == stat_id)).first().value, str) else
-        PlayerStat.query.filter(and_(PlayerStat.player_id == player_2_id, PlayerStat.stat_id == stat_id)).first().value
-        for stat_id in top_stat_ids
-    ]
-
-    # Values scaled to percentiles of max
-    player_1_values_scaled = [val / max_values[stat_id] for val, stat_id in zip(player_1_values, top_stat_ids)]
-    player_2_values_scaled = [val / max_values[stat_id] for val, stat_id in zip(player_2_values, top_stat_ids)]
-
-    fig = go.Figure()
-
-    # Add player 1 plot
-    fig.add_trace(go.Scatterpolar(
-        r=player_1_values_scaled,
-        theta=top_stats,
-        fill='toself',
-        name=player1
-    ))
-
-    # Add player 2 plot
-    fig.add_trace(go.Scatterpolar(
-        r=player_2_values_scaled,
-        theta=top_stats,
-        fill='toself',
-        name=player2
-    ))
-
-    # Conversion to polar chart with radial axis
-    fig.update_layout(
-        polar=dict(
-            radialaxis=dict(
-                visible=True,
-                range=[0, 1]
-            )),
-        showlegend=False
-    )
-
-    return fig.to_html(full_html=False)
+    top_stats = sorted(feature_importance_dict, key=lambda k: feature_importance_dict[k], reverse=True)[:top]
+    columns = [matrix.column(stat_label) for stat_label in top_stats]
+
+    # Max value of each stat in the selected position, used as the outer bound on the radar chart
+    position_values = matrix.values[matrix.position_mask(selected_position)][:, columns]
+    max_values = np.nanmax(position_values, axis=0) if len(position_values) else np.full(len(columns), np.nan)
+
+    # Row of the first player with each name, from the matrix's name lookup
+    rows = {name: matrix.row(name) for name in player_names}
+    found = [name for name in player_names if rows[name] is not None]
 
+    # Values scaled to percentiles of max, for every player at once
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scaled = matrix.values[[rows[name] for name in found]][:, columns] / max_values
 
+    return top_stats, {name: scaled[number].tolist() for number, name in enumerate(found)}
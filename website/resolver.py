@@ -0,0 +1,157 @@
+# In-memory lookups used while ingesting scraped data
+from fuzzywuzzy import fuzz
+
+from . import db
+from .models import League, Club, Player, Stat, PlayerStat
+from .name_index import NameIndex, normalize
+
+# Minimum fuzz.ratio for two differently written names to count as the same
+MATCH_RATIO = 90
+
+
+class Resolver:
+    """
+    Resolves scraped clubs, players and stats to their database IDs without querying per row.
+
+    Everything needed is loaded in a few queries when the resolver is created, and rows
+    written during ingestion are recorded so later lookups see them too.
+    """
+
+    def __init__(self):
+        # name -> league_id and name -> club_id, for pages scraped again
+        self.leagues = {name: league_id for league_id, name in db.session.query(League.id, League.name)}
+        self.club_names = {name: club_id for club_id, name in db.session.query(Club.id, Club.name)}
+
+        # (name, club_id) -> player_id
+        self.players = {(name, club_id): player_id for player_id, name, club_id in
+                        db.session.query(Player.id, Player.name, Player.club_id)}
+
+        # label -> stat_id, empty labels are ignored
+        self.stats = {label: stat_id for stat_id, label in
+                      db.session.query(Stat.id, Stat.label) if len(label) > 1}
+
+        # (player_id, stat_id) -> player_stat_id of values already stored
+        self.player_stats = {(player_id, stat_id): player_stat_id for player_stat_id, player_id, stat_id in
+                             db.session.query(PlayerStat.id, PlayerStat.player_id, PlayerStat.stat_id)}
+
+        # Fuzzy name indexes for clubs, and players grouped by club
+        self.clubs = NameIndex()
+        for club_id, name in db.session.query(Club.id, Club.name):
+            self.clubs.add(club_id, name)
+
+        self.player_names = NameIndex()
+        self.club_players = {}
+        for (name, club_id), player_id in self.players.items():
+            self.player_names.add(player_id, name)
+            self.club_players.setdefault(club_id, set()).add(player_id)
+
+    def club_id(self, name):
+        """
+        Find a club whose stored name contains the given name, or else the most similar club name.
+
+        Returns:
+        - club_id (int): ID of the club, or None if nothing matched.
+        """
+        return find_club(self.clubs, name)
+
+    def player_id(self, name, club_id):
+        """
+        Find a player in a club, by exact name or else the closest similar name in that club.
+
+        Returns:
+        - player_id (int): ID of the player, or None if nothing matched.
+        """
+        player_id = self.players.get((name, club_id))
+        if player_id is not None:
+            return player_id
+
+        for player_id, _ in self.player_names.search(name, limit=1, keys=self.club_players.get(club_id, set())):
+            if fuzz.ratio(normalize(name), self.player_names.names[player_id]) >= MATCH_RATIO:
+                return player_id
+
+        return None
+
+    def stat_id(self, writer, label):
+        """
+        ID of a stat label, inserting the stat through the writer if it's new.
+        """
+        if label not in self.stats:
+            self.stats[label] = writer.insert_one(Stat, label=label)
+        return self.stats[label]
+
+    def store_league(self, writer, name, **values):
+        """
+        ID of a league, inserting it through the writer if it's new or updating it if it exists.
+        """
+        if name in self.leagues:
+            writer.update(League, self.leagues[name], **values)
+        else:
+            self.leagues[name] = writer.insert_one(League, name=name, **values)
+        return self.leagues[name]
+
+    def store_club(self, writer, name, league_id):
+        """
+        ID of a club, inserting it through the writer if it's new.
+        """
+        if name not in self.club_names:
+            self.club_names[name] = writer.insert_one(Club, name=name, league_id=league_id)
+            self.clubs.add(self.club_names[name], name)
+        return self.club_names[name]
+
+    def store_player(self, writer, name, club_id, **values):
+        """
+        Buffer a player, updating the stored row when the same name is already in the club.
+        """
+        player_id = self.players.get((name, club_id))
+        if player_id is None:
+            writer.add(Player, name=name, club_id=club_id, **values)
+        else:
+            writer.update(Player, player_id, **values)
+
+    def load_players(self, club_id):
+        """
+        Add a club's players to the lookups once they're written, for when the same resolver goes
+        on to match their stats.
+        """
+        for player_id, name in db.session.query(Player.id, Player.name).filter_by(club_id=club_id):
+            if (name, club_id) not in self.players:
+                self.players[(name, club_id)] = player_id
+                self.player_names.add(player_id, name)
+                self.club_players.setdefault(club_id, set()).add(player_id)
+
+    def store_player_stat(self, writer, player_id, stat_id, value):
+        """
+        Buffer a player's stat value, updating the stored value if there is one.
+        """
+        player_stat_id = self.player_stats.get((player_id, stat_id))
+        if player_stat_id is None:
+            if (player_id, stat_id) not in self.player_stats:
+                writer.add(PlayerStat, player_id=player_id, stat_id=stat_id, value=value)
+                # ID isn't known until the batch is written
+                self.player_stats[(player_id, stat_id)] = None
+        else:
+            writer.update(PlayerStat, player_stat_id, value=value)
+
+
+def find_club(clubs, name):
+    """
+    Find a club whose indexed name contains the given name, or else the most similar club name.
+
+    Parameters:
+    - clubs (NameIndex): Club names, keyed by club ID or any other key.
+    - name (str): The club name to look up.
+
+    Returns:
+    - key: Key of the club, or None if nothing matched.
+    """
+    # Name is a substring of a club's name
+    matches = clubs.containing(name)
+    if matches:
+        return matches[0]
+
+    # Match based on similar strings, only scoring clubs that share trigrams
+    for key, _ in clubs.search(name):
+        if fuzz.ratio(normalize(name), clubs.names[key]) >= MATCH_RATIO:
+            return key
+
+    return None
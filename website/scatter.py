@@ -1,113 +1,104 @@
-import pandas as pd
 from flask import Blueprint, render_template, request
-import plotly.express as px
 
 from sqlalchemy import and_
+from sqlalchemy.orm import aliased
 
+from . import db
+from .caching import cached_page
 from .models import Player, PlayerStat, Stat, Club, League
 
 scatter = Blueprint('scatter', __name__)
 
 
+def scatter_args():
+    """
+    The scatter chart's query arguments with defaults applied, as (position, x_stat, y_stat).
+    """
+    return (request.args.get('position', 'Centre-Forward'),
+            request.args.get('x_stat', 'npxG: Non-Penalty xG'),
+            request.args.get('y_stat', 'Non-Penalty Goals'))
+
+
 # Scatter chart route
 @scatter.route('/scatter')
+@cached_page(scatter_args)
 def scatter_chart():
     """
-    Renders a scatter chart and a histogram based on user-selected positions and statistics.
+    Renders the scatter chart page based on user-selected positions and statistics.
 
-    This function retrieves data on football players' stats from the database and generates
-    a scatter chart and a histogram using Plotly Express. The scatter plot displays the relationship
-    between two selected statistics, while the histogram visualizes the distribution of one selected statistic.
+    The page holds the dropdowns, and draws a scatter chart and a histogram in the browser with
+    plotly.js from the data at /api/scatter. The scatter plot displays the relationship between two
+    selected statistics, while the histogram visualizes the distribution of one selected statistic.
     Users can choose the position, x-axis stat, and y-axis stat for the scatter plot.
 
     Returns:
-    HTML: Rendered HTML templates containing the scatter chart and histogram.
+    HTML: Rendered HTML template of the scatter chart page, cached per arguments and data version.
 
     """
+    from .dimensions import get_dimensions
 
-    # All positions
-    positions = list(dict.fromkeys([player.position for player in Player.query.distinct(Player.position)]))
+    # Positions and stats held by the stored players, worked out once per data version
+    dimensions = get_dimensions()
 
     # Aspirational objective
-    positions.remove("Goalkeeper")
+    positions = [position for position in dimensions.positions if position != "Goalkeeper"]
 
     # Inputs
-    position = request.args.get('position', 'Centre-Forward')
-    x_stat = request.args.get('x_stat', 'npxG: Non-Penalty xG')
-    y_stat = request.args.get('y_stat', 'Non-Penalty Goals')
-
-    # IDs of X and Y stats
-    x_id = Stat.query.filter(Stat.label == x_stat).first().id
-    y_id = Stat.query.filter(Stat.label == y_stat).first().id
-
-    # Basic info of each relevant player within position that has values
-    player_queries = Player.query.filter(and_(Player.position == position,
-                                              Player.id.in_(p_id[0] for p_id in PlayerStat.query.with_entities(
-                                                  PlayerStat.player_id).all()))).all()
-
-    # Player
-    player_ids = [player.id for player in player_queries]
-    player_names = [player.name for player in player_queries]
-    player_ages = [player.age for player in player_queries]
-
-    # Club
-    club_ids = [player.club_id for player in player_queries]
-    club_queries = [Club.query.filter_by(id=club_id).first() for club_id in club_ids]
-
-    # League
-    league_ids = [club.league_id for club in club_queries]
-    league_names = [League.query.filter_by(id=league_id).first().name for league_id in league_ids]
-
-    # Values of x stat for each player
-    x_values = PlayerStat.query.filter(and_(PlayerStat.stat_id == x_id,
-                                            PlayerStat.player_id.in_(player_ids))).order_by(PlayerStat.player_id).all()
-    x_values = [x.value if isinstance(x.value, str) else x.value for x in x_values]
-
-    # Values of y stat for each player
-    y_values = PlayerStat.query.filter(and_(PlayerStat.stat_id == y_id,
-                                            PlayerStat.player_id.in_(player_ids))).order_by(PlayerStat.player_id).all()
-    y_values = [y.value if isinstance(y.value, str) else y.value for y in y_values]
+    position, x_stat, y_stat = scatter_args()
 
-    # Retrieval of market values
-    mk_values = [player.market_value for player in Player.query.filter(
-        Player.id.in_(player_ids)).order_by(
-        Player.id).all()]
+    # Stats the selected position's players have
+    stats = dimensions.position_stats(position)
 
+    return render_template('scatter.html', positions=positions, stats=stats, selected_position=position,
+                           selected_x_stat=x_stat, selected_y_stat=y_stat)
 
-    df = pd.DataFrame({
-        x_stat: x_values,
-        y_stat: y_values,
-        "Name": player_names,
-        'Age': player_ages,
-        'Value': mk_values,
-        'League': league_names
-    })
-
-    fig = px.scatter(df, x=x_stat, y=y_stat, size="Value", trendline="ols", hover_name="Name",
-                     color='Age', color_continuous_scale='Viridis', symbol='League')
-
-    # Adjust the size of the figure
-    fig.update_layout(width=1000, height=1000)
 
-    fig.update_xaxes(range=[0, 1.1 * max(x_values)])
-    fig.update_yaxes(range=[0, 1.1 * max(y_values)])
+def scatter_data(position, x_stat, y_stat):
+    """
+    Collects the data behind the scatter chart in a single query joining Player, Club, League
+    and PlayerStat twice (once for each stat). Players missing either stat are left out, so every
+    row's values belong to the same player by construction.
 
-    # Horizontal orientation
-    fig.update_layout(legend=dict(orientation="h"))
+    Parameters:
+    - position (str): Position of the players shown.
+    - x_stat (str): Label of the stat on the x-axis.
+    - y_stat (str): Label of the stat on the y-axis.
 
-    fig2 = px.histogram(df, x=x_stat, nbins=64, marginal='rug',
-                        title=f'{position}')
+    Returns:
+    dict: Columns of the x and y stat values, Name, Age, Value and League, one entry per player.
+    """
+    rows = scatter_query(position, x_stat, y_stat).all()
+    columns = list(zip(*rows)) if rows else [()] * 6
 
-    fig2.update_layout(width=720, height=720)
+    return {
+        x_stat: list(columns[0]),
+        y_stat: list(columns[1]),
+        "Name": list(columns[2]),
+        'Age': list(columns[3]),
+        'Value': list(columns[4]),
+        'League': list(columns[5])
+    }
 
-    scatter_chart_html = fig.to_html(full_html=False)
-    distplot_html = fig2.to_html(full_html=False)
 
-    # Fetch unique values for x_stat, and y_stat
-    stats = [stat.label for stat in Stat.query.distinct(Stat.label)][:19]
-    gk_stats = [stat.label for stat in Stat.query.distinct(Stat.label)][19:]
+def scatter_query(position, x_stat, y_stat):
+    """
+    The joined query behind scatter_data, ordered by player ID.
 
-    return render_template('scatter.html', scatter_chart=scatter_chart_html, distplot=distplot_html,
-                           positions=positions, x_stats=stats, y_stats=stats, gk_stats=gk_stats,
-                           selected_position=position,
-                           selected_x_stat=x_stat, selected_y_stat=y_stat)
+    Returns:
+    Query: Rows of (x value, y value, name, age, market value, league name).
+    """
+    x_value = aliased(PlayerStat)
+    y_value = aliased(PlayerStat)
+    x_label = aliased(Stat)
+    y_label = aliased(Stat)
+
+    return db.session.query(x_value.value, y_value.value, Player.name, Player.age,
+                            Player.market_value, League.name) \
+        .join(Club, Club.id == Player.club_id) \
+        .join(League, League.id == Club.league_id) \
+        .join(x_value, x_value.player_id == Player.id) \
+        .join(x_label, and_(x_label.id == x_value.stat_id, x_label.label == x_stat)) \
+        .join(y_value, y_value.player_id == Player.id) \
+        .join(y_label, and_(y_label.id == y_value.stat_id, y_label.label == y_stat)) \
+        .filter(Player.position == position) \
+        .order_by(Player.id)
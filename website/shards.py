@@ -0,0 +1,356 @@
+# Leagues scraped in parallel processes, one league per shard, merged into the database by one writer
+import queue
+import time
+
+# Set in each shard process when it starts: config, buckets, messages and stop
+shard = {}
+
+
+class Stopped(Exception):
+    """
+    Raised in a shard when the merging process has given up on the scrape.
+    """
+
+
+def start_shard(config, buckets, messages, stop):
+    """
+    Initializer of the shard processes, keeping what every league they scrape shares.
+
+    Parameters:
+    - config (dict): The Flask app's config.
+    - buckets (dict): Host -> SharedBucket, one rate budget per host across every shard.
+    - messages (Queue): Scraped pages on their way to the merging process.
+    - stop (Event): Set when the merging process stops early.
+    """
+    # Leftover messages must not keep a stopped shard from exiting
+    messages.cancel_join_thread()
+    shard.update(config=config, buckets=buckets, messages=messages, stop=stop)
+
+
+def send(*message):
+    """
+    Hand a message to the merging process, waiting while the queue is full.
+    """
+    while True:
+        try:
+            shard['messages'].put(message, timeout=1)
+            return
+        except queue.Full:
+            if shard['stop'].is_set():
+                raise Stopped()
+
+
+def scrape_league(league, sources, done, club_names):
+    """
+    Runs in a shard process. Fetch and parse every page of one league, and send the pages to
+    the merging process in the order they're stored: the Transfermarkt league page and each of
+    its club pages, then each FBref squad page along with its players' pages.
+
+    FBref players are only fetched for squads matching a Transfermarkt club, stored already or
+    just scraped by this shard, as at FBref's rate limit every skipped page counts.
+
+    Parameters:
+    - league (dict): The league, from the registry.
+    - sources (tuple): Which sites to scrape, transfermarkt and/or fbref.
+    - done (set): URLs of pages stored recently enough to be skipped.
+    - club_names (list): Names of the clubs stored already.
+
+    Pages fetched but of no use, such as a squad that isn't in the TransferMarkt data, are sent
+    to be checkpointed, only pages whose request failed are left to be fetched again.
+
+    A league that fails, such as when its league page can't be fetched, is reported to the merging process
+    rather than raised, so the other shards carry on. Its league checkpoints are never sent, so the
+    next scrape picks it up again.
+
+    Returns:
+    - stages (dict): Fetch and parse metrics of the shard's pipeline.
+    """
+    import traceback
+    from functools import partial
+
+    from .fbref import match_club, player_links, squads
+    from .name_index import NameIndex
+    from .parsers import parse_fbref_links, parse_fbref_player, parse_fbref_squad, parse_tm_club, parse_tm_league
+    from .pipeline import Pipeline
+    from .resolver import find_club
+    from .transfermarkt import club_links
+
+    code = league['code']
+
+    # Pages are parsed in this process's fetch threads, the shards are the parallel processes
+    pipeline = Pipeline.from_config(dict(shard['config'], PARSE_WORKERS=1), code, shard['buckets'])
+
+    # Clubs FBref squads are matched against, keyed by name
+    clubs = NameIndex()
+    for name in club_names:
+        clubs.add(name, name)
+
+    failed = None
+    try:
+        url = league['transfermarkt']
+        if 'transfermarkt' in sources and url not in done:
+            page = pipeline.get(url, parse_tm_league)
+            send('league', code, url, page)
+
+            # The next club pages download while this one is sent
+            complete = True
+            for club_url, page in pipeline.map([link for link in club_links(page) if link not in done], parse_tm_club):
+                if club_url in pipeline.failed:
+                    complete = False
+                elif page is None:
+                    send('unusable', code, 'club', club_url)
+                else:
+                    clubs.add(page['name'], page['name'])
+                    send('club', code, club_url, page)
+
+            # A league with a missing club is left unmarked, so resuming fetches the club again
+            send('league_done', code, url, complete)
+
+        url = league['fbref']
+        if 'fbref' in sources and url and url not in done:
+            for url, links in pipeline.map([url], parse_fbref_links):
+                if links is None:
+                    if url not in pipeline.failed:
+                        send('unusable', code, 'league', url)
+                    continue
+
+                teams = [(team_url, club) for team_url, club in squads(links, league['club_aliases'])
+                         if team_url not in done]
+
+                complete = True
+                for (team_url, page), club in zip(pipeline.map([team_url for team_url, _ in teams], parse_fbref_squad),
+                                                  [club for _, club in teams]):
+                    # Squad failed to fetch, the league is left unmarked so resuming fetches it again
+                    if team_url in pipeline.failed:
+                        complete = False
+                        continue
+
+                    # Squad didn't parse or isn't in the TransferMarkt data, which won't change
+                    if page is None or match_club(partial(find_club, clubs), club, page) is None:
+                        send('unusable', code, 'club', team_url)
+                        continue
+
+                    # The squad is sent with its players, to be stored in one transaction, along
+                    # with whether each player's request failed
+                    players = [(player_url, player, player_url in pipeline.failed) for player_url, player in
+                               pipeline.map([link for link in player_links(page) if link not in done],
+                                            parse_fbref_player)]
+                    send('squad', code, team_url, club, page, players)
+
+                send('fbref_done', code, url, complete)
+
+    except Stopped:
+        raise
+    except Exception as error:
+        traceback.print_exc()
+        failed = f'{type(error).__name__}: {error}'
+    finally:
+        pipeline.close()
+
+    stages = pipeline.metrics()
+    send('shard_done', code, failed)
+    return {stage: stages[stage] for stage in ('fetch', 'parse')}
+
+
+class Merger:
+    """
+    Stores the pages sent by the shards, in the merging process, the only one writing to the
+    database. Each message is stored the way the single process scrapers store the same page.
+
+    Parameters:
+    - checkpoints (Checkpoints): Pages already stored by this or earlier scrape jobs.
+    - resolver (Resolver): Stored leagues, clubs, players and stats.
+    - writer (BulkWriter): Buffers and writes the rows.
+    """
+
+    def __init__(self, checkpoints, resolver, writer):
+        self.checkpoints = checkpoints
+        self.resolver = resolver
+        self.writer = writer
+
+        # League code -> ID of the league, needed by its clubs
+        self.league_ids = {}
+
+        # Codes of leagues with an FBref squad that has player pages still to fetch
+        self.incomplete = set()
+
+    def league(self, code, url, page):
+        from .transfermarkt import store_league
+
+        # Insert the league, its ID is needed by each club
+        self.league_ids[code] = store_league(self.resolver, self.writer, page)
+        self.writer.flush()
+
+    def club(self, code, url, page):
+        from .transfermarkt import store_club
+
+        # Write the club, all its players and its checkpoint in one transaction
+        club_id = store_club(self.resolver, self.writer, page, self.league_ids[code])
+        self.checkpoints.mark(self.writer, 'club', url, club_id)
+        self.writer.flush()
+
+        # The club's FBref squad is matched by this same resolver
+        self.resolver.load_players(club_id)
+
+    def league_done(self, code, url, complete):
+        if complete:
+            self.checkpoints.mark(self.writer, 'league', url, self.league_ids.get(code))
+            self.writer.flush()
+
+    def unusable(self, code, kind, url):
+        # Fetched but of no use, checkpointed so it isn't fetched again
+        self.checkpoints.mark(self.writer, kind, url)
+        self.writer.flush()
+
+    def squad(self, code, url, club, page, players):
+        from .fbref import match_club, store_player
+
+        club_id = match_club(self.resolver.club_id, club, page)
+        if club_id is None:
+            self.unusable(code, 'club', url)
+            return
+
+        complete = True
+        for player_url, player, failed in players:
+            # A player whose request failed leaves the club unmarked
+            if failed:
+                complete = False
+                continue
+
+            # Player's page is stored along with the club's batch, a page without stats or a
+            # player who isn't in the club's TransferMarkt squad is checkpointed with no ID
+            player_id = store_player(self.resolver, self.writer, player, club_id) if player is not None else None
+            self.checkpoints.mark(self.writer, 'player', player_url, player_id)
+
+        # Write every stat from the club's players in one transaction
+        if complete:
+            self.checkpoints.mark(self.writer, 'club', url, club_id)
+        else:
+            self.incomplete.add(code)
+        self.writer.flush()
+
+    def fbref_done(self, code, url, complete):
+        if complete and code not in self.incomplete:
+            self.checkpoints.mark(self.writer, 'league', url)
+            self.writer.flush()
+
+
+def scrape_leagues(checkpoints, leagues, sources=('transfermarkt', 'fbref'), workers=None):
+    """
+
+    This function scrapes several leagues at once, one shard process per league. Each shard
+    fetches and parses its league's pages and sends them to this process, which resolves them
+    and writes them with a single BulkWriter, keeping SQLite down to one writer.
+
+    Every host has one token bucket shared by all the shards, so the shards never go above a
+    host's rate limit between them. With a few shards running, each host's budget is in use all
+    the time, such as one league's FBref pages downloading while the next league's Transfermarkt
+    pages do, so the scrape takes about as long as the busiest host needs for its pages at its
+    rate rather than the sum of every league scraped one after another.
+
+    Parameters:
+    - checkpoints (Checkpoints): Pages already stored by this or earlier scrape jobs.
+    - leagues (list): Leagues from the registry.
+    - sources (tuple): Which sites to scrape, transfermarkt and/or fbref.
+    - workers (int): Shard processes, one per league by default.
+
+    A league whose shard fails is left unmarked and the other leagues carry on, the failure is
+    printed and counted at /metrics.
+
+    Returns:
+    None
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    from flask import current_app
+
+    from .crawler import shared_buckets
+    from .ingest import BulkWriter
+    from .leagues import league_hosts
+    from .metrics import metrics
+    from .pipeline import StageMetrics, finished, report
+    from .processes import process_context
+    from .resolver import Resolver
+
+    config = current_app.config
+    workers = min(workers or len(leagues), len(leagues))
+
+    # Leagues, clubs and players already stored, so pages scraped again update rather than duplicate
+    resolver = Resolver()
+    writer = BulkWriter(batch_size=config.get('INGEST_BATCH_SIZE', 1000))
+    merger = Merger(checkpoints, resolver, writer)
+
+    # Shards aren't forked from this process, a scrape can start from the web server's ingest
+    # thread, and a fork would copy locks other threads hold
+    context = process_context()
+
+    # Pages waiting to be stored are bounded, shards wait when the writer falls behind
+    messages = context.Queue(maxsize=config.get('PIPELINE_MAX_PENDING', 16) * workers)
+    stop = context.Event()
+    buckets = shared_buckets(league_hosts(leagues), config.get('CRAWL_RATES'), context)
+
+    started = time.perf_counter()
+    resolve = StageMetrics()
+    done = checkpoints.fresh()
+    club_names = sorted(resolver.club_names)
+
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=start_shard,
+                               initargs=(dict(config), buckets, messages, stop))
+    futures = [pool.submit(scrape_league, league, sources, done, club_names) for league in leagues]
+    finished_shards = 0
+    failed = []
+
+    try:
+        while finished_shards < len(futures):
+            # A shard process that died stops the scrape, the pages it sent are already stored
+            for future in futures:
+                if future.done() and future.exception() is not None:
+                    raise future.exception()
+
+            try:
+                kind, *message = messages.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            if kind == 'shard_done':
+                code, error = message
+                finished_shards += 1
+
+                # The league's pages sent before the failure are stored, its checkpoints are left unmarked
+                if error is not None:
+                    print(f"League {code} failed: {error}")
+                    metrics.inc('scrape_league_failures_total', league=code)
+                    failed.append(code)
+                continue
+
+            start = time.perf_counter()
+            getattr(merger, kind)(*message)
+            resolve.done(time.perf_counter() - start, queued=False)
+
+    except BaseException:
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+
+    shards = [future.result() for future in futures]
+    pool.shutdown()
+
+    # Fetch and parse summed over the shards, resolve and write are this process's
+    elapsed = time.perf_counter() - started
+    stages = {}
+    for stage in ('fetch', 'parse'):
+        processed = sum(metrics[stage]['processed'] for metrics in shards)
+        stages[stage] = {'processed': processed,
+                         'seconds': round(sum(metrics[stage]['seconds'] for metrics in shards), 3),
+                         'per_second': round(processed / elapsed, 2) if elapsed else 0.0,
+                         'backlog': 0, 'max_backlog': max(metrics[stage]['max_backlog'] for metrics in shards)}
+    stages['resolve'] = resolve.snapshot(elapsed)
+    stages['write'] = {'processed': writer.written, 'seconds': round(writer.seconds, 3),
+                       'per_second': round(writer.written / elapsed, 2) if elapsed else 0.0,
+                       'backlog': writer.pending, 'max_backlog': 0}
+
+    finished('shards', stages)
+    report(stages)
+    print(f"{len(leagues) - len(failed)} leagues taken in {workers} shards")
+    if failed:
+        print(f"Failed leagues, scraped again by the next run: {', '.join(failed)}")
@@ -0,0 +1,181 @@
+# Players with the most similar stats to a given player, within a position
+import numpy as np
+from flask import current_app, g
+
+from .caching import LRUCache
+from .versioning import data_version
+
+# Indexes already built, keyed by (position, weighted, data version)
+similarity_cache = LRUCache(max_entries=64)
+
+# Query rows compared against every player at once, bounding the memory of batch lookups
+BLOCK_SIZE = 64
+
+
+class SimilarityIndex:
+    """
+    Stat vectors of one position's players, standardized so every stat counts the same, and
+    searched by brute force with matrix products. With a few hundred stats at most this beats a
+    KD-tree or ball tree, which lose their advantage in that many dimensions, and a query over tens
+    of thousands of players is one matrix-vector product.
+
+    Each stat is scaled to zero mean and unit variance over the position. With importances, each
+    is then weighted by the share of the position's market value it explains, so stats that matter
+    for the position count more towards similarity.
+
+    Parameters:
+    - matrix (StatMatrix): The stat matrix.
+    - position (str): Position of the players.
+    - min_coverage (float): Share of players (0 to 1) needing a value for a stat to be used.
+    - importances (dict): Optional stat label -> importance, as from calc_stat_importance.
+
+    Attributes:
+    - rows (ndarray): Matrix row of each player.
+    - stat_labels (list): Label of each stat used.
+    - vectors (ndarray): Scaled stats, one row per player.
+    """
+
+    def __init__(self, matrix, position, min_coverage, importances=None):
+        from .features import covered_stats
+
+        self.matrix = matrix
+        self.position = position
+        self.rows = np.flatnonzero(matrix.position_mask(position))
+
+        x, columns = covered_stats(matrix.values[self.rows], min_coverage)
+        self.stat_labels = [matrix.stat_labels[column] for column in columns]
+
+        # Zero mean and unit variance, stats every player has the same value of are left at 0
+        std = x.std(axis=0)
+        std[std == 0] = 1
+        x = (x - x.mean(axis=0)) / std
+
+        # Squared distances are sums over stats, so each stat's weight scales its square
+        if importances:
+            weights = np.array([importances.get(label, 0.0) for label in self.stat_labels])
+            if weights.sum() > 0:
+                x *= np.sqrt(weights / weights.sum() * len(weights))
+
+        self.vectors = np.ascontiguousarray(x)
+        self.norms = (self.vectors ** 2).sum(axis=1)
+        self.index = {row: number for number, row in enumerate(self.rows.tolist())}
+
+    def nearest(self, rows, k=10):
+        """
+        The k players closest to each given player, leaving out the player themself.
+        Queries are compared to every player a block at a time.
+
+        Parameters:
+        - rows (list): Matrix rows of the players to find neighbours of, all in this position.
+        - k (int): Neighbours of each.
+
+        Returns:
+        - neighbours (list): For each given player, (matrix row, distance) pairs, closest first.
+        """
+        numbers = [self.index[row] for row in rows]
+        k = min(k, len(self.rows) - 1)
+        if k <= 0:
+            return [[] for _ in numbers]
+
+        neighbours = []
+        for start in range(0, len(numbers), BLOCK_SIZE):
+            block = numbers[start:start + BLOCK_SIZE]
+
+            # |a - b|² = |a|² - 2a·b + |b|², for the whole block against every player
+            distances = self.norms[block][:, None] - 2 * self.vectors[block] @ self.vectors.T + self.norms[None, :]
+            distances[np.arange(len(block)), block] = np.inf
+
+            # The k smallest of each row without sorting the rest
+            closest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            for line, columns in enumerate(closest):
+                columns = columns[np.argsort(distances[line, columns])]
+                neighbours.append([(int(self.rows[column]), float(np.sqrt(max(distances[line, column], 0.0))))
+                                   for column in columns])
+
+        return neighbours
+
+
+def similarity_index(position, weighted=True):
+    """
+    The similarity index of a position for the current data version, built on first use.
+
+    Parameters:
+    - position (str): Position of the players.
+    - weighted (bool): Weight stats by their importance for the position's market values.
+
+    Returns:
+    - index (SimilarityIndex): The up to date index.
+    """
+    from .importance import calc_stat_importance
+    from .matrix import get_matrix
+
+    key = (position, weighted, data_version())
+
+    index = similarity_cache.get(key)
+    if index is None:
+        importances = calc_stat_importance(position)[0] if weighted else None
+        index = SimilarityIndex(get_matrix(), position, current_app.config['FEATURE_MIN_COVERAGE'], importances)
+
+        # Indexes weighted by a model older than the data are built again once it is retrained
+        if not g.get('stale_models'):
+            similarity_cache.put(key, index)
+
+    return index
+
+
+def similar_players(name, position=None, k=10, weighted=True):
+    """
+    The players whose stats are most like a given player's, among the players of the same
+    position, for scouting players like one already known.
+
+    Parameters:
+    - name (str): Name of the player.
+    - position (str): Position searched, the player's own by default.
+    - k (int): Number of similar players returned.
+    - weighted (bool): Weight stats by their importance for the position's market values.
+
+    Returns:
+    - similar (list): name, age, value and distance of each similar player, closest first,
+      or None if the player wasn't found in the position.
+    - position (str): The position searched.
+    - stat_labels (list): Labels of the stats compared.
+    """
+    from .matrix import get_matrix
+
+    matrix = get_matrix()
+    row = matrix.row(name)
+    if row is None:
+        return None, position, []
+
+    # Player isn't in the position, or has no stats, so no index is built for it
+    position = position or matrix.positions[row]
+    if matrix.positions[row] != position or not matrix.has_stats()[row]:
+        return None, position, []
+
+    index = similarity_index(position, weighted)
+    if row not in index.index:
+        return None, position, index.stat_labels
+
+    [neighbours] = index.nearest([row], k)
+    similar = [{'name': matrix.names[neighbour],
+                'age': None if np.isnan(matrix.ages[neighbour]) else float(matrix.ages[neighbour]),
+                'value': None if np.isnan(matrix.market_values[neighbour]) else float(matrix.market_values[neighbour]),
+                'distance': round(distance, 4)}
+               for neighbour, distance in neighbours]
+
+    return similar, position, index.stat_labels
+
+
+def build_similarity_indexes(weighted=True):
+    """
+    Build every position's similarity index for the current data version, after ingestion.
+
+    Returns:
+    - built (int): Number of positions indexed.
+    """
+    from .dimensions import get_dimensions
+
+    positions = get_dimensions().positions
+    for position in positions:
+        similarity_index(position, weighted)
+    return len(positions)
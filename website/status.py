@@ -0,0 +1,38 @@
+from flask import Blueprint, Response, jsonify
+
+# Register Flask blueprint
+status = Blueprint('status', __name__)
+
+
+# Readiness Flask route
+@status.route('/ready')
+def ready():
+    """
+
+    This function reports whether the database holds a complete data set and how fresh it is,
+    for load balancers and deployment scripts to check before sending traffic.
+
+    Returns:
+    JSON: Readiness and data freshness, with status 200 when ready and 503 when not.
+    """
+    from .jobs import freshness
+
+    data = freshness()
+    return jsonify(data), 200 if data['ready'] else 503
+
+
+# Metrics Flask route
+@status.route('/metrics')
+def metrics_page():
+    """
+
+    This function reports the metrics of this process for Prometheus to scrape: requests, time
+    and SQL statements per endpoint, template render times, model fit times and scores, and the
+    throughput and backlog of each scraper stage.
+
+    Returns:
+    Text: Metrics in Prometheus text exposition format.
+    """
+    from .metrics import metrics
+
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,242 @@
+# Trendlines and histograms of the scatter chart, computed after ingestion rather than per request
+import json
+
+from sqlalchemy import delete, func, insert
+
+from . import db
+from .caching import LRUCache
+from .models import StatHistogram, StatMoments
+from .versioning import data_version
+
+# Bins in the scatter page's histogram
+HISTOGRAM_BINS = 64
+
+# Pair sums of the positions recently charted, keyed by (position, data version)
+moments_cache = LRUCache(max_entries=16)
+
+
+def fit_summary(x_values, y_values, bins=HISTOGRAM_BINS):
+    """
+    Least squares fit of y on x and histogram of x, for players with both values.
+
+    Parameters:
+    - x_values, y_values (list or ndarray): Values of the two stats, missing values as None or NaN.
+    - bins (int): Number of histogram bins.
+
+    Returns:
+    dict: count, slope, intercept, r_squared, x_min, x_max, bin_start, bin_size and bin_counts.
+    The fit is None with fewer than two distinct x values, the histogram with no values.
+    """
+    import numpy as np
+
+    x = np.array(x_values, dtype=float)
+    y = np.array(y_values, dtype=float)
+    keep = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[keep], y[keep]
+
+    summary = dict(histogram(x, bins), slope=None, intercept=None, r_squared=None)
+
+    if len(x) < 2 or x.min() == x.max():
+        return summary
+
+    # Closed form simple regression, same line as an OLS fit with an intercept
+    x_mean, y_mean = x.mean(), y.mean()
+    sxx = ((x - x_mean) ** 2).sum()
+    sxy = ((x - x_mean) * (y - y_mean)).sum()
+    syy = ((y - y_mean) ** 2).sum()
+
+    summary['slope'] = float(sxy / sxx)
+    summary['intercept'] = float(y_mean - summary['slope'] * x_mean)
+    summary['r_squared'] = float(sxy * sxy / (sxx * syy)) if syy else 1.0
+    return summary
+
+
+def histogram(x, bins=HISTOGRAM_BINS):
+    """
+    Range and equal width histogram of a stat's values, for players with a value.
+
+    Returns:
+    dict: count, x_min, x_max, bin_start, bin_size and bin_counts, None and empty with no values.
+    """
+    import numpy as np
+
+    x = np.asarray(x, dtype=float)
+    x = x[~np.isnan(x)]
+    if not len(x):
+        return {'count': 0, 'x_min': None, 'x_max': None, 'bin_start': None, 'bin_size': None, 'bin_counts': []}
+
+    # Every value in one bin when they are all equal
+    counts, edges = np.histogram(x, bins=bins if x.min() < x.max() else 1)
+    return {'count': len(x), 'x_min': float(x.min()), 'x_max': float(x.max()), 'bin_start': float(edges[0]),
+            'bin_size': float(edges[1] - edges[0]), 'bin_counts': counts.tolist()}
+
+
+def pair_sums(values):
+    """
+    Sums over the players having both stats, for every pair of stats at once, from which any
+    pair's least squares fit is worked out without its values. Values are centred on each
+    stat's mean first, so the sums of squares don't lose precision.
+
+    Parameters:
+    - values (ndarray): Rows of the stat matrix, NaN where a player has no value.
+
+    Returns:
+    dict: shift (mean of each stat), and count, sum_x, sum_xx and sum_xy, where entry [i, j]
+    sums stat i (sum_xy: stat i times stat j) over the players with stats i and j.
+    """
+    import numpy as np
+
+    present = ~np.isnan(values)
+    shift = np.nanmean(values, axis=0)
+    centred = np.where(present, values - shift, 0.0)
+    mask = present.astype(float)
+
+    return {'shift': shift, 'count': mask.T @ mask, 'sum_x': centred.T @ mask,
+            'sum_xx': (centred * centred).T @ mask, 'sum_xy': centred.T @ centred}
+
+
+def pair_fit(sums, x_column, y_column):
+    """
+    Least squares fit of one stat on another from pair_sums, the same line fit_summary gives.
+
+    Returns:
+    dict: count, slope, intercept and r_squared, the fit None with fewer than two players or
+    when every player with both stats has the same x.
+    """
+    count = sums['count'][x_column, y_column]
+    summary = {'count': int(count), 'slope': None, 'intercept': None, 'r_squared': None}
+    if count < 2:
+        return summary
+
+    sum_x, sum_y = sums['sum_x'][x_column, y_column], sums['sum_x'][y_column, x_column]
+    sum_xx, sum_yy = sums['sum_xx'][x_column, y_column], sums['sum_xx'][y_column, x_column]
+    x_mean, y_mean = sum_x / count, sum_y / count
+
+    # Centred sums of squares and products over the players with both stats
+    sxx = sum_xx - sum_x * x_mean
+    syy = sum_yy - sum_y * y_mean
+    sxy = sums['sum_xy'][x_column, y_column] - sum_x * y_mean
+
+    # What is left of the x spread after rounding is noise, the values are all equal
+    if sxx <= 1e-9 * sum_xx:
+        return summary
+
+    summary['slope'] = float(sxy / sxx)
+    summary['intercept'] = float(y_mean + sums['shift'][y_column] - summary['slope'] * (x_mean + sums['shift'][x_column]))
+    summary['r_squared'] = float(sxy * sxy / (sxx * syy)) if syy > 1e-9 * sum_yy else 1.0
+    return summary
+
+
+def compute_summaries():
+    """
+    Replace the stored summaries with ones for every position, from the current stat matrix, in
+    one transaction: the histogram of each stat the position's players have, and the pair sums
+    any two of those stats' trendline is worked out from when it's requested. The work and rows
+    grow with the number of stats, rather than with the number of pairs of stats.
+
+    Returns:
+    - stored (int): Number of summaries stored.
+    """
+    import io
+
+    import numpy as np
+
+    from .matrix import get_matrix
+
+    version = data_version()
+    matrix = get_matrix()
+
+    # Players the scatter chart can show, those in a club
+    in_club = np.array([club_id is not None for club_id in matrix.club_ids], dtype=bool)
+
+    histograms = []
+    moments = []
+    for position in sorted(set(matrix.positions.tolist()) - {None}):
+        values = matrix.values[matrix.position_mask(position) & in_club]
+        columns = np.flatnonzero(~np.isnan(values).all(axis=0))
+        if not len(columns):
+            continue
+
+        values = values[:, columns]
+        labels = [matrix.stat_labels[column] for column in columns]
+        for number, label in enumerate(labels):
+            summary = histogram(values[:, number])
+            summary['bin_counts'] = json.dumps(summary['bin_counts'])
+            histograms.append(dict(summary, position=position, stat=label, version=version))
+
+        saved = io.BytesIO()
+        np.savez(saved, **pair_sums(values))
+        moments.append({'position': position, 'version': version, 'stat_labels': json.dumps(labels),
+                        'moments': saved.getvalue()})
+
+    db.session.execute(delete(StatHistogram))
+    db.session.execute(delete(StatMoments))
+    if histograms:
+        db.session.execute(insert(StatHistogram), histograms)
+        db.session.execute(insert(StatMoments), moments)
+    db.session.commit()
+
+    print(f'{len(histograms)} stat histograms and {len(moments)} positions\' pair sums computed')
+    return len(histograms) + len(moments)
+
+
+def summaries_outdated():
+    """
+    Whether the stored summaries were computed from older data, or none are stored.
+    """
+    version = db.session.query(func.min(StatMoments.version)).scalar()
+    return version is None or version != data_version()
+
+
+def stored_moments(position, version):
+    """
+    Pair sums stored for a position and data version, read once and kept in memory.
+
+    Returns:
+    - moments: (stat label -> column, pair_sums dict), or None if nothing is stored.
+    """
+    import io
+
+    import numpy as np
+
+    key = (position, version)
+    moments = moments_cache.get(key)
+    if moments is None:
+        stored = StatMoments.query.filter_by(position=position, version=version).first()
+        if stored is None:
+            return None
+
+        with np.load(io.BytesIO(stored.moments)) as saved:
+            sums = {name: saved[name] for name in saved.files}
+        moments = ({label: column for column, label in enumerate(json.loads(stored.stat_labels))}, sums)
+        moments_cache.put(key, moments)
+
+    return moments
+
+
+def scatter_summary(position, x_stat, y_stat, x_values, y_values):
+    """
+    The summary of a scatter chart, from the x stat's stored histogram and the trendline worked
+    out from the position's stored pair sums, or fitted from the given values when either is
+    missing or out of date. The stored histogram counts every player in the position with the
+    x stat.
+
+    Parameters:
+    - position (str): Position of the players shown.
+    - x_stat, y_stat (str): Labels of the stats on each axis.
+    - x_values, y_values (list): The chart's values, only used when nothing up to date is stored.
+
+    Returns:
+    dict: As returned by fit_summary.
+    """
+    version = data_version()
+    moments = stored_moments(position, version)
+    stored = StatHistogram.query.filter_by(position=position, stat=x_stat, version=version).first()
+    if moments is None or stored is None or y_stat not in moments[0]:
+        return fit_summary(x_values, y_values)
+
+    columns, sums = moments
+    summary = pair_fit(sums, columns[x_stat], columns[y_stat])
+    summary.update({'x_min': stored.x_min, 'x_max': stored.x_max, 'bin_start': stored.bin_start,
+                    'bin_size': stored.bin_size, 'bin_counts': json.loads(stored.bin_counts)})
+    return summary
@@ -1,133 +1,166 @@
 # Transfermarkt data collection
 from unidecode import unidecode
 
-from . import db
 
-
-def scrape_data():
+def club_links(league):
     """
-    Scrape data from Transfermarkt website for leagues, clubs, and players,
-    and store that data into the database.
-
-    This function iterates over several leagues, collects data for each club within
-    the league, and then collects data for each player within each club.
-
-    Data scraped:
-    - League name, coefficient, and nation
-    - Club name
-    - Player name, age, position, and market value
+    URLs of the club pages linked from a parsed league page, once each.
+    """
+    # Links collected from each club in the league
+    links = [link for link in league['club_links'] if '/kader/verein/' in link]
+    return list(dict.fromkeys([f"https://transfermarkt.co.uk{link}" for link in links]))
 
-    The scraped data is stored in the corresponding database tables.
 
-    Parameters:
-    None
+def store_league(resolver, writer, league):
+    """
+    Insert or update a parsed league page's league.
 
     Returns:
-    None
-
+    - league_id (int): ID of the league, needed by each club.
     """
-    import requests
-    from bs4 import BeautifulSoup
-
-    from .models import League, Club, Player
-
-    # Cover headers used to appear as browser
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) '
-                      'Chrome/47.0.2526.106 Safari/537.36'}
-
-    # URLS of leagues wanted
-    urls = ["https://www.transfermarkt.co.uk/premier-league/startseite/wettbewerb/GB1",
-            "https://www.transfermarkt.co.uk/serie-a/startseite/wettbewerb/IT1",
-            "https://www.transfermarkt.co.uk/primera-division/startseite/wettbewerb/ES1"
-            ]
-
-    # Iterate over each league
-    for url in urls:
-        page_tree = requests.get(url, headers=headers)
-        soup = BeautifulSoup(page_tree.content, 'html.parser', from_encoding='utf-8')
+    return resolver.store_league(writer, league['name'], coefficient=league['coefficient'], nation=league['nation'])
 
-        # League attributes
-        league_name = soup.find('h1',
-                                class_='data-header__headline-wrapper '
-                                       'data-header__headline-wrapper--oswald').get_text().strip()
 
-        coefficient = int(soup.find('a', href='/uefa/5jahreswertung/statistik').get_text()[0])
-        nation = soup.find('span', class_='data-header__club').find('a').get_text().strip()
-
-        # Create instance of League
-        league = League(name=league_name, coefficient=coefficient, nation=nation)
-
-        # Links collected from each club in the league
-        club_links = soup.select("table", {"class": "items"})[1].find_all('a')
-        club_links = [link.get("href") for link in club_links if '/kader/verein/' in link.get("href")]
-        club_links = list(dict.fromkeys([f"https://transfermarkt.co.uk{link}" for link in club_links]))
-
-        # Commit the league to the database
-        db.session.merge(league)
-        db.session.commit()
+def store_club(resolver, writer, page, league_id):
+    """
+    Insert a parsed club page's club and buffer its players, updating players already stored.
 
-        # Iterate over each club
-        for club in club_links:
-            page_tree = requests.get(club, headers=headers)
-            soup = BeautifulSoup(page_tree.content, 'html.parser', from_encoding='utf-8')
+    Parameters:
+    - resolver (Resolver): Stored leagues, clubs and players.
+    - writer (BulkWriter): Buffers the club's rows.
+    - page (dict): The parsed club page.
+    - league_id (int): ID of the club's league.
 
-            # Club attributes
-            club_name = soup.find('h1',
-                                  class_='data-header__headline-wrapper '
-                                         'data-header__headline-wrapper--oswald').get_text().strip()
+    Returns:
+    - club_id (int): ID of the club.
+    """
+    # Insert the club, committed together with its players
+    club_id = resolver.store_club(writer, page['name'], league_id)
 
-            # Take ID of club's league
-            league_id = League.query.filter_by(name=league_name).first().id
+    # Lists of players attributes within the club
+    names = [unidecode(name) for name in page['names']]
 
-            # Instantiate club record
-            club = Club(name=club_name, league_id=league_id)
+    # Iterate over each player
+    for name, age, position, value_text in zip(names, page['ages'], page['positions'], page['values']):
 
-            # Commit the club to the database
-            db.session.merge(club)
-            db.session.commit()
+        # Conversion from string to quantitative
+        if "m" in value_text:
+            value = round(float(value_text.replace("\xa0", "")[1:-1]), 1)
 
+        # Conversion to millions unit from thousands
+        elif "k" in value_text:
+            value = round(float(value_text.replace("k\xa0", "")[1:-1]) / 1000, 1)
 
-            # Lists of players attributes within the club
-            # Name
-            names_html = soup.find_all('td', {"class": 'hauptlink'})
-            names = [unidecode(n.text.strip()) for n in names_html if n.text[-1] == "\n"]
+        # Auto to 0 value if not specified
+        else:
+            value = 0
 
-            # Age
-            age_td = soup.select("td.zentriert")
-            age = [a for a in age_td if a.text != "" and len(a.text) == 2 and "div" not in str(a)]
-            ages = [int(a.text) for a in age]
+        # Buffer player for the club's batch
+        resolver.store_player(writer, name, club_id, age=age, position=position, market_value=value)
 
-            # Position
-            position_td = soup.select("table.inline-table tr:nth-of-type(2)")
-            positions = [position.get_text(strip=True) for position in position_td]
+    return club_id
 
-            # Market Value
-            values_html = soup.find_all('td', {"class": 'rechts hauptlink'})
 
-            # Take ID of club
-            club_id = Club.query.filter(Club.name == club_name).first().id
+def scrape_data(checkpoints, leagues=None):
+    """
+    Scrape data from Transfermarkt website for leagues, clubs, and players,
+    and store that data into the database.
 
-            # Iterate over each player
-            for name, age, position, value_html in zip(names, ages, positions, values_html):
+    This function iterates over several leagues, collects data for each club within
+    the league, and then collects data for each player within each club.
 
-                # Conversion from string to quantitative
-                if "m" in value_html.text:
-                    value = round(float(value_html.text.replace("\xa0", "")[1:-1]), 1)
+    Data scraped:
+    - League name, coefficient, and nation
+    - Club name
+    - Player name, age, position, and market value
 
-                # Conversion to millions unit from thousands
-                elif "k" in value_html.text:
-                    value = round(float(value_html.text.replace("k\xa0", "")[1:-1]) / 1000, 1)
+    The scraped data is stored in the corresponding database tables. Leagues and clubs
+    with a fresh checkpoint are skipped, and clubs or players already stored are updated.
+    A league is only checkpointed once every one of its club pages was fetched.
 
-                # Auto to 0 value if not specified
-                else:
-                    value = 0
+    Parameters:
+    - checkpoints (Checkpoints): Pages already stored by this or earlier scrape jobs.
+    - leagues (list): Leagues from the registry, those selected in the config by default.
 
-                # New instance of Player
-                player = Player(name=name, age=age, position=position, market_value=value, club_id=club_id)
+    Returns:
+    None
 
-                # Commit player to db
-                db.session.merge(player)
-                db.session.commit()
+    """
+    import time
 
-    print("TransferMarkt data taken")
\ No newline at end of file
+    import requests
+    from flask import current_app
+
+    from .ingest import BulkWriter
+    from .leagues import selected_leagues
+    from .parsers import parse_tm_club, parse_tm_league
+    from .pipeline import ParseError, Pipeline
+    from .resolver import Resolver
+
+    # Pages come from the on-disk cache or a rate-limited session, and are parsed in worker processes
+    pipeline = Pipeline.from_config(current_app.config, 'transfermarkt')
+
+    # Rows are written in batches, one transaction per club page
+    writer = BulkWriter(batch_size=current_app.config.get('INGEST_BATCH_SIZE', 1000))
+    pipeline.watch(writer)
+
+    # Leagues, clubs and players already stored, so pages scraped again update rather than duplicate
+    resolver = Resolver()
+
+    # URLS of leagues wanted, from the league registry
+    if leagues is None:
+        leagues = selected_leagues(current_app.config)
+    urls = [league['transfermarkt'] for league in leagues]
+
+    try:
+        # Iterate over each league
+        for url in urls:
+            # League and all its clubs already stored
+            if checkpoints.is_done(url):
+                continue
+
+            # A league page that fails is left unmarked, the other leagues carry on
+            try:
+                league = pipeline.get(url, parse_tm_league)
+            except (requests.RequestException, ParseError) as error:
+                print(f"Failed to scrape {url}: {error}")
+                continue
+
+            # Insert the league, its ID is needed by each club
+            start = time.perf_counter()
+            league_id = store_league(resolver, writer, league)
+            pipeline.resolved(time.perf_counter() - start)
+            writer.flush()
+
+            # Iterate over each club, the next club pages download while this one is stored
+            complete = True
+            for club, page in pipeline.map([link for link in club_links(league) if not checkpoints.is_done(link)],
+                                           parse_tm_club):
+                # The league is left unmarked so resuming fetches the club again
+                if club in pipeline.failed:
+                    complete = False
+                    continue
+
+                # A page that doesn't parse won't next time either, it is checkpointed with nothing stored
+                if page is None:
+                    checkpoints.mark(writer, 'club', club)
+                    writer.flush()
+                    continue
+
+                start = time.perf_counter()
+                club_id = store_club(resolver, writer, page, league_id)
+
+                # Write the club, all its players and its checkpoint in one transaction
+                checkpoints.mark(writer, 'club', club, club_id)
+                pipeline.resolved(time.perf_counter() - start)
+                writer.flush()
+
+            if complete:
+                checkpoints.mark(writer, 'league', url, league_id)
+            writer.flush()
+
+    finally:
+        pipeline.close()
+
+    pipeline.report()
+    print("TransferMarkt data taken")
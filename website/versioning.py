@@ -0,0 +1,23 @@
+# Data version, bumped whenever ingestion changes stored data so caches know to rebuild
+from sqlalchemy import update
+
+from . import db
+from .models import DataVersion
+
+
+def data_version():
+    """
+    Current version of the stored data, 0 if nothing has been written yet.
+    """
+    return db.session.query(DataVersion.version).filter(DataVersion.id == 1).scalar() or 0
+
+
+def bump_version():
+    """
+    Increase the data version inside the current transaction, so the new version
+    becomes visible together with the data that changed.
+    """
+    result = db.session.execute(update(DataVersion).where(DataVersion.id == 1)
+                                .values(version=DataVersion.version + 1))
+    if result.rowcount == 0:
+        db.session.add(DataVersion(id=1, version=1))
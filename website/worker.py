@@ -0,0 +1,64 @@
+# Background ingestion, so serving pages never waits on scraping
+import threading
+
+started = threading.Event()
+lock = threading.Lock()
+
+
+def ingest(app):
+    """
+    Build or resume the database inside the app context, unless it is complete
+    or another process is already scraping, then bring the chart summaries, the
+    models and the similarity indexes of every position up to date, so they are
+    ready before anyone asks.
+
+    Parameters:
+    - app (Flask): The Flask application.
+    """
+    from .jobs import is_complete, is_running, last_job, run_scrape
+    from .importance import models_outdated, train_positions
+    from .similarity import build_similarity_indexes
+    from .summaries import compute_summaries, summaries_outdated
+
+    with app.app_context():
+        if is_running():
+            return
+
+        if not is_complete():
+            if last_job() is None:
+                print('Database is being built in the background')
+                run_scrape('build')
+            else:
+                print('Resuming interrupted database build in the background')
+                run_scrape('resume')
+
+        if summaries_outdated():
+            compute_summaries()
+
+        if models_outdated():
+            train_positions()
+
+        # Similar player lookups of this process start from ready indexes
+        build_similarity_indexes()
+
+
+def start_on_first_request(app):
+    """
+    Start ingestion in a background thread when the first request arrives.
+
+    Waiting for a request means only the process that serves pages scrapes,
+    not the reloader process started by debug mode.
+
+    Parameters:
+    - app (Flask): The Flask application.
+    """
+
+    @app.before_request
+    def start_ingestion():
+        if started.is_set():
+            return
+
+        with lock:
+            if not started.is_set():
+                started.set()
+                threading.Thread(target=ingest, args=(app,), name='ingestion', daemon=True).start()